@@ -1,197 +1,384 @@
-import math
-from app import colors
-import pygame
-from queue import deque, PriorityQueue
-
-def h(p1, p2):
-	""" heuristic function that returns absolute distance. prefers straight lines """
-	x1, y1 = p1
-	x2, y2 = p2
-	return abs(x1 - x2) + abs(y1 - y2)
-
-def euclidean_dist(p1, p2):
-	""" heuristic function that returns euclidean distance. prefers diagonals """
-	x1, y1 = p1
-	x2, y2 = p2
-	return math.sqrt((x2-x1)**2 + (y2-y1)**2)
-
-def reconstruct_path(prev_map, current, start, draw):
+from grid import BARRIER, OPEN, CLOSED, PATH, GOAL
+from solvers import h, euclidean_dist, adjacency, jump, jump_directions, arrival, interpolate
+from incremental import DStarLite
+from stats import SearchStats
+import time
+import heapq
+
+def pump_events():
+	""" Handles pending window events during a drawn search, quitting if the window was closed """
+	# pygame is only loaded once a search is drawn, so the solvers import without a display
+	import pygame
+	for event in pygame.event.get():
+		if event.type == pygame.QUIT:
+			pygame.quit()
+
+def reconstruct_path(grid, prev_map, current, start, draw):
 	""" returns a reconstructed path from the last node to the start node in linear time with the prev_map """
+	path = [current]
 	while current in prev_map:
 		current = prev_map[current]
-		if current is start:
-			return True
-		current.color = colors['path']
+		path.append(current)
+		if current == start:
+			break
+		grid.set(current, PATH)
 		draw()
+	path.reverse()
+	return path
 
-def depth_first(draw, grid, start, goal):
+def finish_path(stats, grid, prev_map, goal, start, draw, search_start):
+	""" Times the search, draws the reconstructed path and records it in stats """
+	reconstruct_start = stats.timed('search', search_start)
+	path = reconstruct_path(grid, prev_map, goal, start, draw)
+	stats.timed('reconstruct', reconstruct_start)
+	stats.record_path(path)
+
+def depth_first(draw, grid, start, goal, stats=None):
 	""" Runs Depth First search from start to goal """
+	stats = SearchStats() if stats is None else stats
+	on_expand, on_push = stats.on_expand, stats.on_push
+	masks, steps = adjacency(stats, grid)
+	cols = grid.cols
+	search_start = time.perf_counter()
 	stack = [start]
 	prev_map = {}
+	peak = pushes = 1
+	pops = 0
 
 	while len(stack) > 0:
 		# safety net to exit the loop if need be
-		for event in pygame.event.get():
-			if event.type == pygame.QUIT:
-				pygame.quit()
+		pump_events()
 		
 		# get current node
+		peak = max(peak, len(stack))
 		current = stack.pop()
-		if current is not start and current is not goal:
-			current.color = colors['open']
+		pops += 1
+		if on_expand:
+			on_expand(current)
+		if current != start and current != goal:
+			grid.set(current, OPEN)
 
 		# we've reached goal state
 		if current == goal:
-			reconstruct_path(prev_map, current, start, draw)
-			goal.color = colors['goal']
+			stats.add_counts(pops, pushes, pops, 0, peak)
+			finish_path(stats, grid, prev_map, current, start, draw, search_start)
+			grid.set(goal, GOAL)
 			return True
 		
-		for neighbor in current.neighbors:
-			if neighbor.color != colors['open'] and neighbor.color != colors['closed']:
+		i = current[0] * cols + current[1]
+		for step in steps[masks[i]]:
+			if grid.cells[i + step] != OPEN and grid.cells[i + step] != CLOSED:
+				neighbor = divmod(i + step, cols)
 				prev_map[neighbor] = current
 				stack.append(neighbor)
+				pushes += 1
+				if on_push:
+					on_push(neighbor)
 		
 		draw()
 
 		if current != start and current != goal:
-			current.color = colors['closed']
+			grid.set(current, CLOSED)
 
+	stats.add_counts(pops, pushes, pops, 0, peak)
+	stats.timed('search', search_start)
 	return False
 
-def breadth_first(draw, grid, start, goal):
+def breadth_first(draw, grid, start, goal, stats=None):
 	""" Runs Breadth first search algorithm on the grid """
+	stats = SearchStats() if stats is None else stats
+	on_expand, on_push = stats.on_expand, stats.on_push
+	masks, steps = adjacency(stats, grid)
+	cols = grid.cols
+	search_start = time.perf_counter()
+	peak = 1
 	queue = [start]
 	queue_hash = {start}
 	prev_map = {}
 	i = 0
 
 	def get_heuristic(node):
-		return euclidean_dist(node.get_pos(), goal.get_pos())
+		return euclidean_dist(node, goal)
 
 	while len(queue) > 0:
 		# safety net to exit the loop if need be
-		for event in pygame.event.get():
-			if event.type == pygame.QUIT:
-				pygame.quit()
+		pump_events()
 		
 		# get current node
+		peak = max(peak, len(queue))
 		current = queue.pop(0)
-		if current is not start and current is not goal:
-			current.color = colors['open']
+		if on_expand:
+			on_expand(current)
+		if current != start and current != goal:
+			grid.set(current, OPEN)
 
 		# we've reached goal state
 		if current == goal:
-			reconstruct_path(prev_map, current, start, draw)
-			goal.color = colors['goal']
+			expanded = len(queue_hash) - len(queue)
+			stats.add_counts(expanded, len(queue_hash), expanded, 0, peak)
+			finish_path(stats, grid, prev_map, current, start, draw, search_start)
+			grid.set(goal, GOAL)
 			return True
 
-		current.neighbors.sort(key=get_heuristic)
-		for neighbor in current.neighbors:
+		i = current[0] * cols + current[1]
+		successors = sorted((divmod(i + step, cols) for step in steps[masks[i]]), key=get_heuristic)
+		for neighbor in successors:
 			if neighbor not in queue_hash:
 				prev_map[neighbor] = current
 				queue.append(neighbor)
 				queue_hash.add(neighbor)
-				if neighbor is not start and current is not goal:
-					neighbor.color = colors['open']
+				if on_push:
+					on_push(neighbor)
+				if neighbor != start and current != goal:
+					grid.set(neighbor, OPEN)
 		draw()
 
 		if current != start and current != goal:
-			current.color = colors['closed']
+			grid.set(current, CLOSED)
 	
+	# every discovered cell was pushed and popped exactly once
+	stats.add_counts(len(queue_hash), len(queue_hash), len(queue_hash), 0, peak)
+	stats.timed('search', search_start)
 	# return none if no path is found
 	return False
 
-def best_first(draw, grid, start, goal):
+def best_first(draw, grid, start, goal, stats=None):
 	""" 
 	Runs Greedy best-first search on the grid
 
 	Nearly identical to DFS except we sort the successor states by their distance to the goal.
 	"""
-
+	stats = SearchStats() if stats is None else stats
+	on_expand, on_push = stats.on_expand, stats.on_push
+	masks, steps = adjacency(stats, grid)
+	cols = grid.cols
+	search_start = time.perf_counter()
 	stack = [start]
 	prev_map = {}
+	peak = pushes = 1
+	pops = 0
 
 	def get_heuristic(node):
-		return euclidean_dist(node.get_pos(), goal.get_pos())
+		return euclidean_dist(node, goal)
 
 	while len(stack) > 0:
 		# safety net to exit the loop if need be
-		for event in pygame.event.get():
-			if event.type == pygame.QUIT:
-				pygame.quit()
+		pump_events()
 		
 		# get current node
+		peak = max(peak, len(stack))
 		current = stack.pop()
-		if current is not start and current is not goal:
-			current.color = colors['open']
+		pops += 1
+		if on_expand:
+			on_expand(current)
+		if current != start and current != goal:
+			grid.set(current, OPEN)
 
 		# we've reached goal state
 		if current == goal:
-			reconstruct_path(prev_map, current, start, draw)
+			stats.add_counts(pops, pushes, pops, 0, peak)
+			finish_path(stats, grid, prev_map, current, start, draw, search_start)
 			return True
 
-		current.neighbors.sort(reverse=True, key=get_heuristic)
-		for neighbor in current.neighbors:
-			if neighbor.color != colors['open'] and neighbor.color != colors['closed']:
+		i = current[0] * cols + current[1]
+		successors = sorted((divmod(i + step, cols) for step in steps[masks[i]]), reverse=True, key=get_heuristic)
+		for neighbor in successors:
+			if grid.get(neighbor) != OPEN and grid.get(neighbor) != CLOSED:
 				prev_map[neighbor] = current
 				stack.append(neighbor)
+				pushes += 1
+				if on_push:
+					on_push(neighbor)
 		
 		draw()
 
 		if current != start and current != goal:
-			current.color = colors['closed']
+			grid.set(current, CLOSED)
 
+	stats.add_counts(pops, pushes, pops, 0, peak)
+	stats.timed('search', search_start)
 	# return none if no path is found
 	return False
 
-def a_star(draw, grid, start, goal):
-	""" Runs A* on the grid """
+def a_star(draw, grid, start, goal, stats=None, heuristic=euclidean_dist):
+	""" 
+	Runs A* on the grid
+
+	g scores only hold the cells the search reached, and improved cells are pushed onto the heap again
+	instead of being updated, skipping the stale entries when popped. heuristic is h or euclidean_dist.
+	"""
+	stats = SearchStats() if stats is None else stats
+	on_expand, on_push = stats.on_expand, stats.on_push
+	masks, steps = adjacency(stats, grid)
+	cols = grid.cols
+	search_start = time.perf_counter()
+	peak = 1
+	pops = reopens = expansions = 0
 	count = 0
-	open_set = PriorityQueue()
-	open_set.put((0, count, start))
+	open_set = [(heuristic(start, goal), count, start)]
 	# hashmap to keep track of the node's previous node
 	previous_map = {}
-	# g score set
-	g_score = {node: float("inf") for row in grid for node in row}
-	g_score[start] = 0
-	# f score set
-	f_score = {node: float("inf") for row in grid for node in row}
-	f_score[start] = euclidean_dist(start.get_pos(), goal.get_pos())
-
-	open_set_hash = {start}
+	# g score set, cells missing from it are at infinity
+	g_score = {start: 0}
+	closed = set()
+	weights = grid.weights
 
-	while not open_set.empty():
+	while open_set:
 		# safety net to exit the loop if need be
-		for event in pygame.event.get():
-			if event.type == pygame.QUIT:
-				pygame.quit()
+		pump_events()
 		
-		current = open_set.get()[2] # get the node with the lowest f score
-		open_set_hash.remove(current)
+		peak = max(peak, len(open_set))
+		current = heapq.heappop(open_set)[2] # get the node with the lowest f score
+		pops += 1
+		if current in closed:
+			continue
+		closed.add(current)
+		expansions += 1
+		if on_expand:
+			on_expand(current)
 
 		# if we've reached the goal
 		if current == goal:
-			reconstruct_path(previous_map, current, start, draw)
-			goal.color = colors['goal']
+			stats.add_counts(expansions, count + 1, pops, reopens, peak)
+			finish_path(stats, grid, previous_map, current, start, draw, search_start)
+			grid.set(goal, GOAL)
 			return True
 		
-		for neighbor in current.neighbors:
-			temp_g_score = g_score[current] + 1
-
-			if temp_g_score < g_score[neighbor]:
+		i = current[0] * cols + current[1]
+		for step in steps[masks[i]]:
+			neighbor = divmod(i + step, cols)
+			# moving onto a cell costs its terrain weight, like solvers.dijkstra
+			temp_g_score = g_score[current] + (1 if weights is None else weights[i + step])
+			if temp_g_score < g_score.get(neighbor, float("inf")):
 				previous_map[neighbor] = current
 				g_score[neighbor] = temp_g_score
-				f_score[neighbor] = temp_g_score + euclidean_dist(neighbor.get_pos(), goal.get_pos())
-				if neighbor not in open_set_hash:
-					count += 1
-					open_set.put((f_score[neighbor], count, neighbor))
-					open_set_hash.add(neighbor)
-					neighbor.color = colors['open']
+				count += 1
+				heapq.heappush(open_set, (temp_g_score + heuristic(neighbor, goal), count, neighbor))
+				if neighbor in closed:
+					closed.discard(neighbor)
+					reopens += 1
+				grid.set(neighbor, OPEN)
+				if on_push:
+					on_push(neighbor)
 		
 		draw()
 
 		if current != start and current != goal:
-			current.color = colors['closed']
+			grid.set(current, CLOSED)
+
+	stats.add_counts(expansions, count + 1, pops, reopens, peak)
+	stats.timed('search', search_start)
+	# return None if no path is found
+	return None
+
+def jump_point(draw, grid, start, goal, stats=None):
+	""" 
+	Runs Jump Point Search on the grid
+
+	A* over jump points only. Straight runs between jump points are skipped over in one step and filled in
+	when the path is reconstructed, so far fewer cells are pushed onto the open list on open areas. On a grid
+	with terrain weights jumps would miss the cheapest path, so A* is run instead.
+	"""
+	if grid.weights is not None and grid.max_weight() > 1:
+		return a_star(draw, grid, start, goal, stats, h)
+	stats = SearchStats() if stats is None else stats
+	on_expand, on_push = stats.on_expand, stats.on_push
+	masks = adjacency(stats, grid)[0]
+	cols = grid.cols
+	directions = jump_directions(cols)
+	goal_id = grid.index(goal)
+	search_start = time.perf_counter()
+	count = 0
+	open_set = [(h(start, goal), count, start)]
+	# hashmap to keep track of the jump point's previous jump point
+	previous_map = {}
+	g_score = {start: 0}
+	closed = set()
+	peak = 1
+	pops = 0
+
+	while open_set:
+		# safety net to exit the loop if need be
+		pump_events()
+
+		peak = max(peak, len(open_set))
+		current = heapq.heappop(open_set)[2] # get the jump point with the lowest f score
+		pops += 1
+		if current in closed:
+			continue
+		closed.add(current)
+		if on_expand:
+			on_expand(current)
+
+		# if we've reached the goal, fill in the straight runs between jump points
+		if current == goal:
+			stats.add_counts(len(closed), count + 1, pops, 0, peak)
+			reconstruct_start = stats.timed('search', search_start)
+			path = []
+			while current in previous_map:
+				for cell in reversed(interpolate(previous_map[current], current)):
+					path.append(cell)
+					if cell != goal:
+						grid.set(cell, PATH)
+						draw()
+				current = previous_map[current]
+			path.append(start)
+			path.reverse()
+			stats.timed('reconstruct', reconstruct_start)
+			stats.record_path(path)
+			return True
+
+		i = current[0] * cols + current[1]
+		parent = previous_map.get(current)
+		for bit, step in directions[arrival(cols, None if parent is None else parent[0] * cols + parent[1], i)]:
+			point = jump(masks, i, bit, step, goal_id)
+			if point is None:
+				continue
+			point = divmod(point, cols)
+			temp_g_score = g_score[current] + h(current, point)
+			if temp_g_score < g_score.get(point, float("inf")):
+				previous_map[point] = current
+				g_score[point] = temp_g_score
+				count += 1
+				heapq.heappush(open_set, (temp_g_score + h(point, goal), count, point))
+				if on_push:
+					on_push(point)
+				if point != goal:
+					grid.set(point, OPEN)
+
+		draw()
+
+		if current != start and current != goal:
+			grid.set(current, CLOSED)
 
+	stats.add_counts(len(closed), count + 1, pops, 0, peak)
+	stats.timed('search', search_start)
 	# return None if no path is found
-	return None
\ No newline at end of file
+	return None
+
+def d_star_lite(draw, grid, start, goal, planner=None, stats=None):
+	""" 
+	Runs D* Lite on the grid, reusing the planner from an earlier run when the goal is the same
+
+	Barriers and weights painted or erased since the planner last ran are picked up from the grid, so only the cells they
+	affect are expanded again. Returns the planner to pass to the next run.
+	"""
+	if planner is None or planner.grid is not grid or planner.goal != goal:
+		planner = DStarLite(grid, start, goal)
+	else:
+		if planner.start != start:
+			planner.move_start(start)
+		planner.sync()
+
+	path = planner.compute(stats)
+	for i in planner.expanded:
+		# cells turned into barriers are expanded too, to raise the cost around them
+		if i != planner.start_id and i != planner.goal_id and grid.cells[i] != BARRIER:
+			grid.cells[i] = CLOSED
+	draw()
+
+	if path:
+		for cell in path[1:-1]:
+			grid.set(cell, PATH)
+			draw()
+	return planner
@@ -1,12 +1,23 @@
 import pygame
-import math
-from queue import deque, PriorityQueue
 from Pathfinder import *
 from maze import Maze;
+from cache import PathCache, fingerprint
+from stats import SearchStats
+from steps import Trace, record
+from flowfield import FlowFields
+import mazefile
+from grid import Grid, BLANK, BARRIER, START, GOAL, OPEN, CLOSED, PATH, DOWN, RIGHT, UP, LEFT, changed_indices
 
 WIDTH = 800
-WIN = pygame.display.set_mode((WIDTH, WIDTH))
-pygame.display.set_caption("Pathfinding Simulator")
+FPS = 60
+# search steps played back each frame
+STEPS_PER_FRAME = 20
+TRACE_FILE = 'last.trace'
+BOARD_FILE = 'board.maze'
+# heaviest terrain the number keys paint, drawn in the full mud color
+BRUSH_MAX = 9
+# frames between the steps of agents following a flow field
+FRAMES_PER_MOVE = 6
 
 colors = {
     'closed'    : '#FF0000',    # red
@@ -18,76 +29,25 @@ colors = {
     'path'      : '#800080',    # path
     'start'     : '#FF8000',    # orange
     'grey'      : '#808080',    # grey
-    'goal'      : '#40E0D0'     # turquoise
+    'goal'      : '#40E0D0',    # turquoise
+    'mud'       : '#8B5A2B',    # brown, blended into blank cells by their weight
+    'arrow'     : '#A0A8B8'     # light grey, flow field directions
 }
 
-class Node:
-    """ 
-    Node object used to represent a cell in the grid for pathfinding purposes 
-    
-    row and col are the indicies of the node.
-    x and y are the screen-based coordinates of the node.
-    color is used to indicate what type of cell this is (wall, travelled, etc.).
-    width is the width of the cell.
-    """
-    def __init__(self, row, col, width, total_rows):
-        """ Initializes a new Node """
-        self.row = row
-        self.col = col
-        self.x = self.row * width
-        self.y = self.col * width
-        self.color = colors['blank']
-        self.width = width
-        self.total_rows = total_rows
-
-    def get_pos(self):
-        """ Gets the row and col of a node in the form ( row, col ) """
-        return self.row, self.col
-
-    def get_color(self):
-        """ Gets the color of the current node """
-        return self.color
-    
-    def set_color(self, color):
-        """ Sets the color of the current node """
-        self.color = color
-    
-    def draw(self, win):
-        """ draws the current node. """
-        pygame.draw.rect(win, self.color, (self.x, self.y, self.width, self.width))
-    
-    def find_neighbors(self, grid):
-        """ Gets all adjacent neighbors to the current cell. Used as a successor function
-        
-        Will do nothing if current node is a barrier node. 
-        Will not append a neighbor if that neighbor is a barrier. """
-        self.neighbors = []
-        # if we're a barrier node
-        if self.color == colors['barrier']:
-            return
-        # down case
-        if self.row < self.total_rows - 1 and not grid[self.row + 1][self.col].get_color() == colors['barrier']:
-            self.neighbors.append(grid[self.row + 1][self.col])
-        # right case
-        if self.col < self.total_rows - 1 and not grid[self.row][self.col + 1].get_color() == colors['barrier']:
-            self.neighbors.append(grid[self.row][self.col + 1])
-        # up case
-        if self.row > 0 and not grid[self.row - 1][self.col].get_color() == colors['barrier']:
-            self.neighbors.append(grid[self.row - 1][self.col])
-        # right case
-        if self.col > 0 and not grid[self.row][self.col - 1].get_color() == colors['barrier']:
-            self.neighbors.append(grid[self.row][self.col - 1])
+# color of each cell state, looked up only when drawing
+state_colors = {
+    BLANK       : colors['blank'],
+    BARRIER     : colors['barrier'],
+    START       : colors['start'],
+    GOAL        : colors['goal'],
+    OPEN        : colors['open'],
+    CLOSED      : colors['closed'],
+    PATH        : colors['path']
+}
 
 def make_grid(rows, width):
     """ Initializes the grid """
-    grid = []
-    gap = width // rows
-    for i in range(rows):
-        grid.append([])
-        for j in range(rows):
-            grid[i].append(Node(i, j, gap, rows))
-    
-    return grid
+    return Grid(rows)
 
 def draw_grid(win, rows, width):
     """ Draws the lines seperating the cells """
@@ -97,17 +57,98 @@ def draw_grid(win, rows, width):
     for j in range(rows + 1):
         pygame.draw.line(win, colors['grey'], (j * gap, 0), (j*gap, width))
 
-def draw(win, grid, rows, width):
-    """ Draws the grid and all cells to the screen """
-    win.fill(colors['blank'])
+# screen direction of each flow field step, as ( x, y ) since rows run along x on screen
+ARROWS = {DOWN: (1, 0), RIGHT: (0, 1), UP: (-1, 0), LEFT: (0, -1)}
+
+class Renderer:
+    """
+    Draws the grid to the window, redrawing only the cells that changed since the last frame
+
+    The blank board with its grid lines is rendered once to a background surface, and every cell state
+    has a pre-rendered tile with its color and the grid lines on its edges. Each frame compares the
+    cells against a copy of the last drawn frame, blits the tiles of the changed cells and passes only
+    their rects to pygame.display.update, so a frame costs the number of changed cells, not the grid area.
 
-    for row in grid:
-        for node in row:
-            node.draw(win)
-    
-    draw_grid(win, rows, width)
+    A flow field passed to draw is shown as an arrow on every cell, pointing at its next step.
+    """
+    def __init__(self, win, rows, width):
+        """ Pre-renders the background and the cell tiles """
+        self.win = win
+        self.gap = width // rows
+        self.background = pygame.Surface((width, width))
+        self.background.fill(colors['blank'])
+        draw_grid(self.background, rows, width)
+        self.tiles = {state: self.make_tile(color) for state, color in state_colors.items()}
+        self.weight_tiles = {}
+        # the cells and weights as they were last drawn, None until the first full draw
+        self.drawn = None
+
+    def make_tile(self, color):
+        """ Renders one cell filled with color """
+        tile = pygame.Surface((self.gap, self.gap))
+        tile.fill(color)
+        # the top and left grid lines of a cell are drawn over it
+        pygame.draw.line(tile, colors['grey'], (0, 0), (self.gap, 0))
+        pygame.draw.line(tile, colors['grey'], (0, 0), (0, self.gap))
+        return tile
+
+    def draw_cell(self, grid, i, field=None):
+        """ Blits the tile of one cell and returns its rect, blank cells are shaded by their weight """
+        row, col = grid.position(i)
+        state = grid.cells[i]
+        if state == BLANK and grid.weights is not None and grid.weights[i] != 1:
+            weight = grid.weights[i]
+            if weight not in self.weight_tiles:
+                mix = min(1, (weight - 1) / (BRUSH_MAX - 1))
+                self.weight_tiles[weight] = self.make_tile(pygame.Color(colors['blank']).lerp(colors['mud'], mix))
+            tile = self.weight_tiles[weight]
+        else:
+            tile = self.tiles[state]
+        rect = self.win.blit(tile, (row * self.gap, col * self.gap))
+        if field is not None and field.directions[i]:
+            dx, dy = ARROWS[field.directions[i]]
+            center = (row * self.gap + self.gap // 2, col * self.gap + self.gap // 2)
+            reach = self.gap * 3 // 8
+            tip = (center[0] + dx * reach, center[1] + dy * reach)
+            pygame.draw.line(self.win, colors['arrow'], center, tip)
+            pygame.draw.circle(self.win, colors['arrow'], tip, max(1, self.gap // 10))
+        return rect
+
+    def frame(self, grid, field=None):
+        """ Gets what a frame shows as bytes, the cells followed by the weights and field directions if there are any """
+        frame = bytes(grid.cells)
+        if grid.weights is not None:
+            frame += bytes(grid.weights)
+        if field is not None:
+            frame += bytes(field.directions)
+        return frame
+
+    def draw_all(self, grid, field=None):
+        """ Draws the background and every non blank, weighted or field cell and updates the whole window """
+        self.win.blit(self.background, (0, 0))
+        weights = grid.weights
+        for i, state in enumerate(grid.cells):
+            if state != BLANK or (weights is not None and weights[i] != 1) or (field is not None and field.directions[i]):
+                self.draw_cell(grid, i, field)
+        pygame.display.update()
+        self.drawn = self.frame(grid, field)
+
+    def draw(self, grid, field=None):
+        """ Redraws the cells whose state, weight or field direction changed since the last frame """
+        frame = self.frame(grid, field)
+        if self.drawn is None or len(self.drawn) != len(frame):
+            self.draw_all(grid, field)
+            return
+        if frame == self.drawn:
+            return
 
-    pygame.display.update()
+        n = len(grid.cells)
+        rects = []
+        for i in changed_indices(self.drawn, frame):
+            # indices past the cells are the weights or directions of cell i % n
+            rects.append(self.draw_cell(grid, i % n, field))
+        pygame.display.update(rects)
+        self.drawn = frame
 
 def get_clicked_node(pos, rows, width):
     """ Converts screen coordinates to indicies of the grid """
@@ -115,10 +156,33 @@ def get_clicked_node(pos, rows, width):
     x, y = pos
     return x // gap, y // gap
 
+def set_cell(grid, cache, layout, node, state):
+    """ Sets the state of a cell and returns the new wall layout fingerprint, letting the cache know about barrier edits """
+    if (grid.get(node) == BARRIER) != (state == BARRIER):
+        layout = cache.edit(layout, node)
+    grid.set(node, state)
+    return layout
+
+def set_weight(grid, cache, layout, node, weight):
+    """ Sets the terrain weight of a cell and returns the new layout fingerprint, letting the cache know """
+    layout = cache.reweight(layout, node, grid.weight(node), weight)
+    grid.set_weight(node, weight)
+    return layout
+
+def store(cache, grid, layout, name, start, goal):
+    """ Puts the search painted on the grid into the cache """
+    result = tuple([i for i, cell in enumerate(grid.cells) if cell == state] for state in (OPEN, CLOSED, PATH))
+    expanded = {grid.position(i) for i in result[1] + result[2]} | {start, goal}
+    cache.put(layout, name, start, goal, result, expanded)
+    print(cache.info())
+
 def main(win, width):
     """ Main loop of the application """
     ROWS = 50
     grid = make_grid(ROWS, width)
+    renderer = Renderer(win, ROWS, width)
+    cache = PathCache()
+    layout = fingerprint(grid)
 
     start = None
     goal = None
@@ -126,12 +190,59 @@ def main(win, width):
     run = True
     started = False
 
-    algos = [a_star, best_first, depth_first, breadth_first]
+    algos = ['a_star', 'best_first', 'depth_first', 'breadth_first', 'jump_point', 'dijkstra', 'dial', 'd_star_lite']
+    # kept between runs so D* Lite only repairs what changed
+    planner = None
     cur_algo = 0
+    # weight painted by left clicks once start and goal are placed, 0 paints barriers
+    brush = 0
+    # trace being played back a few steps per frame, and the last one recorded
+    playback = None
+    position = 0
+    trace = None
+    # flow fields of the grid by goal, the one shown, and the agents placed or walking along it
+    fields = FlowFields(grid)
+    flow = False
+    field = None
+    agents = []
+    walking = False
+    frames = 0
+    clock = pygame.time.Clock()
 
     # main loop - draw the grid and then run every pygame event
     while run:
-        draw(win, grid, ROWS, width)
+        if walking:
+            frames += 1
+            if frames % FRAMES_PER_MOVE == 0:
+                for node in agents:
+                    if grid.get(node) == START:
+                        grid.set(node, BLANK)
+                moved = field.advance(agents)
+                # agents that reached the goal leave, the ones that cannot reach it stay put
+                done = moved == agents
+                agents = [node for node in moved if node != goal]
+                for node in agents:
+                    grid.set(node, START)
+                if done or not agents:
+                    walking = False
+                    started = False
+            clock.tick(FPS)
+        elif field is not None:
+            if field.goal != goal:
+                field = None
+            else:
+                # repairs the shown field as barriers and weights are painted
+                field.sync()
+        if playback is not None:
+            position = playback.apply(grid, position, position + STEPS_PER_FRAME)
+            if position == len(playback):
+                if playback.stats is not None:
+                    print(playback.stats)
+                store(cache, grid, layout, playback.algorithm, start, goal)
+                playback = None
+                started = False
+            clock.tick(FPS)
+        renderer.draw(grid, field)
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 run = False
@@ -145,59 +256,162 @@ def main(win, width):
                 row, col = get_clicked_node(pos, ROWS, width)
                 if col >= ROWS or row >= ROWS:
                     continue
-                node = grid[row][col]
+                node = (row, col)
                 if not start and node != goal:
                     start = node
-                    node.color = colors['start']
+                    layout = set_cell(grid, cache, layout, node, START)
                 elif not goal and node != start:
                     goal = node
-                    node.color = colors['goal']
+                    layout = set_cell(grid, cache, layout, node, GOAL)
+                elif node != goal and node != start and brush:
+                    layout = set_weight(grid, cache, layout, node, brush)
                 elif node != goal and node != start:
-                    node.color = colors['barrier']
+                    layout = set_cell(grid, cache, layout, node, BARRIER)
                 
             # right click
             elif pygame.mouse.get_pressed()[2]: 
                 pos = pygame.mouse.get_pos()
                 row, col = get_clicked_node(pos, ROWS, width)
-                node = grid[row][col]
-                node.color = colors['blank']
+                if col >= ROWS or row >= ROWS:
+                    continue
+                node = (row, col)
+                layout = set_cell(grid, cache, layout, node, BLANK)
+                layout = set_weight(grid, cache, layout, node, 1)
                 if start == node:
                     start = None
                 elif goal == node:
                     goal = None
+                elif node in agents:
+                    agents.remove(node)
             
             if event.type == pygame.KEYDOWN:
+                # Start button pressed in flow field mode, every agent walks the field to the goal
+                if event.key == pygame.K_SPACE and flow and goal and (start or agents):
+                    grid.clear()
+                    stats = SearchStats()
+                    field = fields.field(goal, stats)
+                    print(stats)
+                    print(fields.info())
+                    # the start walks with the other agents
+                    agents = ([start] if start else []) + agents
+                    start = None
+                    for node in agents:
+                        grid.set(node, START)
+                    walking = started = True
+                    frames = 0
+
                 # Start button pressed
-                if event.key == pygame.K_SPACE and not started and start and goal: 
+                elif event.key == pygame.K_SPACE and not started and start and goal: 
                     # clear previous runs
                     started = True
-                    for row in grid:
-                        for node in row:
-                            if node is not start and node is not goal and node.color is not colors['barrier']:
-                                node.color = colors['blank']
-                    
-                    # update the neighbors of each node
-                    for row in grid:
-                        for node in row:
-                            node.find_neighbors(grid)
-                    # run the search
-                    algos[cur_algo](lambda: draw(win, grid, ROWS, width), grid, start, goal)
+                    grid.clear()
+                    name = algos[cur_algo]
+                    if name == 'jump_point' and grid.max_weight() > 1:
+                        # jumps assume every move costs the same, so on terrain they miss the cheapest path
+                        print("jump_point ignores terrain weights, running dijkstra instead")
+                        name = 'dijkstra'
+                    cached = cache.get(layout, name, start, goal)
+                    if cached is not None:
+                        # same walls, algorithm and endpoints as an earlier run, replay its result
+                        for state, cells in zip((OPEN, CLOSED, PATH), cached):
+                            for i in cells:
+                                grid.cells[i] = state
+                        print(cache.info())
+                    elif name == 'd_star_lite':
+                        # D* Lite keeps its planner between runs, so it is drawn as it searches
+                        stats = SearchStats()
+                        planner = d_star_lite(lambda: renderer.draw(grid), grid, start, goal, planner, stats)
+                        print(stats)
+                        store(cache, grid, layout, name, start, goal)
+                    else:
+                        # record the search headless and play it back from the main loop
+                        trace = playback = record(grid, start, goal, name)
+                        position = 0
+                        continue
                     started = False
 
+                # number keys pressed, 1 to 9 paint terrain of that weight and 0 paints barriers
+                elif pygame.K_0 <= event.key <= pygame.K_9:
+                    brush = event.key - pygame.K_0
+
+                # f key pressed, toggle flow field mode
+                elif event.key == pygame.K_f:
+                    flow = not flow
+                    if not flow:
+                        field = None
+                    print("flow field mode %s" % ("on" if flow else "off"))
+
+                # a key pressed in flow field mode, place another agent under the mouse
+                elif event.key == pygame.K_a and flow:
+                    row, col = get_clicked_node(pygame.mouse.get_pos(), ROWS, width)
+                    node = (row, col)
+                    if row < ROWS and col < ROWS and grid.get(node) == BLANK:
+                        agents.append(node)
+                        grid.set(node, START)
+
+                # t key pressed, save the last recorded search
+                elif event.key == pygame.K_t and trace is not None:
+                    trace.save(TRACE_FILE)
+                    print("saved %d steps to %s" % (len(trace), TRACE_FILE))
+
+                # y key pressed, replay the saved search
+                elif event.key == pygame.K_y:
+                    try:
+                        loaded = Trace.load(TRACE_FILE)
+                    except (OSError, ValueError) as error:
+                        print(error)
+                        continue
+                    if loaded.rows != loaded.cols or loaded.rows > width:
+                        print("%s is %dx%d, it must be square and fit the window" % (TRACE_FILE, loaded.rows, loaded.cols))
+                        continue
+                    ROWS = loaded.rows
+                    renderer = Renderer(win, ROWS, width)
+                    grid = loaded.grid()
+                    start, goal = loaded.start, loaded.goal
+                    layout = fingerprint(grid)
+                    fields, field, agents = FlowFields(grid), None, []
+                    playback = loaded
+                    position = 0
+                    started = True
+
+                # s key pressed, save the walls, weights, start and goal
+                elif event.key == pygame.K_s:
+                    mazefile.save(BOARD_FILE, grid, start, goal)
+                    print("saved board to %s" % BOARD_FILE)
+
+                # l key pressed, load the saved board
+                elif event.key == pygame.K_l:
+                    try:
+                        board = mazefile.load(BOARD_FILE)
+                    except (OSError, ValueError) as error:
+                        print(error)
+                        continue
+                    with board:
+                        if board.rows != board.cols or board.rows > width:
+                            print("%s is %dx%d, it must be square and fit the window" % (BOARD_FILE, board.rows, board.cols))
+                            continue
+                        ROWS = board.rows
+                        renderer = Renderer(win, ROWS, width)
+                        grid = board.to_grid()
+                        start, goal = board.entrance, board.exit
+                    for node, state in ((start, START), (goal, GOAL)):
+                        if node is not None:
+                            grid.set(node, state)
+                    layout = fingerprint(grid)
+                    fields, field, agents = FlowFields(grid), None, []
+
                 # reset key pressed
                 elif event.key == pygame.K_r and not started: 
                     start = None
                     goal = None
-                    for row in grid:
-                        for node in row:
-                            node.color = colors['blank']
+                    grid.reset()
+                    layout = fingerprint(grid)
+                    field, agents = None, []
                 
                 # clear key pressed
                 elif event.key == pygame.K_c and not started: 
-                    for row in grid:
-                        for node in row:
-                            if node is not start and node is not goal and node.color is not colors['barrier']:
-                                node.color = colors['blank']
+                    grid.clear()
+                    field = None
                 
                 # left key pressed, cycle algorithm right
                 elif event.key == pygame.K_RIGHT: 
@@ -214,18 +428,17 @@ def main(win, width):
                 # enter key pressed, generate maze
                 elif event.key == pygame.K_RETURN:
                     maze = Maze(ROWS, ROWS)
-                    for i in range(len(grid)):
-                        for j in range(len(grid[i])):
-                            if maze.maze[i][j] == 'w':
-                                grid[i][j].set_color(colors['barrier'])
-                            else:
-                                grid[i][j].set_color(colors['blank'])
-                    start = grid[maze.entrance[0]][maze.entrance[1]]
-                    goal = grid[maze.exit[0]][maze.exit[1]]
-                    start.set_color(colors['start'])
-                    goal.set_color(colors['goal'])
+                    grid = maze.to_grid()
+                    start = tuple(maze.entrance)
+                    goal = tuple(maze.exit)
+                    grid.set(start, START)
+                    grid.set(goal, GOAL)
+                    layout = fingerprint(grid)
+                    fields, field, agents = FlowFields(grid), None, []
             
     pygame.quit()
 
 if __name__ == "__main__":
+    WIN = pygame.display.set_mode((WIDTH, WIDTH))
+    pygame.display.set_caption("Pathfinding Simulator")
     main(WIN, WIDTH)
\ No newline at end of file
@@ -0,0 +1,89 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from grid import Grid, as_grid
+import solvers
+
+# set in each worker process by attach
+_worker_grid = None
+_worker_memory = None
+
+def attach(name, rows, cols, weighted):
+    """ Pool initializer. Maps the shared grid into the worker once, for every query it will run """
+    global _worker_grid, _worker_memory
+    _worker_memory = shared_memory.SharedMemory(name=name)
+    n = rows * cols
+    # weights, if any, follow the cells in the same block
+    weights = _worker_memory.buf[n:2 * n] if weighted else None
+    _worker_grid = Grid(rows, cols, _worker_memory.buf[:n], weights)
+
+def solve_chunk(algorithm, chunk, details):
+    """ Runs one algorithm on a chunk of ( index, start, goal ) queries against the shared grid """
+    search = solvers.algorithms[algorithm]
+    results = []
+    for index, start, goal in chunk:
+        result = search(_worker_grid, tuple(start), tuple(goal))
+        results.append((index, result if details else result.path))
+    return results
+
+class BatchSolver:
+    """
+    Runs many ( start, goal ) queries against one grid over a pool of worker processes
+
+    The grid and its weights are copied into shared memory once and every worker maps them when it
+    starts, so queries only send their endpoints across processes. Use as a context manager, or call close when done.
+
+    algorithm is a key of solvers.algorithms.
+    details returns full SearchResults instead of paths only, which is much more to send back.
+    """
+    def __init__(self, board, algorithm='a_star', workers=None, chunksize=64, details=False):
+        """ Copies the grid into shared memory and starts the pool """
+        if algorithm not in solvers.algorithms:
+            raise ValueError("unknown algorithm %r" % algorithm)
+        grid = as_grid(board)
+        self.algorithm = algorithm
+        self.chunksize = chunksize
+        self.details = details
+        n = len(grid.cells)
+        weighted = grid.weights is not None
+        self.memory = shared_memory.SharedMemory(create=True, size=max(2 * n if weighted else n, 1))
+        self.memory.buf[:n] = grid.cells
+        if weighted:
+            self.memory.buf[n:2 * n] = grid.weights
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=attach,
+                                        initargs=(self.memory.name, grid.rows, grid.cols, weighted))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Shuts the pool down and frees the shared grid """
+        self.pool.shutdown()
+        self.memory.close()
+        self.memory.unlink()
+
+    def submit(self, queries):
+        """ Splits the queries into chunks and submits them, returning the futures in order """
+        numbered = [(i, start, goal) for i, (start, goal) in enumerate(queries)]
+        return [self.pool.submit(solve_chunk, self.algorithm, numbered[i:i + self.chunksize], self.details)
+                for i in range(0, len(numbered), self.chunksize)]
+
+    def solve(self, queries):
+        """ Solves every query and returns the results in the same order as the queries """
+        results = []
+        for future in self.submit(queries):
+            results.extend(result for index, result in future.result())
+        return results
+
+    def stream(self, queries):
+        """ Solves every query, yielding ( index, result ) pairs as soon as each chunk completes """
+        for future in as_completed(self.submit(queries)):
+            yield from future.result()
+
+def solve_many(board, queries, algorithm='a_star', workers=None, chunksize=64, details=False):
+    """ Solves a list of ( start, goal ) queries on one grid or maze across a process pool, in order """
+    with BatchSolver(board, algorithm, workers, chunksize, details) as batch:
+        return batch.solve(queries)
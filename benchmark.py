@@ -0,0 +1,199 @@
+import csv
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tracemalloc
+from grid import Grid, BARRIER, BLANK
+from maze import Maze
+from incremental import DStarLite
+from hierarchical import HierarchicalGrid
+from corridors import CorridorGraph
+import solvers
+
+try:
+    import wavefront
+except ImportError:
+    # numpy is optional, the wavefront engine is skipped without it
+    wavefront = None
+
+FIELDS = ['kind', 'map', 'size', 'algorithm', 'seconds', 'expanded', 'peak_frontier', 'peak_memory', 'path_length']
+
+MAPS = ['maze', 'random', 'open']
+
+def make_map(kind, size, seed):
+    """ Builds a seeded benchmark map and returns ( grid, start, goal ) """
+    if kind == 'maze':
+        maze = Maze(size, size, seed)
+        return maze.to_grid(), tuple(maze.entrance), tuple(maze.exit)
+
+    grid = Grid(size)
+    if kind == 'random':
+        rng = random.Random(seed)
+        grid.cells[:] = bytes(BARRIER if rng.random() < 0.2 else BLANK for i in range(len(grid)))
+    start, goal = (0, 0), (size - 1, size - 1)
+    grid.set(start, BLANK)
+    grid.set(goal, BLANK)
+    return grid, start, goal
+
+def run_d_star_lite(grid, start, goal):
+    """ Runs a fresh D* Lite search. Returns ( path, expanded, peak frontier ) """
+    planner = DStarLite(grid, start, goal)
+    path = planner.compute()
+    return path, len(planner.expanded), planner.stats.peak_open
+
+def run_wavefront(grid, start, goal):
+    """ Runs the wavefront engine. Returns ( path, cells reached, peak frontier ) """
+    dist = wavefront.distance_field(grid, start, goal)
+    return wavefront.path_from_field(dist, goal), int((dist != wavefront.UNREACHED).sum()), None
+
+def run_hpa(grid, start, goal):
+    """ Builds the HPA* abstraction and runs one query. Returns ( path, abstract nodes expanded, peak frontier ) """
+    path, expanded = HierarchicalGrid(grid).search(start, goal)
+    return path, expanded, None
+
+def run_corridors(grid, start, goal):
+    """ Builds the junction graph and runs one query. Returns ( path, junctions expanded, peak frontier ) """
+    result = CorridorGraph(grid).solve(start, goal)
+    return result.path, result.stats.expansions, result.stats.peak_open
+
+def solver_runners():
+    """ Gets every benchmarked solver as name -> function returning ( path, expanded, peak frontier ) """
+    runners = {}
+    for name, search in solvers.algorithms.items():
+        def run(grid, start, goal, search=search):
+            result = search(grid, start, goal)
+            return result.path, len(result.order), result.stats.peak_open
+        runners[name] = run
+    runners['d_star_lite'] = run_d_star_lite
+    runners['hpa'] = run_hpa
+    runners['corridors'] = run_corridors
+    if wavefront is not None:
+        runners['wavefront'] = run_wavefront
+    return runners
+
+def measure(func, repeat, memory):
+    """ Calls func repeat times and returns ( its last output, best time, peak traced memory in bytes or None ) """
+    best = float("inf")
+    for i in range(repeat):
+        t0 = time.perf_counter()
+        output = func()
+        best = min(best, time.perf_counter() - t0)
+
+    peak = None
+    if memory:
+        # traced separately since tracemalloc slows everything down
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return output, best, peak
+
+def run(sizes, maps, algorithms, seed=0, repeat=1, memory=True, log=sys.stderr):
+    """ Runs the benchmark matrix and returns a list of records, one per generator or solver run """
+    runners = solver_runners()
+    records = []
+    for size in sizes:
+        maze, seconds, peak = measure(lambda: Maze(size, size, seed), repeat, memory)
+        records.append(dict(kind='generate', map='maze', size=size, algorithm='prim', seconds=seconds,
+                            expanded=maze.stats.expansions, peak_frontier=maze.stats.peak_open, peak_memory=peak, path_length=None))
+        print("generate prim %d: %.4fs" % (size, seconds), file=log)
+
+        for kind in maps:
+            grid, start, goal = make_map(kind, size, seed)
+            for name in algorithms or runners:
+                (path, expanded, frontier), seconds, peak = measure(lambda: runners[name](grid, start, goal), repeat, memory)
+                records.append(dict(kind='solve', map=kind, size=size, algorithm=name, seconds=seconds,
+                                    expanded=expanded, peak_frontier=frontier, peak_memory=peak,
+                                    path_length=len(path) if path else None))
+                print("solve %s %s %d: %.4fs" % (name, kind, size, seconds), file=log)
+    return records
+
+def save(records, path):
+    """ Writes records to a .json file with run metadata, or to a .csv file """
+    if path.endswith('.csv'):
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+        return
+    meta = {'python': platform.python_version(), 'platform': platform.platform(), 'time': time.time()}
+    with open(path, 'w') as f:
+        json.dump({'meta': meta, 'records': records}, f, indent=1)
+
+def load(path):
+    """ Reads records written by save """
+    if path.endswith('.csv'):
+        with open(path, newline='') as f:
+            return [{key: (None if value == '' else value if key in ('kind', 'map', 'algorithm') else float(value))
+                     for key, value in row.items()} for row in csv.DictReader(f)]
+    with open(path) as f:
+        return json.load(f)['records']
+
+def compare(baseline, current, threshold=1.2):
+    """
+    Matches records by kind, map, size and algorithm and compares their times
+
+    Returns a list of ( key, baseline seconds, current seconds, ratio, regressed ) where regressed means the
+    current run is more than threshold times slower, or its path length changed.
+    """
+    def key(record):
+        return (record['kind'], record['map'], int(record['size']), record['algorithm'])
+
+    before = {key(record): record for record in baseline}
+    rows = []
+    for record in current:
+        old = before.get(key(record))
+        if old is None:
+            continue
+        ratio = record['seconds'] / old['seconds'] if old['seconds'] else float("inf")
+        changed = old['path_length'] != record['path_length']
+        rows.append((key(record), old['seconds'], record['seconds'], ratio, ratio > threshold or changed))
+    return rows
+
+def print_comparison(rows, file=sys.stdout):
+    """ Prints the result of compare as a table """
+    for (kind, kind_map, size, algorithm), old, new, ratio, regressed in rows:
+        print("%-8s %-6s %6d %-14s %10.4fs %10.4fs %6.2fx%s" % (kind, kind_map, size, algorithm, old, new, ratio,
+              "  REGRESSION" if regressed else ""), file=file)
+
+def main(argv=None):
+    """ Command line entry point, see --help """
+    parser = argparse.ArgumentParser(description="Benchmarks every maze generator and solver without a display")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help="run the benchmark matrix")
+    run_parser.add_argument('--sizes', default='50,200,1000', help="comma separated grid sizes")
+    run_parser.add_argument('--maps', default=','.join(MAPS), help="comma separated map kinds: " + ', '.join(MAPS))
+    run_parser.add_argument('--algorithms', default='', help="comma separated solvers, all of them by default")
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('--repeat', type=int, default=1, help="runs per measurement, the fastest is kept")
+    run_parser.add_argument('--no-memory', action='store_true', help="skip the traced run that measures peak memory")
+    run_parser.add_argument('--output', default='benchmark.json', help="output file, .json or .csv")
+    run_parser.add_argument('--baseline', help="earlier output to compare this run against")
+    run_parser.add_argument('--threshold', type=float, default=1.2, help="slowdown ratio that counts as a regression")
+
+    compare_parser = commands.add_parser('compare', help="compare two earlier outputs")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=1.2)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        algorithms = [name for name in args.algorithms.split(',') if name]
+        records = run([int(size) for size in args.sizes.split(',')], args.maps.split(','), algorithms,
+                      args.seed, args.repeat, not args.no_memory)
+        save(records, args.output)
+        if not args.baseline:
+            return 0
+        rows = compare(load(args.baseline), records, args.threshold)
+    else:
+        rows = compare(load(args.baseline), load(args.current), args.threshold)
+
+    print_comparison(rows)
+    return 1 if any(row[4] for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
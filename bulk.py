@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import random
+from collections import deque
+from maze import Maze
+import mazefile
+
+def item_seed(seed, index):
+    """
+    Gets the seed of maze index in a set generated from seed
+
+    It only depends on the two numbers, so any maze of a set can be made again on its own without the
+    ones before it. It is a 63 bit integer so maze files keep it.
+    """
+    return random.Random("%d:%d" % (seed, index)).getrandbits(63)
+
+def item_maze(seed, index, rows, cols):
+    """ Regenerates maze index of a set generated from seed """
+    return Maze(rows, cols, item_seed(seed, index))
+
+def generate_chunk(seed, start, stop, rows, cols):
+    """ Generates mazes start to stop - 1 of a set and returns them as maze file records written back to back """
+    return b''.join(mazefile.dumps(item_maze(seed, index, rows, cols)) for index in range(start, stop))
+
+def shard_path(output, shard):
+    """ Gets the file a shard of a set is written to """
+    return os.path.join(output, "shard-%05d.mazes" % shard)
+
+def generate(output, count, rows, cols, seed=0, workers=None, chunksize=16, shard_size=0, log=None):
+    """
+    Generates count seeded rows x cols mazes across a process pool and streams them to disk
+
+    Maze i of the set is Maze( rows, cols, item_seed( seed, i ) ). The mazes are maze file records written
+    back to back in index order, see mazefile.records, into the file output, or with shard_size into
+    files of shard_size mazes each in the directory output. Only a few chunks per worker are in flight,
+    so memory does not grow with count. Throughput is printed to log every few seconds.
+    Returns a dict of the counts and rates of the run.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count()
+    if shard_size:
+        os.makedirs(output, exist_ok=True)
+    chunksize = min(chunksize, shard_size) if shard_size else chunksize
+    chunks = deque()
+    start = 0
+    while start < count:
+        stop = min(start + chunksize, count)
+        if shard_size:
+            # chunks never straddle two shards
+            stop = min(stop, (start // shard_size + 1) * shard_size)
+        chunks.append((start, stop))
+        start = stop
+
+    start_time = report_time = time.perf_counter()
+    written = done = 0
+    f = None if shard_size else open(output, 'wb')
+    shard = -1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        try:
+            while chunks or pending:
+                while chunks and len(pending) < 2 * workers:
+                    start, stop = chunks.popleft()
+                    pending.append((start, stop, pool.submit(generate_chunk, seed, start, stop, rows, cols)))
+                start, stop, future = pending.popleft()
+                data = future.result()
+                if shard_size and start // shard_size != shard:
+                    if f is not None:
+                        f.close()
+                    shard = start // shard_size
+                    f = open(shard_path(output, shard), 'wb')
+                f.write(data)
+                written += len(data)
+                done = stop
+
+                now = time.perf_counter()
+                if log and now - report_time >= 5:
+                    report_time = now
+                    print("%d of %d mazes, %.1f mazes/s" % (done, count, done / (now - start_time)), file=log)
+        finally:
+            for start, stop, future in pending:
+                future.cancel()
+            if f is not None:
+                f.close()
+
+    seconds = time.perf_counter() - start_time
+    summary = dict(count=count, rows=rows, cols=cols, workers=workers, seconds=seconds, bytes=written,
+                   mazes_per_second=count / seconds if seconds else 0.0,
+                   cells_per_second=count * rows * cols / seconds if seconds else 0.0)
+    if log:
+        print("%d %dx%d mazes in %.2fs on %d workers: %.1f mazes/s, %.2fM cells/s, %.2f MB written" % (
+              count, rows, cols, seconds, workers, summary['mazes_per_second'],
+              summary['cells_per_second'] / 1e6, written / 1e6), file=log)
+    return summary
+
+def open_item(output, index, shard_size=0):
+    """
+    Opens maze index of a set written by generate as a MazeFile, without reading the others
+
+    Every maze of a set has the same size in bytes, so its offset is found from the first one.
+    """
+    path = output
+    if shard_size:
+        path = shard_path(output, index // shard_size)
+        index %= shard_size
+    with mazefile.MazeFile(path) as first:
+        size = first.size
+    return mazefile.MazeFile(path, index * size)
+
+def check(output, seed, indices, shard_size=0):
+    """ Regenerates the given mazes of a set from seed and returns the indices whose stored maze differs """
+    wrong = []
+    for index in indices:
+        with open_item(output, index, shard_size) as board:
+            stored = board.map[board.offset:board.offset + board.size]
+        maze = item_maze(seed, index, board.rows, board.cols)
+        if board.seed != item_seed(seed, index) or stored != mazefile.dumps(maze):
+            wrong.append(index)
+    return wrong
+
+def main(argv=None):
+    """ Command line entry point, see --help """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generates large seeded sets of mazes over a process pool")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help="generate a set of mazes into a file or shards")
+    generate_parser.add_argument('output', help="output file, or directory with --shard-size")
+    generate_parser.add_argument('--count', type=int, default=1000)
+    generate_parser.add_argument('--rows', type=int, default=50)
+    generate_parser.add_argument('--cols', type=int, default=50)
+    generate_parser.add_argument('--seed', type=int, default=0)
+    generate_parser.add_argument('--workers', type=int, help="worker processes, one per core by default")
+    generate_parser.add_argument('--chunksize', type=int, default=16, help="mazes per task")
+    generate_parser.add_argument('--shard-size', type=int, default=0, help="mazes per shard file, 0 for one file")
+
+    check_parser = commands.add_parser('check', help="regenerate a sample of a set and compare it to the stored mazes")
+    check_parser.add_argument('output')
+    check_parser.add_argument('--count', type=int, required=True)
+    check_parser.add_argument('--seed', type=int, default=0)
+    check_parser.add_argument('--shard-size', type=int, default=0)
+    check_parser.add_argument('--sample', type=int, default=10, help="mazes to regenerate")
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        generate(args.output, args.count, args.rows, args.cols, args.seed, args.workers, args.chunksize,
+                 args.shard_size, sys.stderr)
+        return 0
+
+    indices = sorted(random.sample(range(args.count), min(args.sample, args.count)))
+    wrong = check(args.output, args.seed, indices, args.shard_size)
+    print("%d of %d sampled mazes match" % (len(indices) - len(wrong), len(indices)))
+    return 1 if wrong else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+from collections import OrderedDict, namedtuple
+from grid import BARRIER
+import solvers
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'invalidations', 'evictions', 'maxsize', 'currsize'])
+
+# algorithms whose result depends on more than the cells they expand, jump point search scans past its
+# expansions and D* Lite only expands what changed since its last run, so any edit to their layout affects them
+SCANNING = {'jump_point', 'd_star_lite'}
+
+MASK = (1 << 64) - 1
+
+def cell_key(pos):
+    """ Gets a well mixed 64 bit key for ( row, col ) using splitmix64. Barrier keys are xor-ed into a fingerprint """
+    z = ((pos[0] << 32) + pos[1] + 0x9E3779B97F4A7C15) & MASK
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK
+    return z ^ (z >> 31)
+
+def weight_key(pos, weight):
+    """ Gets the key of a terrain weight at ( row, col ), 0 for the default weight of 1 """
+    if weight == 1:
+        return 0
+    return cell_key((weight, cell_key(pos)))
+
+def fingerprint(grid):
+    """
+    Gets the fingerprint of the wall layout and terrain weights of a grid
+
+    The fingerprint is the xor of the keys of every barrier cell, of every weight other than 1 and of the
+    grid dimensions, so painting or erasing one barrier changes it by exactly cell_key of that cell.
+    """
+    value = cell_key((grid.rows, -grid.cols - 1))
+    cells = grid.cells
+    i = cells.find(BARRIER)
+    while i != -1:
+        value ^= cell_key(grid.position(i))
+        i = cells.find(BARRIER, i + 1)
+    if grid.weights is not None:
+        for i, weight in enumerate(grid.weights):
+            if weight != 1:
+                value ^= weight_key(grid.position(i), weight)
+    return value
+
+def touches(pos, expanded):
+    """ Checks if a search that expanded the given cells looked at pos, itself or through a neighbor """
+    row, col = pos
+    return (pos in expanded or (row + 1, col) in expanded or (row, col + 1) in expanded or
+            (row - 1, col) in expanded or (row, col - 1) in expanded)
+
+class PathCache:
+    """
+    Bounded LRU cache of solved paths
+
+    Entries are keyed on ( fingerprint, algorithm, start, goal ) where fingerprint identifies the wall layout,
+    so grids with the same layout share entries. Each entry also keeps the cells its search expanded, which
+    decides whether an edit to the layout could change its result.
+    """
+    def __init__(self, maxsize=256):
+        """ Initializes an empty cache holding at most maxsize entries """
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, layout, algorithm, start, goal):
+        """ Gets the cached value for a query, or None on a miss """
+        key = (layout, algorithm, start, goal)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, layout, algorithm, start, goal, value, expanded):
+        """
+        Stores the value for a query
+
+        expanded is the set of cells the search expanded, or None if any edit to the layout should drop the entry.
+        """
+        key = (layout, algorithm, start, goal)
+        self.entries[key] = (value, None if algorithm in SCANNING else expanded)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def edit(self, layout, pos):
+        """
+        Records that the barrier at pos was painted or erased on a grid with the given layout
+
+        Entries whose search never looked at pos are carried over to the new layout, the rest are dropped.
+        Returns the fingerprint of the new layout.
+        """
+        return self.carry(layout, layout ^ cell_key(pos), pos)
+
+    def reweight(self, layout, pos, old, new):
+        """ Records that the weight at pos changed from old to new, like edit. Returns the new fingerprint """
+        return self.carry(layout, layout ^ weight_key(pos, old) ^ weight_key(pos, new), pos)
+
+    def carry(self, layout, new_layout, pos):
+        """ Moves the entries of layout that never looked at pos over to new_layout and drops the rest """
+        if new_layout == layout:
+            return layout
+        for key in [key for key in self.entries if key[0] == layout]:
+            value, expanded = self.entries.pop(key)
+            if expanded is None or touches(pos, expanded):
+                self.invalidations += 1
+            else:
+                self.entries[(new_layout,) + key[1:]] = (value, expanded)
+        return new_layout
+
+    def solve(self, grid, layout, algorithm, start, goal):
+        """ Gets the SearchResult for a query from the cache, running the headless solver on a miss """
+        result = self.get(layout, algorithm, start, goal)
+        if result is None:
+            result = solvers.algorithms[algorithm](grid, start, goal)
+            self.put(layout, algorithm, start, goal, result, set(result.order))
+        return result
+
+    def info(self):
+        """ Gets the hit, miss, invalidation and eviction counts """
+        return CacheInfo(self.hits, self.misses, self.invalidations, self.evictions, self.maxsize, len(self.entries))
+
+    def clear(self):
+        """ Drops every entry and resets the statistics """
+        self.entries.clear()
+        self.hits = self.misses = self.invalidations = self.evictions = 0
@@ -0,0 +1,238 @@
+import time
+import heapq
+from array import array
+from grid import as_grid, BARRIER
+from stats import SearchStats
+from solvers import INF, adjacency, finish_ids
+
+# number of neighbors in each adjacency mask
+DEGREE = bytes(bin(mask).count('1') for mask in range(256))
+
+class CorridorGraph:
+    """
+    Junction graph of a static grid, with dead ends pruned and corridors collapsed into weighted edges
+
+    Building peels off every dead end repeatedly, so each tree of passages hanging off the rest of the
+    grid is removed and its cells keep a parent pointer towards the cell it hangs from. What is left is
+    the core: junctions, the cells with other than two core neighbors, and the corridors between them,
+    each stored once as an edge with its cells and cost. A perfect maze is a single tree and prunes
+    down to one cell, so its queries follow parent pointers and never search at all.
+
+    Queries climb from their endpoints to the core, search the junction graph with A* and expand the
+    edges they used back into cells. Moves cost the weight of the cell moved onto, as in
+    solvers.dijkstra, and paths are optimal. The graph is a snapshot, build a new one after edits.
+    """
+    def __init__(self, board, stats=None):
+        """ Prunes the grid and builds the junction graph, timing it as the 'build' phase of stats """
+        stats = SearchStats() if stats is None else stats
+        self.grid = grid = as_grid(board)
+        masks, steps = adjacency(stats, grid)
+        start_time = time.perf_counter()
+        n = len(grid.cells)
+        self.cols = grid.cols
+        self.steps = steps
+        self.masks = masks
+        cells = grid.cells
+
+        # dead ends are peeled until every cell left has two core neighbors or none
+        degree = bytearray(masks.translate(DEGREE))
+        core = bytearray(0 if cell == BARRIER else 1 for cell in cells)
+        self.parent = parent = array('i', [-1]) * n
+        stack = [i for i in range(n) if core[i] and degree[i] == 1]
+        while stack:
+            current = stack.pop()
+            if degree[current] != 1:
+                continue
+            core[current] = 0
+            for step in steps[masks[current]]:
+                neighbor = current + step
+                if core[neighbor]:
+                    parent[current] = neighbor
+                    degree[neighbor] -= 1
+                    if degree[neighbor] == 1:
+                        stack.append(neighbor)
+                    break
+        self.core = core
+        self.pruned = sum(1 for i in range(n) if cells[i] != BARRIER) - sum(core)
+
+        # edges are ( first node, last node, cells in between from first to last, cost of those cells )
+        self.edges = []
+        self.edge_of = array('i', [-1]) * n
+        self.links = {i: [] for i in range(n) if core[i] and degree[i] != 2}
+        for node in list(self.links):
+            self.walk_edges(node)
+        # corridors closed on themselves have no junction, one of their cells becomes one
+        for i in range(n):
+            if core[i] and degree[i] == 2 and self.edge_of[i] == -1 and i not in self.links:
+                self.links[i] = []
+                self.walk_edges(i)
+        stats.timed('build', start_time)
+        self.stats = stats
+
+    def walk_edges(self, node):
+        """ Follows every corridor leaving node that was not walked yet to the junction at its other end """
+        core, steps, masks, edge_of, weights = self.core, self.steps, self.masks, self.edge_of, self.grid.weights
+        for step in steps[masks[node]]:
+            previous, current = node, node + step
+            if not core[current] or edge_of[current] != -1:
+                continue
+            if current in self.links and any(other == current and not self.edges[edge][2]
+                                             for other, edge, forward in self.links[node]):
+                # two neighboring junctions are linked once
+                continue
+            interior = []
+            while current not in self.links:
+                interior.append(current)
+                for step2 in steps[masks[current]]:
+                    following = current + step2
+                    if core[following] and following != previous:
+                        break
+                previous, current = current, following
+            edge = len(self.edges)
+            cost = len(interior) if weights is None else sum(weights[i] for i in interior)
+            self.edges.append((node, current, array('I', interior), cost))
+            for i in interior:
+                edge_of[i] = edge
+            self.links[node].append((current, edge, True))
+            if current != node:
+                self.links[current].append((node, edge, False))
+
+    def __len__(self):
+        return len(self.links)
+
+    def weight(self, i):
+        """ Gets the cost of moving onto cell index i """
+        return 1 if self.grid.weights is None else self.grid.weights[i]
+
+    def climb(self, i):
+        """ Gets the cells from cell index i up its pruned tree to the core, both included """
+        chain = [i]
+        parent = self.parent
+        while parent[chain[-1]] != -1:
+            chain.append(parent[chain[-1]])
+        return chain
+
+    def corridor(self, i, toward_first):
+        """ Gets the cells from corridor cell i to one end of its edge, i excluded and the end node included """
+        first, last, interior, cost = self.edges[self.edge_of[i]]
+        k = interior.index(i)
+        if toward_first:
+            return list(reversed(interior[:k])) + [first]
+        return list(interior[k + 1:]) + [last]
+
+    def overlay(self, source, target):
+        """
+        Gets the temporary links of a query whose endpoints are not junctions
+
+        A source inside a corridor links to both ends of it and a target inside one is linked from both,
+        as ( neighbor, cost, cells up to the neighbor ) lists keyed by the cell they leave from.
+        """
+        extra = {}
+        if source not in self.links:
+            extra[source] = [(cells[-1], sum(self.weight(i) for i in cells), cells)
+                             for cells in (self.corridor(source, True), self.corridor(source, False))]
+        if target not in self.links:
+            for toward_first in (True, False):
+                cells = self.corridor(target, toward_first)
+                end = cells.pop()
+                cells.reverse()
+                cells.append(target)
+                extra.setdefault(end, []).append((target, sum(self.weight(i) for i in cells), cells))
+        if source not in self.links and self.edge_of[source] == self.edge_of[target]:
+            # both in the same corridor, the direct way along it
+            interior = self.edges[self.edge_of[source]][2]
+            a, b = interior.index(source), interior.index(target)
+            cells = list(interior[a + 1:b + 1]) if a < b else list(reversed(interior[b:a]))
+            extra[source].append((target, sum(self.weight(i) for i in cells), cells))
+        return extra
+
+    def solve(self, start, goal, stats=None):
+        """
+        Finds the cheapest path from start to goal and returns a SearchResult
+
+        visited and order hold the junctions the search expanded, which is the size of the search.
+        """
+        stats = SearchStats() if stats is None else stats
+        on_expand, on_push = stats.on_expand, stats.on_push
+        start_time = time.perf_counter()
+        cols = self.cols
+        source = start[0] * cols + start[1]
+        target = goal[0] * cols + goal[1]
+        cells = self.grid.cells
+        if cells[source] == BARRIER or cells[target] == BARRIER:
+            stats.timed('search', start_time)
+            return finish_ids(stats, cols, None, set(), [], 0, 0, 0, 0)
+
+        # climb both pruned trees, meeting inside one if the endpoints share it
+        up, down = self.climb(source), self.climb(target)
+        below = {cell: k for k, cell in enumerate(down)}
+        for k, cell in enumerate(up):
+            if cell in below:
+                path = up[:k] + down[below[cell]::-1]
+                stats.timed('search', start_time)
+                return finish_ids(stats, cols, path, set(), [], 0, 0, 0, 0)
+        source_core, target_core = up[-1], down[-1]
+
+        extra = self.overlay(source_core, target_core)
+        target_row, target_col = divmod(target_core, cols)
+        count = 0
+        open_set = [(abs(source_core // cols - target_row) + abs(source_core % cols - target_col), count, source_core)]
+        g_score = {source_core: 0}
+        prev_map = {}
+        closed = set()
+        order = []
+        peak = 1
+        pops = 0
+        edges = self.edges
+        while open_set:
+            if len(open_set) > peak:
+                peak = len(open_set)
+            current = heapq.heappop(open_set)[2]
+            pops += 1
+            if current in closed:
+                continue
+            closed.add(current)
+            order.append(current)
+            if on_expand:
+                on_expand(divmod(current, cols))
+            if current == target_core:
+                break
+
+            links = [(neighbor, cost, cells) for neighbor, cost, cells in extra.get(current, ())]
+            for neighbor, edge, forward in self.links.get(current, ()):
+                first, last, interior, cost = edges[edge]
+                if first != last:
+                    links.append((neighbor, cost + self.weight(neighbor), (edge, forward)))
+            for neighbor, cost, route in links:
+                temp_g_score = g_score[current] + cost
+                if temp_g_score < g_score.get(neighbor, INF):
+                    g_score[neighbor] = temp_g_score
+                    prev_map[neighbor] = (current, route)
+                    count += 1
+                    heapq.heappush(open_set, (temp_g_score + abs(neighbor // cols - target_row) +
+                                              abs(neighbor % cols - target_col), count, neighbor))
+                    if on_push:
+                        on_push(divmod(neighbor, cols))
+
+        search_time = stats.timed('search', start_time)
+        if target_core not in closed:
+            return finish_ids(stats, cols, None, closed, order, count + 1, pops, 0, peak)
+
+        # expand the junction path back into cells, then add the climbs at both ends
+        pieces = []
+        current = target_core
+        while current != source_core:
+            previous, route = prev_map[current]
+            if isinstance(route, list):
+                pieces.append(route)
+            else:
+                edge, forward = route
+                first, last, interior, cost = edges[edge]
+                pieces.append(list(interior) + [last] if forward else list(reversed(interior)) + [first])
+            current = previous
+        path = up
+        for piece in reversed(pieces):
+            path.extend(piece)
+        path.extend(reversed(down[:-1]))
+        stats.timed('reconstruct', search_time)
+        return finish_ids(stats, cols, path, closed, order, count + 1, pops, 0, peak)
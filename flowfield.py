@@ -0,0 +1,249 @@
+import time
+import heapq
+from collections import OrderedDict, deque
+from grid import BARRIER, BARRIER_TABLE, DOWN, RIGHT, UP, LEFT, changed_indices
+from stats import SearchStats
+from cache import CacheInfo
+from solvers import INF, adjacency
+
+class FlowField:
+    """
+    Direction field towards one goal, shared by every agent heading there
+
+    One reverse search from the goal gives every reachable cell its distance to the goal and the
+    direction of its next step, so an agent anywhere reads its move in O(1) instead of running its own
+    search. Moves cost the weight of the cell moved onto, like solvers.dijkstra.
+
+    dist is a list of distances by cell index, INF where the goal cannot be reached, and directions
+    a bytearray holding the DOWN, RIGHT, UP or LEFT bit of the next step of each cell, 0 at the goal and
+    where it cannot be reached. After barriers or weights change, sync repairs only the cells whose
+    distance changed. stats is the SearchStats of the last compute or repair.
+    """
+    def __init__(self, grid, goal, stats=None):
+        """ Builds the field for the current barriers and weights of grid """
+        self.grid = grid
+        self.goal = goal
+        cols = grid.cols
+        # offset of the next cell for each direction bit, and the bit pointing back along an offset
+        self.offsets = {DOWN: cols, RIGHT: 1, UP: -cols, LEFT: -1}
+        self.towards = {-cols: DOWN, -1: RIGHT, cols: UP, 1: LEFT}
+        self.dist = None
+        self.directions = None
+        self.stats = None
+        self.compute(stats)
+
+    def snapshot(self):
+        """ Remembers the barriers and weights the field was computed for """
+        grid = self.grid
+        self.barriers = grid.cells.translate(BARRIER_TABLE)
+        self.weights = bytes(grid.weights) if grid.weights is not None else bytes([1]) * len(grid.cells)
+
+    def compute(self, stats=None):
+        """ Runs the reverse search from the goal over the whole grid, replacing the field """
+        stats = SearchStats() if stats is None else stats
+        grid = self.grid
+        masks, steps = adjacency(stats, grid)
+        start_time = time.perf_counter()
+        n = len(grid.cells)
+        self.dist = dist = [INF] * n
+        self.directions = directions = bytearray(n)
+        self.snapshot()
+        target = grid.index(self.goal)
+        self.stats = stats
+        if grid.cells[target] == BARRIER:
+            stats.timed('search', start_time)
+            return
+
+        dist[target] = 0
+        if grid.weights is None:
+            # every move costs 1, so a breadth first search finds the distances in order
+            towards = self.towards
+            queue = deque([target])
+            pops = 0
+            peak = 1
+            while queue:
+                if len(queue) > peak:
+                    peak = len(queue)
+                current = queue.popleft()
+                pops += 1
+                next_dist = dist[current] + 1
+                for step in steps[masks[current]]:
+                    neighbor = current + step
+                    if dist[neighbor] == INF:
+                        dist[neighbor] = next_dist
+                        directions[neighbor] = towards[step]
+                        queue.append(neighbor)
+            stats.timed('search', start_time)
+            stats.add_counts(pops, pops, pops, 0, peak)
+            return
+
+        self.propagate([(0, target)], stats, start_time)
+
+    def propagate(self, open_set, stats, start_time):
+        """
+        Runs Dijkstra's algorithm backwards from the ( dist, index ) entries of open_set
+
+        Cells are only ever lowered, so seeding it with the cells whose distance is known again after
+        an edit spreads every decrease they cause and leaves the rest of the field alone.
+        """
+        grid = self.grid
+        masks, steps = adjacency(stats, grid)
+        weights = grid.weights
+        dist, directions, towards = self.dist, self.directions, self.towards
+        heapq.heapify(open_set)
+        heappush, heappop = heapq.heappush, heapq.heappop
+        pushes = peak = len(open_set)
+        pops = expansions = 0
+        while open_set:
+            if len(open_set) > peak:
+                peak = len(open_set)
+            current_dist, current = heappop(open_set)
+            pops += 1
+            if current_dist > dist[current]:
+                continue
+            expansions += 1
+            # moving onto current costs its weight, whichever neighbor it is reached from
+            next_dist = current_dist + (1 if weights is None else weights[current])
+            for step in steps[masks[current]]:
+                neighbor = current + step
+                if next_dist < dist[neighbor]:
+                    dist[neighbor] = next_dist
+                    directions[neighbor] = towards[step]
+                    heappush(open_set, (next_dist, neighbor))
+                    pushes += 1
+        stats.timed('search', start_time)
+        stats.add_counts(expansions, pushes, pops, 0, peak)
+
+    def update_cells(self, positions, stats=None):
+        """
+        Tells the field that the barriers or weights of the given cells changed and repairs it
+
+        The cells whose next steps lead through a changed cell may be further from the goal now, so they
+        are cleared and seeded again from their neighbors that kept their distance. The search that
+        follows also spreads any distance that went down, from an erased barrier or a lighter cell.
+        """
+        stats = SearchStats() if stats is None else stats
+        grid = self.grid
+        masks, steps = adjacency(stats, grid)
+        start_time = time.perf_counter()
+        cells, weights = grid.cells, grid.weights
+        dist, directions, offsets, towards = self.dist, self.directions, self.offsets, self.towards
+        target = grid.index(self.goal)
+
+        # every cell whose chain of next steps passes through a changed cell
+        affected = {grid.index(pos) for pos in positions}
+        stack = list(affected)
+        while stack:
+            current = stack.pop()
+            for step in steps[masks[current]]:
+                neighbor = current + step
+                if neighbor not in affected and directions[neighbor] and neighbor + offsets[directions[neighbor]] == current:
+                    affected.add(neighbor)
+                    stack.append(neighbor)
+        for i in affected:
+            dist[i] = INF
+            directions[i] = 0
+
+        open_set = []
+        for i in affected:
+            if cells[i] == BARRIER:
+                continue
+            if i == target:
+                dist[i] = 0
+                open_set.append((0, i))
+                continue
+            best, direction = INF, 0
+            for step in steps[masks[i]]:
+                neighbor = i + step
+                value = dist[neighbor] + (1 if weights is None else weights[neighbor])
+                if value < best:
+                    best, direction = value, towards[-step]
+            if best < INF:
+                dist[i] = best
+                directions[i] = direction
+                open_set.append((best, i))
+
+        self.snapshot()
+        self.stats = stats
+        self.propagate(open_set, stats, start_time)
+
+    def sync(self, stats=None):
+        """ Finds every cell whose barrier or weight changed since the field last saw the grid and repairs them """
+        grid = self.grid
+        weights = bytes(grid.weights) if grid.weights is not None else bytes([1]) * len(grid.cells)
+        changed = set(changed_indices(self.barriers, grid.cells.translate(BARRIER_TABLE)))
+        changed.update(changed_indices(self.weights, weights))
+        positions = [grid.position(i) for i in sorted(changed)]
+        if positions:
+            self.update_cells(positions, stats)
+        return positions
+
+    def distance(self, pos):
+        """ Gets the cost of the path from ( row, col ) to the goal, INF if there is none """
+        return self.dist[pos[0] * self.grid.cols + pos[1]]
+
+    def next_step(self, pos):
+        """ Gets the cell an agent at ( row, col ) moves to next, or None at the goal or if it cannot reach it """
+        i = pos[0] * self.grid.cols + pos[1]
+        direction = self.directions[i]
+        if not direction:
+            return None
+        return divmod(i + self.offsets[direction], self.grid.cols)
+
+    def path(self, pos):
+        """ Follows the field from ( row, col ) to the goal. Returns None if the goal cannot be reached """
+        if self.distance(pos) == INF:
+            return None
+        path = [pos]
+        while pos != self.goal:
+            pos = self.next_step(pos)
+            path.append(pos)
+        return path
+
+    def advance(self, agents):
+        """ Moves every agent one step along the field. Agents at the goal or that cannot reach it stay """
+        result = []
+        for pos in agents:
+            next_pos = self.next_step(pos)
+            result.append(pos if next_pos is None else next_pos)
+        return result
+
+class FlowFields:
+    """
+    Bounded LRU cache of the flow fields of one grid, keyed by goal
+
+    A field is built on the first request for its goal and synced with the grid on every later one,
+    so edits since it was last used are repaired instead of searched again from scratch.
+    """
+    def __init__(self, grid, maxsize=8):
+        """ Initializes an empty cache holding at most maxsize fields """
+        self.grid = grid
+        self.maxsize = maxsize
+        self.fields = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.repairs = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.fields)
+
+    def field(self, goal, stats=None):
+        """ Gets the up to date FlowField towards goal """
+        field = self.fields.get(goal)
+        if field is None:
+            self.misses += 1
+            field = self.fields[goal] = FlowField(self.grid, goal, stats)
+            while len(self.fields) > self.maxsize:
+                self.fields.popitem(last=False)
+                self.evictions += 1
+            return field
+        self.fields.move_to_end(goal)
+        self.hits += 1
+        if field.sync(stats):
+            self.repairs += 1
+        return field
+
+    def info(self):
+        """ Gets the hit, miss, repair and eviction counts, repairs taking the place of invalidations """
+        return CacheInfo(self.hits, self.misses, self.repairs, self.evictions, self.maxsize, len(self.fields))
@@ -0,0 +1,251 @@
+# cell states, one byte per cell
+BLANK = 0
+BARRIER = 1
+START = 2
+GOAL = 3
+OPEN = 4
+CLOSED = 5
+PATH = 6
+
+# states left behind by a search, wiped by Grid.clear
+SEARCH_STATES = (OPEN, CLOSED, PATH)
+
+# terrain costs of moving onto a cell, 1 for plain ground
+MIN_WEIGHT = 1
+MAX_WEIGHT = 255
+
+# direction bits of an adjacency mask, in the order Grid.neighbors returns neighbors
+DOWN, RIGHT, UP, LEFT = 1, 2, 4, 8
+
+# maps every cell state to 1 for cells that can be walked on and 0 for barriers
+FREE_TABLE = bytes(0 if state == BARRIER else 1 for state in range(256))
+
+# maps every cell state to 1 for barriers and 0 for everything else
+BARRIER_TABLE = bytes(1 if state == BARRIER else 0 for state in range(256))
+
+# maps every byte value to 1 if it is non zero, to find changed bytes in an xor of two snapshots
+CHANGED = bytes([0]) + bytes([1]) * 255
+
+def as_grid(board):
+    """ Gets a Grid from either a Grid or anything with a to_grid method, such as a Maze """
+    return board if isinstance(board, Grid) else board.to_grid()
+
+def changed_indices(old, new):
+    """ Gets the indices where two byte strings of the same length differ, in increasing order """
+    diff = int.from_bytes(old, 'little') ^ int.from_bytes(new, 'little')
+    if not diff:
+        return []
+    changed = diff.to_bytes(len(new), 'little').translate(CHANGED)
+    result = []
+    i = changed.find(1)
+    while i != -1:
+        result.append(i)
+        i = changed.find(1, i + 1)
+    return result
+
+class Grid:
+    """
+    Grid of cells stored as one contiguous bytearray
+
+    rows and cols are the dimensions of the grid.
+    cells holds the state of every cell in row-major order, index = row * cols + col.
+    weights holds the terrain cost of moving onto every cell in the same order, from MIN_WEIGHT to
+    MAX_WEIGHT, or is None while every cell costs 1.
+    Cells are addressed with ( row, col ) tuples everywhere outside this class.
+    """
+    def __init__(self, rows, cols=None, cells=None, weights=None):
+        """ 
+        Initializes a new Grid with every cell blank 
+
+        cells may instead be an existing writable buffer of rows * cols bytes, such as a block of
+        shared memory, which the grid then uses in place without copying. weights works the same way.
+        """
+        self.rows = rows
+        self.cols = rows if cols is None else cols
+        self.cells = bytearray(self.rows * self.cols) if cells is None else cells
+        self.weights = weights
+        # built on first use by the adjacency property
+        self.adjacency_index = None
+
+    def __len__(self):
+        """ Gets the number of cells in the grid """
+        return len(self.cells)
+
+    def __contains__(self, pos):
+        """ Checks if ( row, col ) lies inside the grid """
+        row, col = pos
+        return 0 <= row < self.rows and 0 <= col < self.cols
+
+    def index(self, pos):
+        """ Converts ( row, col ) to an index into cells """
+        return pos[0] * self.cols + pos[1]
+
+    def position(self, index):
+        """ Converts an index into cells back to ( row, col ) """
+        return divmod(index, self.cols)
+
+    def get(self, pos):
+        """ Gets the state of the cell at ( row, col ) """
+        return self.cells[pos[0] * self.cols + pos[1]]
+
+    def set(self, pos, state):
+        """ Sets the state of the cell at ( row, col ), keeping the adjacency index up to date """
+        i = pos[0] * self.cols + pos[1]
+        if self.adjacency_index is not None and (self.cells[i] == BARRIER) != (state == BARRIER):
+            self.adjacency_index.update(i, state != BARRIER)
+        self.cells[i] = state
+
+    def weight(self, pos):
+        """ Gets the cost of moving onto the cell at ( row, col ) """
+        return 1 if self.weights is None else self.weights[pos[0] * self.cols + pos[1]]
+
+    def set_weight(self, pos, weight):
+        """ Sets the cost of moving onto the cell at ( row, col ), storing weights from the first cost other than 1 """
+        if not MIN_WEIGHT <= weight <= MAX_WEIGHT:
+            raise ValueError("weight must be between %d and %d, got %r" % (MIN_WEIGHT, MAX_WEIGHT, weight))
+        if self.weights is None:
+            if weight == 1:
+                return
+            self.weights = bytearray([1]) * len(self.cells)
+        self.weights[pos[0] * self.cols + pos[1]] = weight
+
+    def max_weight(self):
+        """ Gets the largest cost of moving onto any cell """
+        return 1 if self.weights is None or not len(self.weights) else max(self.weights)
+
+    @property
+    def adjacency(self):
+        """
+        Gets the Adjacency index of the grid, building it on first use
+
+        Grid.set keeps it up to date. Code that writes barriers into cells directly must call
+        invalidate afterwards.
+        """
+        if self.adjacency_index is None:
+            self.adjacency_index = Adjacency(self)
+        return self.adjacency_index
+
+    def invalidate(self):
+        """ Drops the adjacency index after barriers were written straight into cells """
+        self.adjacency_index = None
+
+    def is_barrier(self, pos):
+        """ Checks if the cell at ( row, col ) is a barrier """
+        return self.cells[pos[0] * self.cols + pos[1]] == BARRIER
+
+    def neighbors(self, pos):
+        """ Gets all adjacent cells that are not barriers. Used as a successor function
+
+        Neighbors are returned in the order down, right, up, left. """
+        row, col = pos
+        cells = self.cells
+        cols = self.cols
+        i = row * cols + col
+        result = []
+        # down case
+        if row < self.rows - 1 and cells[i + cols] != BARRIER:
+            result.append((row + 1, col))
+        # right case
+        if col < cols - 1 and cells[i + 1] != BARRIER:
+            result.append((row, col + 1))
+        # up case
+        if row > 0 and cells[i - cols] != BARRIER:
+            result.append((row - 1, col))
+        # left case
+        if col > 0 and cells[i - 1] != BARRIER:
+            result.append((row, col - 1))
+        return result
+
+    def clear(self, states=SEARCH_STATES):
+        """ Sets every cell in one of the given states back to blank """
+        table = bytearray(range(256))
+        for state in states:
+            table[state] = BLANK
+        self.cells[:] = self.cells.translate(table)
+
+    def reset(self):
+        """ Sets every cell in the grid to blank and every weight back to 1 """
+        self.cells[:] = bytes(len(self.cells))
+        self.weights = None
+        self.adjacency_index = None
+
+    def copy(self):
+        """ Gets a copy of the grid that shares no state with this one """
+        grid = Grid(self.rows, self.cols)
+        grid.cells[:] = self.cells
+        if self.weights is not None:
+            grid.weights = bytearray(self.weights)
+        if self.adjacency_index is not None:
+            grid.adjacency_index = self.adjacency_index.copy()
+        return grid
+
+    @classmethod
+    def from_walls(cls, walls):
+        """ Builds a grid from rows of booleans where True marks a barrier """
+        grid = cls(len(walls), len(walls[0]))
+        grid.cells[:] = bytes(BARRIER if wall else BLANK for line in walls for wall in line)
+        return grid
+
+class Adjacency:
+    """
+    Bitmask adjacency index of a grid
+
+    masks holds one byte per cell with a DOWN, RIGHT, UP or LEFT bit set for every neighbor that is
+    inside the grid and not a barrier, whatever the state of the cell itself. steps maps a mask to the
+    tuple of index offsets of those neighbors, in the order Grid.neighbors uses, so a search walks the
+    neighbors of cell i with
+
+        for step in steps[masks[i]]:
+            neighbor = i + step
+
+    without building a list or a tuple per cell. Painting or erasing one barrier updates four bytes.
+    """
+    def __init__(self, grid):
+        """ Builds the index for the current barriers of grid """
+        self.rows = grid.rows
+        self.cols = cols = grid.cols
+        self.steps = tuple(tuple(step for bit, step in ((DOWN, cols), (RIGHT, 1), (UP, -cols), (LEFT, -1)) if mask & bit)
+                           for mask in range(16))
+        self.masks = self.build(grid)
+
+    def build(self, grid):
+        """ Computes every mask at once with one byte per cell packed into big integers """
+        n, cols = len(grid.cells), grid.cols
+        if n == 0:
+            return bytearray()
+        # bytes first, since cells may be a memoryview of shared memory
+        free = int.from_bytes(bytes(grid.cells).translate(FREE_TABLE), 'little')
+        lanes = (1 << 8 * n) - 1
+        not_last_col = int.from_bytes((bytes([1]) * (cols - 1) + bytes(1)) * grid.rows, 'little')
+        not_first_col = int.from_bytes((bytes(1) + bytes([1]) * (cols - 1)) * grid.rows, 'little')
+        down = free >> 8 * cols
+        right = (free >> 8) & not_last_col
+        up = (free << 8 * cols) & lanes
+        left = (free << 8) & not_first_col
+        return bytearray((down | right << 1 | up << 2 | left << 3).to_bytes(n, 'little'))
+
+    def update(self, index, free):
+        """ Marks cell index as walkable or as a barrier in the masks of its neighbors """
+        masks = self.masks
+        row, col = divmod(index, self.cols)
+        # each neighbor gets the bit pointing back at index
+        for inside, neighbor, bit in ((row < self.rows - 1, index + self.cols, UP),
+                                      (col < self.cols - 1, index + 1, LEFT),
+                                      (row > 0, index - self.cols, DOWN),
+                                      (col > 0, index - 1, RIGHT)):
+            if inside:
+                if free:
+                    masks[neighbor] |= bit
+                else:
+                    masks[neighbor] &= ~bit
+
+    def neighbors(self, index):
+        """ Gets the indices of the walkable neighbors of cell index """
+        return [index + step for step in self.steps[self.masks[index]]]
+
+    def copy(self):
+        """ Gets a copy of the index that shares no state with this one """
+        index = Adjacency.__new__(Adjacency)
+        index.rows, index.cols, index.steps = self.rows, self.cols, self.steps
+        index.masks = bytearray(self.masks)
+        return index
@@ -0,0 +1,258 @@
+import time
+import heapq
+from collections import deque, namedtuple
+from grid import as_grid
+from solvers import h, a_star, reconstruct_path
+
+Comparison = namedtuple('Comparison', ['queries', 'build_time', 'hpa_time', 'a_star_time',
+                                       'mean_ratio', 'worst_ratio', 'hpa_expanded', 'a_star_expanded'])
+Comparison.__doc__ = """
+Cost of HPA* against plain A* over a set of queries
+
+Times are total seconds, ratios are HPA* path length over A* path length (1.0 is optimal),
+expanded counts are summed over all queries.
+"""
+
+def bounded_search(grid, source, bounds, goal=None):
+    """
+    Runs breadth first search from source without leaving bounds, ( row0, row1, col0, col1 ) with exclusive ends
+
+    Stops early once goal is reached. Returns the distance and previous cell maps, keyed by cell index.
+    """
+    row0, row1, col0, col1 = bounds
+    cols = grid.cols
+    index = grid.adjacency
+    masks, steps = index.masks, index.steps
+    source = grid.index(source)
+    goal = None if goal is None else grid.index(goal)
+    dist = {source: 0}
+    prev_map = {}
+    queue = deque([source])
+    while queue:
+        current = queue.popleft()
+        if current == goal:
+            break
+        for step in steps[masks[current]]:
+            neighbor = current + step
+            if neighbor not in dist and row0 <= neighbor // cols < row1 and col0 <= neighbor % cols < col1:
+                dist[neighbor] = dist[current] + 1
+                prev_map[neighbor] = current
+                queue.append(neighbor)
+    return dist, prev_map
+
+class HierarchicalGrid:
+    """
+    HPA* abstraction over a Grid or Maze
+
+    The grid is split into size x size clusters. Every run of free cells shared by two neighboring clusters
+    is an entrance with one transition in the middle, or one at each end when the run is long. Transition
+    cells are the nodes of the abstract graph. They are linked across the border with cost 1 and to each
+    other inside a cluster with their precomputed local distance.
+
+    Queries search the abstract graph and then refine each abstract edge into cells with a search bounded
+    to one cluster. Paths are near optimal, not optimal, see compare.
+    """
+    def __init__(self, board, size=16):
+        """ Builds every cluster of the grid """
+        self.grid = as_grid(board)
+        self.size = size
+        self.cluster_rows = -(-self.grid.rows // size)
+        self.cluster_cols = -(-self.grid.cols // size)
+        # transitions on the border between two clusters, keyed by the pair of clusters
+        self.borders = {}
+        # cells across a border linked to each transition cell
+        self.links = {}
+        # distances between the transition cells of each cluster
+        self.intra = {}
+        build_start = time.perf_counter()
+        self.rebuild(self.clusters())
+        self.build_time = time.perf_counter() - build_start
+
+    def clusters(self):
+        """ Gets every cluster as ( cluster row, cluster col ) """
+        return [(r, c) for r in range(self.cluster_rows) for c in range(self.cluster_cols)]
+
+    def cluster_of(self, pos):
+        """ Gets the cluster that contains a cell """
+        return (pos[0] // self.size, pos[1] // self.size)
+
+    def bounds(self, cluster):
+        """ Gets the cell bounds of a cluster as ( row0, row1, col0, col1 ) """
+        row0 = cluster[0] * self.size
+        col0 = cluster[1] * self.size
+        return (row0, min(row0 + self.size, self.grid.rows), col0, min(col0 + self.size, self.grid.cols))
+
+    def find_transitions(self, first, second):
+        """ Gets the ( cell in first, cell in second ) transitions on the border below or right of cluster first """
+        row0, row1, col0, col1 = self.bounds(first)
+        if second[0] > first[0]:
+            pairs = [((row1 - 1, col), (row1, col)) for col in range(col0, col1)]
+        else:
+            pairs = [((row, col1 - 1), (row, col1)) for row in range(row0, row1)]
+
+        transitions = []
+        run = []
+        # a trailing blocked pair closes the last run
+        for a, b in pairs + [(None, None)]:
+            if a is not None and not self.grid.is_barrier(a) and not self.grid.is_barrier(b):
+                run.append((a, b))
+                continue
+            if len(run) >= 6:
+                transitions.append(run[0])
+                transitions.append(run[-1])
+            elif run:
+                transitions.append(run[len(run) // 2])
+            run = []
+        return transitions
+
+    def rebuild(self, dirty):
+        """ Recomputes the entrances around the dirty clusters and the local distances of every cluster they touch """
+        borders = set()
+        for r, c in dirty:
+            for other in ((r - 1, c), (r, c - 1), (r + 1, c), (r, c + 1)):
+                if 0 <= other[0] < self.cluster_rows and 0 <= other[1] < self.cluster_cols:
+                    borders.add(min((r, c), other) + max((r, c), other))
+
+        touched = set(dirty)
+        for key in borders:
+            first, second = key[:2], key[2:]
+            for a, b in self.borders.get(key, ()):
+                for pos, other in ((a, b), (b, a)):
+                    self.links[pos].discard(other)
+                    if not self.links[pos]:
+                        del self.links[pos]
+            self.borders[key] = self.find_transitions(first, second)
+            for a, b in self.borders[key]:
+                self.links.setdefault(a, set()).add(b)
+                self.links.setdefault(b, set()).add(a)
+            touched.add(first)
+            touched.add(second)
+
+        for cluster in touched:
+            self.build_cluster(cluster)
+
+    def cluster_nodes(self, cluster):
+        """ Gets the transition cells that lie inside a cluster """
+        r, c = cluster
+        nodes = set()
+        for first, second in (((r - 1, c), cluster), ((r, c - 1), cluster), (cluster, (r + 1, c)), (cluster, (r, c + 1))):
+            for a, b in self.borders.get(first + second, ()):
+                nodes.add(a if first == cluster else b)
+        return sorted(nodes)
+
+    def build_cluster(self, cluster):
+        """ Computes the local distance between every pair of transition cells in a cluster """
+        bounds = self.bounds(cluster)
+        nodes = self.cluster_nodes(cluster)
+        edges = {}
+        ids = [self.grid.index(node) for node in nodes]
+        for node in nodes:
+            dist = bounded_search(self.grid, node, bounds)[0]
+            edges[node] = {other: dist[i] for other, i in zip(nodes, ids) if other != node and i in dist}
+        self.intra[cluster] = edges
+
+    def update_cells(self, positions):
+        """ Tells the abstraction that the barrier state of the given cells changed. Only their clusters are rebuilt """
+        self.rebuild({self.cluster_of(pos) for pos in positions})
+
+    def connect(self, pos):
+        """ Gets the local distance from a cell to each transition cell of its cluster """
+        cluster = self.cluster_of(pos)
+        dist = bounded_search(self.grid, pos, self.bounds(cluster))[0]
+        index = self.grid.index
+        return {node: dist[index(node)] for node in self.intra[cluster] if index(node) in dist}
+
+    def abstract_path(self, start, goal):
+        """ Runs A* over the transition cells between start and goal. Returns the list of abstract nodes and the expansion count """
+        start_edges = self.connect(start)
+        goal_edges = self.connect(goal)
+        goal_cluster = self.cluster_of(goal)
+
+        count = 0
+        open_set = [(h(start, goal), count, start)]
+        prev_map = {}
+        g_score = {start: 0}
+        closed = set()
+        while open_set:
+            current = heapq.heappop(open_set)[2]
+            if current in closed:
+                continue
+            closed.add(current)
+            if current == goal:
+                return reconstruct_path(prev_map, current), len(closed)
+
+            edges = list(start_edges.items()) if current == start else []
+            if current in self.links:
+                edges.extend(self.intra[self.cluster_of(current)][current].items())
+                edges.extend((other, 1) for other in self.links[current])
+                if self.cluster_of(current) == goal_cluster and current in goal_edges:
+                    edges.append((goal, goal_edges[current]))
+
+            for neighbor, cost in edges:
+                temp_g_score = g_score[current] + cost
+                if temp_g_score < g_score.get(neighbor, float("inf")):
+                    prev_map[neighbor] = current
+                    g_score[neighbor] = temp_g_score
+                    count += 1
+                    heapq.heappush(open_set, (temp_g_score + h(neighbor, goal), count, neighbor))
+        return None, len(closed)
+
+    def refine(self, nodes):
+        """ Expands a list of abstract nodes into every cell of the path """
+        path = [nodes[0]]
+        for current, following in zip(nodes, nodes[1:]):
+            if following in self.links.get(current, ()):
+                path.append(following)
+                continue
+            prev_map = bounded_search(self.grid, current, self.bounds(self.cluster_of(current)), following)[1]
+            path.extend(self.grid.position(i) for i in reconstruct_path(prev_map, self.grid.index(following))[1:])
+        return path
+
+    def find_path(self, start, goal):
+        """ Gets a near optimal path from start to goal, or None if there is none """
+        return self.search(start, goal)[0]
+
+    def search(self, start, goal):
+        """ Gets the path from start to goal, or None, and the number of abstract nodes expanded """
+        if self.grid.is_barrier(start) or self.grid.is_barrier(goal):
+            return None, 0
+
+        # inside one cluster the local path is usually the answer, but it may be beaten by leaving the cluster
+        local = None
+        if self.cluster_of(start) == self.cluster_of(goal):
+            prev_map = bounded_search(self.grid, start, self.bounds(self.cluster_of(start)), goal)[1]
+            goal_id = self.grid.index(goal)
+            if goal_id in prev_map or goal == start:
+                local = [self.grid.position(i) for i in reconstruct_path(prev_map, goal_id)]
+
+        nodes, expanded = self.abstract_path(start, goal)
+        path = self.refine(nodes) if nodes else None
+        if local is not None and (path is None or len(local) <= len(path)):
+            path = local
+        return path, expanded
+
+def compare(hpa, queries):
+    """ 
+    Runs every ( start, goal ) query through HPA* and plain A* and reports the cost of the abstraction
+
+    build_time is the time it took to build hpa.
+    """
+    hpa_time = a_star_time = 0
+    hpa_expanded = a_star_expanded = 0
+    ratios = []
+    for start, goal in queries:
+        t0 = time.perf_counter()
+        path, expanded = hpa.search(start, goal)
+        t1 = time.perf_counter()
+        result = a_star(hpa.grid, start, goal)
+        t2 = time.perf_counter()
+        hpa_time += t1 - t0
+        a_star_time += t2 - t1
+        hpa_expanded += expanded
+        a_star_expanded += len(result.order)
+        if path is not None and result.path is not None:
+            ratios.append(len(path) / len(result.path))
+
+    return Comparison(len(queries), hpa.build_time, hpa_time, a_star_time,
+                      sum(ratios) / len(ratios) if ratios else 1.0, max(ratios, default=1.0),
+                      hpa_expanded, a_star_expanded)
@@ -0,0 +1,178 @@
+import time
+import heapq
+from grid import BARRIER, BARRIER_TABLE, changed_indices
+from solvers import INF, h, adjacency
+from stats import SearchStats
+
+class DStarLite:
+    """
+    Incremental planner for a fixed goal using D* Lite
+
+    The search runs backwards from the goal and keeps its g and rhs values between runs. Moving onto a
+    cell costs its terrain weight. After barriers or weights are painted or erased only the cells whose
+    distance to the goal changed are expanded again, and the start may move along the path without
+    throwing the search away.
+
+    g and rhs are sparse dicts keyed by cell index, cells missing from them are at infinity. Neighbors
+    come from the grid's Adjacency index, so barriers are never looked at since their rhs stays infinite.
+    expanded is the set of cell indices expanded by the last call to compute, and stats its SearchStats.
+    pushes counts every push onto the open set over the planner's lifetime.
+    """
+    def __init__(self, grid, start, goal):
+        """ Initializes the planner. Nothing is searched until compute is called """
+        self.grid = grid
+        self.start = start
+        self.goal = goal
+        self.start_id = grid.index(start)
+        self.goal_id = grid.index(goal)
+        self.km = 0
+        self.g = {}
+        self.rhs = {self.goal_id: 0}
+        self.open_set = [(self.calculate_key(self.goal_id), self.goal_id)]
+        # current key of every cell in the open set, heap entries with any other key are stale
+        self.open_keys = {self.goal_id: self.open_set[0][0]}
+        self.expanded = set()
+        self.stats = None
+        self.pushes = 1
+        self.barriers = grid.cells.translate(BARRIER_TABLE)
+        self.weights = self.terrain()
+
+    def calculate_key(self, i):
+        """ Gets the priority of cell i in the open set """
+        value = min(self.g.get(i, INF), self.rhs.get(i, INF))
+        row, col = self.start
+        return (value + abs(i // self.grid.cols - row) + abs(i % self.grid.cols - col) + self.km, value)
+
+    def terrain(self):
+        """ Gets a snapshot of the grid's weights, all 1 while the grid has none """
+        if self.grid.weights is None:
+            return bytearray([1]) * len(self.grid.cells)
+        return bytearray(self.grid.weights)
+
+    def update_vertex(self, i, masks, steps):
+        """ Recomputes the rhs of cell i from its neighbors and puts it in or takes it out of the open set """
+        if i != self.goal_id:
+            best = INF
+            if self.grid.cells[i] != BARRIER:
+                g, weights = self.g, self.grid.weights
+                for step in steps[masks[i]]:
+                    neighbor = i + step
+                    value = g.get(neighbor, INF) + (1 if weights is None else weights[neighbor])
+                    if value < best:
+                        best = value
+            if best == INF:
+                self.rhs.pop(i, None)
+            else:
+                self.rhs[i] = best
+
+        if self.g.get(i, INF) != self.rhs.get(i, INF):
+            key = self.calculate_key(i)
+            self.open_keys[i] = key
+            heapq.heappush(self.open_set, (key, i))
+            self.pushes += 1
+        else:
+            self.open_keys.pop(i, None)
+
+    def top_key(self):
+        """ Gets the smallest key in the open set, dropping stale heap entries on the way """
+        while self.open_set:
+            key, i = self.open_set[0]
+            if self.open_keys.get(i) == key:
+                return key
+            heapq.heappop(self.open_set)
+        return (INF, INF)
+
+    def compute(self, stats=None):
+        """ 
+        Expands cells until the start is consistent. Returns the path from start to goal, or None 
+
+        stats is an optional SearchStats that the counts and hooks of this run go to.
+        """
+        stats = SearchStats() if stats is None else stats
+        on_expand = stats.on_expand
+        masks, steps = adjacency(stats, self.grid)
+        search_start = time.perf_counter()
+        cols = self.grid.cols
+        start = self.start_id
+        pushes = self.pushes
+        pops = reopens = 0
+        peak = len(self.open_set)
+        self.expanded = set()
+        while (self.top_key() < self.calculate_key(start) or
+               self.rhs.get(start, INF) != self.g.get(start, INF)):
+            peak = max(peak, len(self.open_set))
+            k_old, current = heapq.heappop(self.open_set)
+            pops += 1
+            k_new = self.calculate_key(current)
+            if k_old < k_new:
+                self.open_keys[current] = k_new
+                heapq.heappush(self.open_set, (k_new, current))
+                self.pushes += 1
+                continue
+
+            del self.open_keys[current]
+            reopened = current in self.expanded
+            self.expanded.add(current)
+            if on_expand:
+                on_expand(divmod(current, cols))
+            if self.g.get(current, INF) > self.rhs.get(current, INF):
+                # overconsistent, the cell got cheaper
+                self.g[current] = self.rhs[current]
+            else:
+                # underconsistent, the cell got more expensive
+                self.g.pop(current, None)
+                self.update_vertex(current, masks, steps)
+            for step in steps[masks[current]]:
+                self.update_vertex(current + step, masks, steps)
+            reopens += reopened
+
+        reconstruct_start = stats.timed('search', search_start)
+        path = self.path()
+        stats.timed('reconstruct', reconstruct_start)
+        stats.add_counts(len(self.expanded), self.pushes - pushes, pops, reopens, peak)
+        stats.record_path(path)
+        self.stats = stats
+        return path
+
+    def path(self):
+        """ Follows the g values down from the start to the goal. Returns None if the goal is unreachable """
+        g = self.g
+        if g.get(self.start_id, INF) == INF:
+            return None
+        index = self.grid.adjacency
+        masks, steps, weights = index.masks, index.steps, self.grid.weights
+        current = self.start_id
+        path = [current]
+        while current != self.goal_id:
+            current = min((current + step for step in steps[masks[current]]),
+                          key=lambda n: g.get(n, INF) + (1 if weights is None else weights[n]))
+            path.append(current)
+        return [divmod(i, self.grid.cols) for i in path]
+
+    def update_cells(self, positions):
+        """ Tells the planner that the barrier state or weight of the given cells changed """
+        index = self.grid.adjacency
+        masks, steps = index.masks, index.steps
+        for pos in positions:
+            i = self.grid.index(pos)
+            self.barriers[i] = self.grid.cells[i] == BARRIER
+            self.weights[i] = self.grid.weight(pos)
+            self.update_vertex(i, masks, steps)
+            # the masks list the free neighbors of a cell whatever its own state
+            for step in steps[masks[i]]:
+                self.update_vertex(i + step, masks, steps)
+
+    def sync(self):
+        """ Finds every cell whose barrier state or weight changed since the planner last saw the grid and updates them """
+        barriers = self.grid.cells.translate(BARRIER_TABLE)
+        changed = set(changed_indices(self.barriers, barriers))
+        changed.update(changed_indices(self.weights, self.terrain()))
+        changed = [self.grid.position(i) for i in sorted(changed)]
+        self.update_cells(changed)
+        return changed
+
+    def move_start(self, start):
+        """ Moves the start, for an agent walking along the path, keeping the search """
+        self.km += h(self.start, start)
+        self.start = start
+        self.start_id = self.grid.index(start)
@@ -0,0 +1,201 @@
+import sys
+import struct
+import random
+from array import array
+from grid import as_grid, BARRIER
+from cache import fingerprint
+from stats import SearchStats
+from solvers import INF
+from flowfield import FlowField
+
+MAGIC = b'MZLM'
+VERSION = 1
+
+# header flags
+WEIGHTED = 1
+
+# magic, version, flags, table typecode, landmark count, rows, cols, layout fingerprint
+HEADER = struct.Struct('<4sBBcxIIIQ')
+
+def sidecar(path):
+    """ Gets the path the landmark tables of the maze file at path are saved to """
+    return path + '.alt'
+
+def table_typecode(largest):
+    """ Gets the smallest unsigned array typecode holding distances up to largest plus the unreached marker """
+    for typecode in ('H', 'I', 'Q'):
+        if largest < (1 << 8 * array(typecode).itemsize) - 1:
+            return typecode
+    raise ValueError("distance %d is too large for a landmark table" % largest)
+
+class Landmarks:
+    """
+    ALT heuristic: distance tables to a few landmark cells and the triangle inequality
+
+    For every landmark L, tables holds the cost of the shortest path from each cell to L, so for any
+    cell n and goal, d( n, goal ) >= d( n, L ) - d( goal, L ). The heuristic is the largest of these
+    bounds over the landmarks, and on unweighted grids, where paths cost the same both ways, also of
+    d( goal, L ) - d( n, L ). In maze corridors it is far tighter than any straight line distance.
+
+    Tables are arrays of the smallest unsigned type that fits, 2 bytes a cell for most grids, with
+    the largest value of the type for cells that cannot reach the landmark. Pass an instance as the
+    heuristic of solvers.a_star. layout is the fingerprint of the grid the tables were built on, see
+    cache.fingerprint, so stale tables are refused once the walls or weights change.
+    """
+    def __init__(self, rows, cols, landmarks, tables, weighted, layout):
+        """ Initializes the heuristic from prepared tables, see build and load """
+        self.rows = rows
+        self.cols = cols
+        self.landmarks = landmarks
+        self.tables = tables
+        self.weighted = weighted
+        self.layout = layout
+        self.unreached = (1 << 8 * tables[0].itemsize) - 1 if tables else 0
+
+    @classmethod
+    def build(cls, board, count=16, seed=0, stats=None):
+        """
+        Picks count landmarks on a grid or maze and computes their distance tables
+
+        Landmarks are chosen by farthest point selection: the first is the cell farthest from a random
+        walkable cell and each next one is the cell farthest from every landmark chosen so far, which
+        puts them on the outskirts of the grid where their bounds are tightest. The reverse searches
+        are the ones of flowfield.FlowField, their counts and times go to stats.
+        """
+        stats = SearchStats() if stats is None else stats
+        grid = as_grid(board)
+        free = [i for i in range(len(grid.cells)) if grid.cells[i] != BARRIER]
+        if not free:
+            raise ValueError("a grid without walkable cells has no landmarks")
+        seed_cell = random.Random(seed).choice(free)
+        # distance to the nearest landmark so far, or to the seed cell at first, as unboxed doubles
+        nearest = array('d', FlowField(grid, grid.position(seed_cell), stats).dist)
+
+        landmarks, tables = [], []
+        for k in range(min(count, len(free))):
+            # the reachable cell farthest from the landmarks so far
+            best = max((nearest[i] for i in free if nearest[i] != INF), default=None)
+            if not best:
+                break
+            landmark = nearest.index(best)
+            dist = FlowField(grid, grid.position(landmark), stats).dist
+            landmarks.append(landmark)
+            # each field goes into its table straight away, so only one list of distances is alive at a time
+            typecode = table_typecode(max((d for d in dist if d != INF), default=0))
+            unreached = (1 << 8 * array(typecode).itemsize) - 1
+            tables.append(array(typecode, (unreached if d == INF else d for d in dist)))
+            nearest = array('d', dist) if k == 0 else array('d', map(min, nearest, dist))
+            dist = None
+
+        # every table takes the widest type any of them needed
+        typecode = max((table.typecode for table in tables), key=lambda code: array(code).itemsize, default='H')
+        unreached = (1 << 8 * array(typecode).itemsize) - 1
+        for k, table in enumerate(tables):
+            if table.typecode != typecode:
+                narrow = (1 << 8 * table.itemsize) - 1
+                tables[k] = array(typecode, (unreached if d == narrow else d for d in table))
+        return cls(grid.rows, grid.cols, [grid.position(i) for i in landmarks], tables,
+                   grid.weights is not None, fingerprint(grid))
+
+    def to_goal(self, goal):
+        """ Gets the heuristic towards goal as a function of cell index, for solvers.id_heuristic """
+        target = goal[0] * self.cols + goal[1]
+        unreached = self.unreached
+        # landmarks the goal cannot reach bound nothing
+        pairs = [(table, table[target]) for table in self.tables if table[target] != unreached]
+        if not pairs:
+            return lambda i: 0
+        if self.weighted:
+            return lambda i: max(0, max(table[i] - to_goal for table, to_goal in pairs))
+        return lambda i: max(abs(table[i] - to_goal) for table, to_goal in pairs)
+
+    def __call__(self, pos, goal):
+        """ Gets the heuristic between two ( row, col ) cells, like solvers.h """
+        return self.to_goal(goal)(pos[0] * self.cols + pos[1])
+
+    def check(self, board):
+        """ Raises ValueError unless the tables were built on the walls and weights of board """
+        grid = as_grid(board)
+        if (grid.rows, grid.cols) != (self.rows, self.cols) or fingerprint(grid) != self.layout:
+            raise ValueError("landmark tables were built for another wall layout")
+
+    def save(self, path):
+        """ Writes the landmarks and their tables to a binary file """
+        typecode = self.tables[0].typecode if self.tables else 'H'
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, WEIGHTED if self.weighted else 0, typecode.encode(),
+                                len(self.landmarks), self.rows, self.cols, self.layout))
+            indices = array('I', [row * self.cols + col for row, col in self.landmarks])
+            for values in [indices] + self.tables:
+                if sys.byteorder == 'big':
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(f)
+
+    @classmethod
+    def load(cls, path, board=None):
+        """ Reads landmarks written by save, checking them against board if one is given """
+        with open(path, 'rb') as f:
+            magic, version, flags, typecode, count, rows, cols, layout = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("%s is not a version %d landmark file" % (path, VERSION))
+            indices = array('I')
+            indices.fromfile(f, count)
+            tables = []
+            for k in range(count):
+                table = array(typecode.decode())
+                table.fromfile(f, rows * cols)
+                tables.append(table)
+        if sys.byteorder == 'big':
+            for values in [indices] + tables:
+                values.byteswap()
+        landmarks = cls(rows, cols, [divmod(i, cols) for i in indices], tables, bool(flags & WEIGHTED), layout)
+        if board is not None:
+            landmarks.check(board)
+        return landmarks
+
+def main(argv=None):
+    """ Command line entry point, see --help """
+    import argparse
+    import mazefile
+    import solvers
+
+    parser = argparse.ArgumentParser(description="Builds landmark tables for maze files and compares A* with them")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = commands.add_parser('build', help="build the landmark tables of a maze file next to it")
+    build_parser.add_argument('maze')
+    build_parser.add_argument('--count', type=int, default=16, help="number of landmarks")
+
+    query_parser = commands.add_parser('query', help="run random queries with and without the saved landmarks")
+    query_parser.add_argument('maze')
+    query_parser.add_argument('--queries', type=int, default=20)
+    query_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args(argv)
+    with mazefile.load(args.maze) as board:
+        grid = board.to_grid()
+    if args.command == 'build':
+        stats = SearchStats()
+        landmarks = Landmarks.build(grid, args.count, stats=stats)
+        landmarks.save(sidecar(args.maze))
+        print("%d landmarks in %.2fs, saved to %s" % (len(landmarks.landmarks), stats.seconds,
+                                                     sidecar(args.maze)))
+        return 0
+
+    landmarks = Landmarks.load(sidecar(args.maze), grid)
+    rng = random.Random(args.seed)
+    free = [i for i in range(len(grid.cells)) if grid.cells[i] != BARRIER]
+    totals = {'euclidean_dist': [0, 0.0], 'landmarks': [0, 0.0]}
+    for k in range(args.queries):
+        start, goal = grid.position(rng.choice(free)), grid.position(rng.choice(free))
+        for name, heuristic in (('euclidean_dist', solvers.euclidean_dist), ('landmarks', landmarks)):
+            result = solvers.a_star(grid, start, goal, heuristic=heuristic)
+            totals[name][0] += result.stats.expansions
+            totals[name][1] += result.stats.seconds
+    for name, (expansions, seconds) in totals.items():
+        print("%-15s %10d expanded %8.3fs" % (name, expansions, seconds))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
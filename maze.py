@@ -1,236 +1,263 @@
 # Imports
 import random
-from wrappers import timer
-from math import sqrt
+import time
+from stats import SearchStats
+from grid import Grid, BLANK, BARRIER
+import mazefile
+
+# cell states used while the maze is being carved
+UNVISITED = 0
+CELL = 1
+WALL = 2
 
 class Maze:
-    """ Class that contains the algorithm to generate a maze """
+    """ 
+    Class that contains the algorithm to generate a maze 
+
+    seed is either a value for random.Random or a random.Random instance, so any maze can be reproduced.
+    cells holds the finished maze in the Grid encoding (BLANK for passages, BARRIER for walls).
+    stats is the SearchStats record of the generation. Expansions are carved cells and the open list is the frontier.
+    """
 
-    def __init__(self, height, width):
+    def __init__(self, height, width, seed=None, stats=None):
         """ Constructor for Maze object. initializes width and height """
         self.height = height
         self.width = width
+        self.seed = seed
+        self.random = seed if isinstance(seed, random.Random) else random.Random(seed)
 
-        self.maze = []
+        self.cells = None
         self.entrance = None
         self.exit = None
+        self.stats = SearchStats() if stats is None else stats
         self.generate_maze()
-    
-    @timer
-    def generate_maze(self):
-        """ Generates a maze using randomized prim's algorithm """
-        # Denote all cells as unvisited
-        for i in range(0, self.height):
-            line = []
-            for j in range(0, self.width):
-                line.append('u')
-            self.maze.append(line)
-
-        # Randomize starting point and set it a cell
-        starting_height = int(random.random() * self.height)
-        starting_width = int(random.random() * self.width)
-        if starting_height == 0:
-            starting_height += 1
-        if starting_height == self.height - 1:
-            starting_height -= 1
-        if starting_width == 0:
-            starting_width += 1
-        if starting_width == self.width - 1:
-            starting_width -= 1
-
-        # Mark it as cell and add surrounding walls to the list
-        self.maze[starting_height][starting_width] = 'c'
-        walls = [[starting_height - 1, starting_width], [starting_height, starting_width - 1],
-                 [starting_height, starting_width + 1], [starting_height + 1, starting_width]]
-
-        # Denote walls in maze
-        self.maze[starting_height - 1][starting_width] = 'w'
-        self.maze[starting_height][starting_width - 1] = 'w'
-        self.maze[starting_height][starting_width + 1] = 'w'
-        self.maze[starting_height + 1][starting_width] = 'w'
-
-        while walls:
-            # Pick a random wall
-            rand_wall = walls[int(random.random() * len(walls)) - 1]
-
-            # Check if it is a left wall
-            if rand_wall[1] != 0:
-                if self.maze[rand_wall[0]][rand_wall[1] - 1] == 'u' and self.maze[rand_wall[0]][rand_wall[1] + 1] == 'c':
-                    # Find the number of surrounding cells
-                    s_cells = self.surroundingCells(rand_wall)
-
-                    if s_cells < 2:
-                        # Denote the new path
-                        self.maze[rand_wall[0]][rand_wall[1]] = 'c'
-
-                        # Mark the new walls
-                        # Upper cell
-                        if rand_wall[0] != 0:
-                            if self.maze[rand_wall[0] - 1][rand_wall[1]] != 'c':
-                                self.maze[rand_wall[0] - 1][rand_wall[1]] = 'w'
-                            if [rand_wall[0] - 1, rand_wall[1]] not in walls:
-                                walls.append([rand_wall[0] - 1, rand_wall[1]])
-
-                        # Bottom cell
-                        if rand_wall[0] != self.height - 1:
-                            if self.maze[rand_wall[0] + 1][rand_wall[1]] != 'c':
-                                self.maze[rand_wall[0] + 1][rand_wall[1]] = 'w'
-                            if [rand_wall[0] + 1, rand_wall[1]] not in walls:
-                                walls.append([rand_wall[0] + 1, rand_wall[1]])
-
-                        # Leftmost cell
-                        if rand_wall[1] != 0:
-                            if self.maze[rand_wall[0]][rand_wall[1] - 1] != 'c':
-                                self.maze[rand_wall[0]][rand_wall[1] - 1] = 'w'
-                            if [rand_wall[0], rand_wall[1] - 1] not in walls:
-                                walls.append([rand_wall[0], rand_wall[1] - 1])
-
-                    # Delete wall
-                    for wall in walls:
-                        if wall[0] == rand_wall[0] and wall[1] == rand_wall[1]:
-                            walls.remove(wall)
-
-                    continue
-
-            # Check if it is an upper wall
-            if rand_wall[0] != 0:
-                if self.maze[rand_wall[0] - 1][rand_wall[1]] == 'u' and self.maze[rand_wall[0] + 1][rand_wall[1]] == 'c':
-
-                    s_cells = self.surroundingCells(rand_wall)
-                    if s_cells < 2:
-                        # Denote the new path
-                        self.maze[rand_wall[0]][rand_wall[1]] = 'c'
-
-                        # Mark the new walls
-                        # Upper cell
-                        if rand_wall[0] != 0:
-                            if self.maze[rand_wall[0] - 1][rand_wall[1]] != 'c':
-                                self.maze[rand_wall[0] - 1][rand_wall[1]] = 'w'
-                            if [rand_wall[0] - 1, rand_wall[1]] not in walls:
-                                walls.append([rand_wall[0] - 1, rand_wall[1]])
-
-                        # Leftmost cell
-                        if rand_wall[1] != 0:
-                            if self.maze[rand_wall[0]][rand_wall[1] - 1] != 'c':
-                                self.maze[rand_wall[0]][rand_wall[1] - 1] = 'w'
-                            if [rand_wall[0], rand_wall[1] - 1] not in walls:
-                                walls.append([rand_wall[0], rand_wall[1] - 1])
-
-                        # Rightmost cell
-                        if rand_wall[1] != self.width - 1:
-                            if self.maze[rand_wall[0]][rand_wall[1] + 1] != 'c':
-                                self.maze[rand_wall[0]][rand_wall[1] + 1] = 'w'
-                            if [rand_wall[0], rand_wall[1] + 1] not in walls:
-                                walls.append([rand_wall[0], rand_wall[1] + 1])
-
-                    # Delete wall
-                    for wall in walls:
-                        if wall[0] == rand_wall[0] and wall[1] == rand_wall[1]:
-                            walls.remove(wall)
-
-                    continue
-
-            # Check the bottom wall
-            if rand_wall[0] != self.height - 1:
-                if self.maze[rand_wall[0] + 1][rand_wall[1]] == 'u' and self.maze[rand_wall[0] - 1][rand_wall[1]] == 'c':
-
-                    s_cells = self.surroundingCells(rand_wall)
-                    if s_cells < 2:
-                        # Denote the new path
-                        self.maze[rand_wall[0]][rand_wall[1]] = 'c'
-
-                        # Mark the new walls
-                        if rand_wall[0] != self.height - 1:
-                            if self.maze[rand_wall[0] + 1][rand_wall[1]] != 'c':
-                                self.maze[rand_wall[0] + 1][rand_wall[1]] = 'w'
-                            if [rand_wall[0] + 1, rand_wall[1]] not in walls:
-                                walls.append([rand_wall[0] + 1, rand_wall[1]])
-                        if rand_wall[1] != 0:
-                            if self.maze[rand_wall[0]][rand_wall[1] - 1] != 'c':
-                                self.maze[rand_wall[0]][rand_wall[1] - 1] = 'w'
-                            if [rand_wall[0], rand_wall[1] - 1] not in walls:
-                                walls.append([rand_wall[0], rand_wall[1] - 1])
-                        if rand_wall[1] != self.width - 1:
-                            if self.maze[rand_wall[0]][rand_wall[1] + 1] != 'c':
-                                self.maze[rand_wall[0]][rand_wall[1] + 1] = 'w'
-                            if [rand_wall[0], rand_wall[1] + 1] not in walls:
-                                walls.append([rand_wall[0], rand_wall[1] + 1])
-
-                    # Delete wall
-                    for wall in walls:
-                        if wall[0] == rand_wall[0] and wall[1] == rand_wall[1]:
-                            walls.remove(wall)
 
-                    continue
-
-            # Check the right wall
-            if rand_wall[1] != self.width - 1:
-                if self.maze[rand_wall[0]][rand_wall[1] + 1] == 'u' and self.maze[rand_wall[0]][rand_wall[1] - 1] == 'c':
-
-                    s_cells = self.surroundingCells(rand_wall)
-                    if s_cells < 2:
-                        # Denote the new path
-                        self.maze[rand_wall[0]][rand_wall[1]] = 'c'
-
-                        # Mark the new walls
-                        if rand_wall[1] != self.width - 1:
-                            if self.maze[rand_wall[0]][rand_wall[1] + 1] != 'c':
-                                self.maze[rand_wall[0]][rand_wall[1] + 1] = 'w'
-                            if [rand_wall[0], rand_wall[1] + 1] not in walls:
-                                walls.append([rand_wall[0], rand_wall[1] + 1])
-                        if rand_wall[0] != self.height - 1:
-                            if self.maze[rand_wall[0] + 1][rand_wall[1]] != 'c':
-                                self.maze[rand_wall[0] + 1][rand_wall[1]] = 'w'
-                            if [rand_wall[0] + 1, rand_wall[1]] not in walls:
-                                walls.append([rand_wall[0] + 1, rand_wall[1]])
-                        if rand_wall[0] != 0:
-                            if self.maze[rand_wall[0] - 1][rand_wall[1]] != 'c':
-                                self.maze[rand_wall[0] - 1][rand_wall[1]] = 'w'
-                            if [rand_wall[0] - 1, rand_wall[1]] not in walls:
-                                walls.append([rand_wall[0] - 1, rand_wall[1]])
-
-                    # Delete wall
-                    for wall in walls:
-                        if wall[0] == rand_wall[0] and wall[1] == rand_wall[1]:
-                            walls.remove(wall)
+    @property
+    def maze(self):
+        """ Gets the maze as rows of 'w' (wall) and 'c' (cell) characters. Built fresh on every access """
+        table = bytes.maketrans(bytes([BLANK, BARRIER]), b'cw')
+        text = self.cells.translate(table).decode()
+        return [list(text[i:i + self.width]) for i in range(0, len(text), self.width)]
 
+    def generate_maze(self):
+        """ 
+        Generates a maze using randomized prim's algorithm 
+
+        The frontier is a list of cell indices with a membership flag per cell. Walls are picked
+        uniformly at random and removed by swapping in the last entry, so every step is O(1).
+        """
+        stats = self.stats
+        on_expand, on_push = stats.on_expand, stats.on_push
+        phase_start = time.perf_counter()
+        height, width = self.height, self.width
+        rand = self.random.random
+        cells = bytearray(height * width)
+        in_frontier = bytearray(height * width)
+        # the border is never carved, so it is flagged as already queued and never enters the frontier
+        in_frontier[:width] = bytes([1]) * width
+        in_frontier[-width:] = bytes([1]) * width
+        in_frontier[::width] = bytes([1]) * height
+        in_frontier[width - 1::width] = bytes([1]) * height
+        frontier = []
+        push = frontier.append
+        pop = frontier.pop
+
+        # a wall can only be opened up by carving into the unvisited cell on its far side.
+        # pairs are ( towards unvisited, towards cell ) for left, upper, bottom and right walls
+        directions = ((-1, 1), (-width, width), (width, -width), (1, -1))
+
+        # Randomize starting point away from the border and mark it as a cell
+        start = self.random.randrange(1, height - 1) * width + self.random.randrange(1, width - 1)
+        cells[start] = CELL
+
+        # Denote the surrounding walls and add them to the frontier
+        for wall in (start - width, start - 1, start + 1, start + width):
+            cells[wall] = WALL
+            if not in_frontier[wall]:
+                in_frontier[wall] = 1
+                push(wall)
+
+        phase_start = stats.timed('setup', phase_start)
+        carved = pops = 0
+        peak = pushes = len(frontier)
+        while frontier:
+            # Pick a random wall and swap-remove it from the frontier
+            k = int(rand() * len(frontier))
+            wall = frontier[k]
+            last = pop()
+            if k < len(frontier):
+                frontier[k] = last
+            in_frontier[wall] = 0
+            pops += 1
+
+            for ahead, behind in directions:
+                if cells[wall + ahead] == UNVISITED and cells[wall + behind] == CELL:
+                    break
+            else:
+                continue
+
+            # Find the number of surrounding cells
+            s_cells = ((cells[wall - width] == CELL) + (cells[wall + width] == CELL) +
+                       (cells[wall - 1] == CELL) + (cells[wall + 1] == CELL))
+            if s_cells >= 2:
+                continue
+
+            # Denote the new path and mark the new walls
+            cells[wall] = CELL
+            carved += 1
+            if on_expand:
+                on_expand(divmod(wall, width))
+            for neighbor in (wall - width, wall + width, wall - 1, wall + 1):
+                if neighbor == wall + behind:
                     continue
-
-            # Delete the wall from the list anyway
-            for wall in walls:
-                if wall[0] == rand_wall[0] and wall[1] == rand_wall[1]:
-                    walls.remove(wall)
-
-        # Mark the remaining unvisited cells as walls
-        for i in range(0, self.height):
-            for j in range(0, self.width):
-                if self.maze[i][j] == 'u':
-                    self.maze[i][j] = 'w'
+                cells[neighbor] = WALL
+                if not in_frontier[neighbor]:
+                    in_frontier[neighbor] = 1
+                    push(neighbor)
+                    pushes += 1
+                    if on_push:
+                        on_push(divmod(neighbor, width))
+            if len(frontier) > peak:
+                peak = len(frontier)
+
+        phase_start = stats.timed('carve', phase_start)
+
+        # Mark the remaining unvisited cells as walls and convert to the Grid encoding
+        table = bytes([BARRIER, BLANK, BARRIER]) + bytes(253)
+        self.cells = cells.translate(table)
 
         # Set entrance
-        for i in range(0, self.width):
-            if self.maze[1][i] == 'c':
-                self.maze[0][i] = 'c'
-                self.entrance = [0, i]
-                break
+        i = self.cells.find(BLANK, width, 2 * width)
+        if i != -1:
+            self.cells[i - width] = BLANK
+            self.entrance = [0, i - width]
 
         # set exit
-        for i in range(self.width - 1, 0, -1):
-            if self.maze[self.height - 2][i] == 'c':
-                self.maze[self.height - 1][i] = 'c'
-                self.exit = [self.height - 1, i]
+        i = self.cells.rfind(BLANK, (height - 2) * width + 1, (height - 1) * width)
+        if i != -1:
+            self.cells[i + width] = BLANK
+            self.exit = [height - 1, i - (height - 2) * width]
+
+        stats.timed('finish', phase_start)
+        stats.add_counts(carved, pushes, pops, 0, peak)
+
+    def save(self, path):
+        """ Writes the maze with its entrance, exit and seed to a bit-packed maze file, see mazefile """
+        mazefile.save(path, self)
+
+    def to_grid(self):
+        """ Gets the maze as a Grid where walls are barriers and every other cell is blank """
+        grid = Grid(self.height, self.width)
+        grid.cells[:] = self.cells
+        return grid
+
+class StreamingMaze:
+    """
+    Maze generated one row at a time with Eller's algorithm, in O(width) memory
+
+    Iterating yields the rows of the maze top to bottom as bytearrays in the Grid encoding, so a maze of
+    any height can be streamed to disk or consumed as it is made without the whole grid in memory.
+    Passages run on a lattice: cells sit at odd rows and columns and the walls between them are opened,
+    so an even height or width leaves one extra wall row or column before the border.
+
+    The entrance is on the top border above the first cell and the exit on the bottom border below the
+    last one, both known before any row is made. seed works as for Maze, and a missing seed is drawn so
+    that every pass over the rows gives the same maze. A random.Random instance can only be iterated once.
+    """
+
+    def __init__(self, height, width, seed=None):
+        """ Initializes the maze. Nothing is generated until the rows are iterated """
+        if height < 3 or width < 3:
+            raise ValueError("a maze needs at least 3 rows and columns")
+        self.height = height
+        self.width = width
+        self.seed = random.randrange(2 ** 63) if seed is None else seed
+        self.entrance = [0, 1]
+        self.exit = [height - 1, (width - 1) // 2 * 2 - 1]
+
+    def __iter__(self):
+        return self.rows()
+
+    def rows(self):
+        """ Generator yielding every row of the maze from the top """
+        rand = (self.seed if isinstance(self.seed, random.Random) else random.Random(self.seed)).random
+        height, width = self.height, self.width
+        count, columns = (height - 1) // 2, (width - 1) // 2
+        wall = bytes([BARRIER]) * width
+
+        top = bytearray(wall)
+        top[1] = BLANK
+        yield top
+
+        # sets[j] is the set of cell j of the current row, cells in one set are already connected
+        next_set = columns
+        sets = list(range(columns))
+        for i in range(count):
+            last = i == count - 1
+            row = bytearray(wall)
+            row[1:2 * columns:2] = bytes([BLANK]) * columns
+
+            # join neighbors in different sets, randomly or always on the last row
+            parent = {}
+
+            def find(s):
+                while s in parent:
+                    s = parent[s]
+                return s
+
+            for j in range(columns - 1):
+                a, b = find(sets[j]), find(sets[j + 1])
+                if a != b and (last or rand() < 0.5):
+                    parent[b] = a
+                    row[2 * j + 2] = BLANK
+            sets = [find(s) for s in sets]
+            yield row
+            if last:
                 break
-    
-    def surroundingCells(self, rand_wall):
-        """ Utility function that gets the surrounding cells of a given random wall """
-        s_cells = 0
-        if self.maze[rand_wall[0] - 1][rand_wall[1]] == 'c':
-            s_cells += 1
-        if self.maze[rand_wall[0] + 1][rand_wall[1]] == 'c':
-            s_cells += 1
-        if self.maze[rand_wall[0]][rand_wall[1] - 1] == 'c':
-            s_cells += 1
-        if self.maze[rand_wall[0]][rand_wall[1] + 1] == 'c':
-            s_cells += 1
-
-        return s_cells
+
+            # every set goes down through at least one of its cells, the others start new sets
+            below = bytearray(wall)
+            members = {}
+            for j, s in enumerate(sets):
+                members.setdefault(s, []).append(j)
+            for s, cells in members.items():
+                down = [j for j in cells if rand() < 0.5] or [cells[int(rand() * len(cells))]]
+                for j in down:
+                    below[2 * j + 1] = BLANK
+                for j in cells:
+                    if below[2 * j + 1] != BLANK:
+                        sets[j] = next_set
+                        next_set += 1
+            yield below
+
+        # the bottom border, with the exit carved through any extra wall row
+        for i in range(2 * count, height):
+            row = bytearray(wall)
+            row[self.exit[1]] = BLANK
+            yield row
+
+    def save(self, path, band=None):
+        """
+        Streams the maze to a bit-packed maze file, see mazefile
+
+        Rows are packed and written band rows at a time, by default about a megabyte of cells, so the
+        maze is never in memory as a whole.
+        """
+        band = band or max(1, (1 << 20) // self.width)
+        seed = self.seed if isinstance(self.seed, int) else None
+        with open(path, 'wb') as f:
+            f.write(mazefile.header(self.height, self.width, self.entrance, self.exit, seed))
+            cells = bytearray()
+            for i, row in enumerate(self.rows(), 1):
+                cells += row
+                if i % band == 0:
+                    f.write(mazefile.pack_band(cells, self.width))
+                    cells = bytearray()
+            if cells:
+                f.write(mazefile.pack_band(cells, self.width))
+
+    def to_grid(self):
+        """ Gets the whole maze as a Grid where walls are barriers and every other cell is blank """
+        grid = Grid(self.height, self.width)
+        grid.cells[:] = b''.join(self.rows())
+        return grid
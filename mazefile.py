@@ -0,0 +1,204 @@
+import mmap
+import struct
+from grid import Grid, as_grid, BARRIER, BARRIER_TABLE, START, GOAL
+
+MAGIC = b'MAZB'
+VERSION = 1
+
+# header flags
+HAS_SEED = 1
+HAS_WEIGHTS = 2
+
+# magic, version, flags, rows, cols, entrance row, entrance col, exit row, exit col, seed
+HEADER = struct.Struct('<4sBBxxIIiiiiq')
+
+# maps unpacked bits back to cell states
+BARRIER_CELLS = bytes([0, BARRIER]) + bytes(254)
+
+# LANE_TABLES[k] moves a 0/1 byte to bit k, UNPACK_TABLES[k] moves bit k of a byte back down to a 0/1 byte
+LANE_TABLES = [bytes((value & 1) << k for value in range(256)) for k in range(8)]
+UNPACK_TABLES = [bytes((value >> k) & 1 for value in range(256)) for k in range(8)]
+
+def pack_bits(flags):
+    """
+    Packs bytes of 0 and 1 into bits, eight to a byte with the first flag in the lowest bit
+
+    Works on every eighth flag at once with slicing and translate, so nothing loops per cell in Python.
+    """
+    size = (len(flags) + 7) // 8
+    packed = 0
+    for k in range(8):
+        lane = flags[k::8].translate(LANE_TABLES[k])
+        packed |= int.from_bytes(lane, 'little')
+    return packed.to_bytes(size, 'little')
+
+def unpack_bits(packed, count):
+    """ Unpacks the first count bits of packed into a bytearray of 0 and 1 """
+    packed = bytes(packed)
+    flags = bytearray(len(packed) * 8)
+    for k in range(8):
+        flags[k::8] = packed.translate(UNPACK_TABLES[k])
+    del flags[count:]
+    return flags
+
+def find_state(grid, state):
+    """ Gets the ( row, col ) of the first cell in a state, or None """
+    i = grid.cells.find(state)
+    return None if i == -1 else grid.position(i)
+
+def dumps(board, entrance=None, exit=None, seed=None):
+    """
+    Gets a Maze or Grid as the bytes of a bit-packed maze file
+
+    Only barriers, weights and the endpoints are kept, search states are dropped. The entrance and exit
+    default to those of a Maze, or to the start and goal cells of a Grid, and the seed to that of a Maze
+    if it was an integer.
+    """
+    grid = as_grid(board)
+    if entrance is None:
+        entrance = getattr(board, 'entrance', None) or find_state(grid, START)
+    if exit is None:
+        exit = getattr(board, 'exit', None) or find_state(grid, GOAL)
+    if seed is None:
+        seed = getattr(board, 'seed', None)
+    if not isinstance(seed, int) or not -2 ** 63 <= seed < 2 ** 63:
+        seed = None
+
+    weighted = grid.weights is not None
+    return (header(grid.rows, grid.cols, entrance, exit, seed, weighted) + pack_band(grid.cells, grid.cols) +
+            (bytes(grid.weights) if weighted else b''))
+
+def header(rows, cols, entrance=None, exit=None, seed=None, weighted=False):
+    """ Gets the header of a maze file. seed must be None or fit in 64 bits """
+    flags = (HAS_SEED if seed is not None else 0) | (HAS_WEIGHTS if weighted else 0)
+    return HEADER.pack(MAGIC, VERSION, flags, rows, cols, *(entrance or (-1, -1)), *(exit or (-1, -1)), seed or 0)
+
+def pack_band(cells, cols):
+    """
+    Packs whole rows of cells into the barrier bits of a maze file
+
+    Files can be written a band of rows at a time, the header followed by every band in order.
+    """
+    barriers = bytes(cells).translate(BARRIER_TABLE)
+    if cols % 8:
+        # every row starts on a byte boundary so rows and windows can be read without the rest
+        padding = bytes(8 - cols % 8)
+        barriers = b''.join(barriers[i:i + cols] + padding for i in range(0, len(barriers), cols))
+    return pack_bits(barriers)
+
+def save(path, board, entrance=None, exit=None, seed=None):
+    """ Writes a Maze or Grid to a bit-packed maze file, see dumps """
+    with open(path, 'wb') as f:
+        f.write(dumps(board, entrance, exit, seed))
+
+class MazeFile:
+    """
+    Maze file opened with mmap
+
+    Opening only reads the header, cells are read from the mapping when they are asked for, so a huge
+    maze opens instantly and only the pages touched are ever loaded. Barriers are stored one bit per
+    cell, rows padded to whole bytes, followed by one weight byte per cell if the board had weights.
+    entrance, exit and seed are None when the file has none. Use as a context manager, or call close.
+
+    Several mazes may be written back to back into one file, offset is the byte where this one starts
+    and size its length in bytes, so the next one starts at offset + size. See records.
+    """
+    def __init__(self, path, offset=0):
+        """ Maps the file and reads the header at offset """
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < offset + HEADER.size:
+            self.map.close()
+            raise ValueError("%s has no maze at byte %d" % (path, offset))
+        (magic, version, flags, self.rows, self.cols, entrance_row, entrance_col,
+         exit_row, exit_col, seed) = HEADER.unpack_from(self.map, offset)
+        if magic != MAGIC or version != VERSION:
+            self.map.close()
+            raise ValueError("%s is not a version %d maze file" % (path, VERSION))
+        self.offset = offset
+        self.entrance = None if entrance_row < 0 else (entrance_row, entrance_col)
+        self.exit = None if exit_row < 0 else (exit_row, exit_col)
+        self.seed = seed if flags & HAS_SEED else None
+        self.weighted = bool(flags & HAS_WEIGHTS)
+        self.stride = (self.cols + 7) // 8
+        self.bits_offset = offset + HEADER.size
+        self.weights_offset = self.bits_offset + self.rows * self.stride
+        self.size = self.weights_offset - offset + (self.rows * self.cols if self.weighted else 0)
+        if len(self.map) < offset + self.size:
+            self.map.close()
+            raise ValueError("%s is cut short, its %dx%d maze needs %d bytes" % (path, self.rows, self.cols, self.size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Unmaps the file """
+        self.map.close()
+
+    def is_barrier(self, pos):
+        """ Checks if the cell at ( row, col ) is a barrier, reading one byte """
+        row, col = pos
+        return bool(self.map[self.bits_offset + row * self.stride + col // 8] >> (col & 7) & 1)
+
+    def weight(self, pos):
+        """ Gets the cost of moving onto the cell at ( row, col ) """
+        if not self.weighted:
+            return 1
+        return self.map[self.weights_offset + pos[0] * self.cols + pos[1]]
+
+    def window(self, top, left, rows, cols):
+        """ Gets the cells from ( top, left ) spanning rows by cols as a new Grid, reading only their bytes """
+        grid = Grid(rows, cols)
+        first, last = left // 8, (left + cols + 7) // 8
+        shift = left - first * 8
+        start = self.bits_offset + top * self.stride
+        packed = b''.join(self.map[i + first:i + last] for i in range(start, start + rows * self.stride, self.stride))
+        bits = unpack_bits(packed, len(packed) * 8).translate(BARRIER_CELLS)
+        span = (last - first) * 8
+        if shift == 0 and span == cols:
+            grid.cells[:] = bits
+        else:
+            for row in range(rows):
+                grid.cells[row * cols:(row + 1) * cols] = bits[row * span + shift:row * span + shift + cols]
+        if self.weighted:
+            grid.weights = bytearray(rows * cols)
+            for row in range(rows):
+                start = self.weights_offset + (top + row) * self.cols + left
+                grid.weights[row * cols:(row + 1) * cols] = self.map[start:start + cols]
+        return grid
+
+    def to_grid(self):
+        """ Gets the whole board as a new Grid with its entrance and exit blank """
+        if self.cols % 8 == 0:
+            # rows have no padding, unpack everything at once
+            grid = Grid(self.rows, self.cols)
+            bits = unpack_bits(self.map[self.bits_offset:self.weights_offset], self.rows * self.cols)
+            grid.cells[:] = bits.translate(BARRIER_CELLS)
+            if self.weighted:
+                grid.weights = bytearray(self.map[self.weights_offset:self.weights_offset + len(grid)])
+            return grid
+        return self.window(0, 0, self.rows, self.cols)
+
+def load(path):
+    """ Opens a maze file written by save, see MazeFile """
+    return MazeFile(path)
+
+def records(path):
+    """
+    Yields every maze of a file holding several written back to back as a MazeFile
+
+    Each one is closed when the next is asked for, so read what is needed from it before moving on.
+    """
+    with open(path, 'rb') as f:
+        end = f.seek(0, 2)
+    offset = 0
+    while offset < end:
+        board = MazeFile(path, offset)
+        try:
+            yield board
+        finally:
+            board.close()
+        offset += board.size
@@ -0,0 +1,396 @@
+import os
+import sys
+import json
+import time
+import asyncio
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from grid import Grid
+import solvers
+
+# grids mapped by each worker process, keyed by shared memory name, and how many it keeps mapped
+_worker_grids = OrderedDict()
+WORKER_GRIDS = 8
+
+# operations latencies are kept for, anything else counts as invalid
+OPS = ('generate', 'load', 'solve', 'drop', 'grids', 'metrics')
+
+def worker_grid(name, rows, cols, weighted):
+    """ Gets a resident grid inside a worker, mapping its shared memory on first use """
+    entry = _worker_grids.get(name)
+    if entry is not None:
+        _worker_grids.move_to_end(name)
+        return entry[2]
+    memory = shared_memory.SharedMemory(name=name)
+    n = rows * cols
+    views = [memory.buf[:n]] + ([memory.buf[n:2 * n]] if weighted else [])
+    grid = Grid(rows, cols, views[0], views[1] if weighted else None)
+    _worker_grids[name] = (memory, views, grid)
+    while len(_worker_grids) > WORKER_GRIDS:
+        memory, views, grid = _worker_grids.popitem(last=False)[1]
+        # the views have to go before the mapping can be closed
+        for view in views:
+            view.release()
+        memory.close()
+    return _worker_grids[name][2]
+
+def solve_queries(name, rows, cols, weighted, algorithm, queries):
+    """ Runs a batch of ( start, goal ) queries on a resident grid. Returns ( path, stats dict ) for each """
+    grid = worker_grid(name, rows, cols, weighted)
+    search = solvers.algorithms[algorithm]
+    results = []
+    for start, goal in queries:
+        result = search(grid, tuple(start), tuple(goal))
+        results.append((result.path, result.stats.as_dict()))
+    return results
+
+def generate_maze(rows, cols, seed, generator):
+    """ Generates a maze in a worker. Returns ( cells, entrance, exit ) """
+    from maze import Maze, StreamingMaze
+    if generator == 'eller':
+        maze = StreamingMaze(rows, cols, seed)
+        return bytes(maze.to_grid().cells), maze.entrance, maze.exit
+    maze = Maze(rows, cols, seed)
+    return bytes(maze.cells), maze.entrance, maze.exit
+
+def load_maze(path):
+    """ Reads a maze file in a worker. Returns ( rows, cols, cells, weights or None, entrance, exit ) """
+    import mazefile
+    with mazefile.load(path) as board:
+        grid = board.to_grid()
+        entrance, exit = board.entrance, board.exit
+    weights = bytes(grid.weights) if grid.weights is not None else None
+    return grid.rows, grid.cols, bytes(grid.cells), weights, entrance, exit
+
+class Metrics:
+    """
+    Request latencies by operation and queue depth gauges
+
+    Latencies keep the last window requests of each operation, from the line being read to the reply
+    being written, so percentiles follow recent load.
+    """
+    def __init__(self, window=1024):
+        """ Initializes empty metrics """
+        self.window = window
+        self.latencies = {}
+        self.counts = {}
+        self.errors = 0
+        self.batches = 0
+        self.batched = 0
+        self.peak_pending = 0
+
+    def observe(self, op, seconds):
+        """ Records the latency of one request """
+        self.counts[op] = self.counts.get(op, 0) + 1
+        self.latencies.setdefault(op, deque(maxlen=self.window)).append(seconds)
+
+    def snapshot(self):
+        """ Gets the count, mean and percentile latencies in milliseconds of every operation """
+        result = {}
+        for op, values in self.latencies.items():
+            ordered = sorted(values)
+            result[op] = {
+                'count': self.counts[op],
+                'mean_ms': 1000 * sum(ordered) / len(ordered),
+                'p50_ms': 1000 * ordered[len(ordered) // 2],
+                'p95_ms': 1000 * ordered[min(len(ordered) - 1, len(ordered) * 95 // 100)],
+                'max_ms': 1000 * ordered[-1],
+            }
+        return result
+
+class SolveService:
+    """
+    Asyncio solve server speaking JSON lines over TCP
+
+    Every request is one JSON object on a line with an "op" and an optional "id" that the reply echoes,
+    and every reply is one line with "ok" and either the result or an "error". Replies on a connection
+    come back as they finish, not in request order. Operations:
+
+        generate  rows, cols, seed, generator ('prim' or 'eller'): makes a resident grid, returns its id
+        load      path: reads a maze file into a resident grid, returns its id
+        solve     grid, start, goal, algorithm (a key of solvers.algorithms): returns the path and stats
+        drop      grid: frees a resident grid
+        grids     lists the resident grids
+        metrics   latencies per operation, queue depth and batching counts
+
+    Resident grids live in shared memory, so workers map each one once and solve requests only carry
+    endpoints. Concurrent solves on the same grid and algorithm are gathered for batch_delay seconds, or
+    until max_batch of them wait, and sent to the process pool as one task. The event loop only parses,
+    batches and replies, so it stays responsive while searches run.
+    """
+    def __init__(self, workers=None, batch_delay=0.002, max_batch=64):
+        """ Starts the process pool. Call close when done """
+        # workers have to share the tracker of this process, or the one they would start on their own
+        # unlinks every grid they mapped when they exit
+        resource_tracker.ensure_running()
+        self.pool = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        self.batch_delay = batch_delay
+        self.max_batch = max_batch
+        # grid id -> ( shared memory, rows, cols, weighted, entrance, exit )
+        self.grids = {}
+        self.next_id = 1
+        # ( grid id, algorithm ) -> [ ( start, goal, future ) ] waiting to be sent
+        self.batches = {}
+        self.pending = 0
+        self.in_flight = 0
+        self.metrics = Metrics()
+
+    def close(self):
+        """ Shuts the pool down and frees every resident grid """
+        self.pool.shutdown()
+        for grid_id in list(self.grids):
+            self.drop(grid_id)
+
+    def add_grid(self, rows, cols, cells, weights, entrance, exit):
+        """ Copies a grid into shared memory and returns its new id """
+        n = rows * cols
+        memory = shared_memory.SharedMemory(create=True, size=max(2 * n if weights is not None else n, 1))
+        memory.buf[:n] = cells
+        if weights is not None:
+            memory.buf[n:2 * n] = weights
+        grid_id = "g%d" % self.next_id
+        self.next_id += 1
+        self.grids[grid_id] = (memory, rows, cols, weights is not None, entrance, exit)
+        return grid_id
+
+    def drop(self, grid_id):
+        """ Frees a resident grid, workers drop their mapping of it when it falls out of their cache """
+        memory = self.grids.pop(grid_id)[0]
+        memory.close()
+        memory.unlink()
+
+    def describe(self, grid_id):
+        """ Gets the reply fields describing a resident grid """
+        memory, rows, cols, weighted, entrance, exit = self.grids[grid_id]
+        return {'grid': grid_id, 'rows': rows, 'cols': cols, 'weighted': weighted, 'entrance': entrance, 'exit': exit}
+
+    async def generate(self, rows, cols, seed=None, generator='prim'):
+        """ Generates a maze in the pool and makes it resident """
+        if generator not in ('prim', 'eller'):
+            raise ValueError("unknown generator %r" % generator)
+        if rows < 3 or cols < 3:
+            raise ValueError("a maze needs at least 3 rows and columns")
+        loop = asyncio.get_running_loop()
+        cells, entrance, exit = await loop.run_in_executor(self.pool, generate_maze, rows, cols, seed, generator)
+        return self.describe(self.add_grid(rows, cols, cells, None, entrance, exit))
+
+    async def load(self, path):
+        """ Reads a maze file in the pool and makes it resident """
+        loop = asyncio.get_running_loop()
+        rows, cols, cells, weights, entrance, exit = await loop.run_in_executor(self.pool, load_maze, path)
+        return self.describe(self.add_grid(rows, cols, cells, weights, entrance, exit))
+
+    async def solve(self, grid, start, goal, algorithm='a_star'):
+        """ Queues one query into the batch of its grid and algorithm and waits for its result """
+        if grid not in self.grids:
+            raise KeyError("no grid %r" % grid)
+        if algorithm not in solvers.algorithms:
+            raise ValueError("unknown algorithm %r" % algorithm)
+        rows, cols = self.grids[grid][1:3]
+        for row, col in (start, goal):
+            if not (0 <= row < rows and 0 <= col < cols):
+                raise ValueError("cell %r is outside the %dx%d grid" % ((row, col), rows, cols))
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (grid, algorithm)
+        batch = self.batches.setdefault(key, [])
+        batch.append((start, goal, future))
+        self.pending += 1
+        self.metrics.peak_pending = max(self.metrics.peak_pending, self.pending)
+        if len(batch) == 1:
+            loop.call_later(self.batch_delay, self.flush, key)
+        elif len(batch) >= self.max_batch:
+            self.flush(key)
+        path, stats = await future
+        return {'path': path, 'stats': stats}
+
+    def flush(self, key):
+        """ Sends the waiting batch of a grid and algorithm to the pool, if there still is one """
+        batch = self.batches.pop(key, None)
+        if batch:
+            asyncio.get_running_loop().create_task(self.run_batch(key, batch))
+
+    async def run_batch(self, key, batch):
+        """ Solves a batch in the pool and hands each query its result """
+        grid, algorithm = key
+        self.pending -= len(batch)
+        self.in_flight += 1
+        self.metrics.batches += 1
+        self.metrics.batched += len(batch)
+        try:
+            if grid not in self.grids:
+                raise KeyError("grid %r was dropped" % grid)
+            memory, rows, cols, weighted = self.grids[grid][:4]
+            queries = [(start, goal) for start, goal, future in batch]
+            loop = asyncio.get_running_loop()
+            results = await loop.run_in_executor(self.pool, solve_queries, memory.name, rows, cols, weighted,
+                                                 algorithm, queries)
+        except Exception as error:
+            for start, goal, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+        else:
+            for (start, goal, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.in_flight -= 1
+
+    def status(self):
+        """ Gets the metrics reply """
+        return {
+            'latency': self.metrics.snapshot(),
+            'queue': {'pending': self.pending, 'peak_pending': self.metrics.peak_pending, 'in_flight': self.in_flight},
+            'batches': self.metrics.batches,
+            'mean_batch': self.metrics.batched / self.metrics.batches if self.metrics.batches else 0.0,
+            'errors': self.metrics.errors,
+            'grids': len(self.grids),
+        }
+
+    async def handle(self, message):
+        """ Runs one request and returns its reply fields """
+        op = message.get('op')
+        if op == 'generate':
+            return await self.generate(int(message['rows']), int(message['cols']), message.get('seed'),
+                                       message.get('generator', 'prim'))
+        if op == 'load':
+            return await self.load(message['path'])
+        if op == 'solve':
+            return await self.solve(message['grid'], tuple(message['start']), tuple(message['goal']),
+                                    message.get('algorithm', 'a_star'))
+        if op == 'drop':
+            if message['grid'] not in self.grids:
+                raise KeyError("no grid %r" % message['grid'])
+            self.drop(message['grid'])
+            return {}
+        if op == 'grids':
+            return {'grids': [self.describe(grid_id) for grid_id in self.grids]}
+        if op == 'metrics':
+            return self.status()
+        raise ValueError("unknown op %r" % op)
+
+    async def reply(self, line, writer):
+        """ Parses one request line, runs it and writes the reply line """
+        start_time = time.perf_counter()
+        message = {}
+        try:
+            message = json.loads(line)
+            if not isinstance(message, dict):
+                message = {}
+                raise ValueError("a request is a JSON object")
+            reply = dict(await self.handle(message), ok=True)
+        except Exception as error:
+            self.metrics.errors += 1
+            reply = {'ok': False, 'error': "%s: %s" % (type(error).__name__, error)}
+        if 'id' in message:
+            reply['id'] = message['id']
+        if not writer.is_closing():
+            writer.write(json.dumps(reply).encode() + b'\n')
+        op = message.get('op')
+        self.metrics.observe(op if op in OPS else 'invalid', time.perf_counter() - start_time)
+
+    async def connection(self, reader, writer):
+        """ Serves one client, running its requests concurrently """
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.reply(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except (ConnectionError, ValueError, asyncio.CancelledError):
+            # a dropped client, a line over the stream limit, or the server shutting down with the client connected
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, ready=None):
+        """ Accepts clients until cancelled. ready, if given, is called with the bound ( host, port ) """
+        server = await asyncio.start_server(self.connection, host, port, limit=1 << 24)
+        if ready:
+            ready(server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+
+class Client:
+    """ Minimal asyncio client for SolveService, one connection with requests matched to replies by id """
+    def __init__(self, reader, writer):
+        """ Wraps an open connection, see connect """
+        self.reader = reader
+        self.writer = writer
+        self.next_id = 1
+        self.waiting = {}
+        self.receiver = asyncio.get_running_loop().create_task(self.receive())
+
+    @classmethod
+    async def connect(cls, host='127.0.0.1', port=8765):
+        """ Opens a connection to a running service """
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 24)
+        return cls(reader, writer)
+
+    async def receive(self):
+        """ Hands every reply line to the request waiting for it """
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            future = self.waiting.pop(reply.get('id'), None)
+            if future is not None and not future.done():
+                future.set_result(reply)
+        for future in self.waiting.values():
+            future.set_exception(ConnectionError("service closed the connection"))
+
+    async def request(self, op, **fields):
+        """ Sends one request and waits for its reply, raising RuntimeError if it failed """
+        request_id = self.next_id
+        self.next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[request_id] = future
+        self.writer.write(json.dumps(dict(fields, op=op, id=request_id)).encode() + b'\n')
+        reply = await future
+        if not reply['ok']:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    async def close(self):
+        """ Closes the connection """
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+def main(argv=None):
+    """ Command line entry point, see --help """
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="Serves maze generation and solving over JSON lines on TCP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, help="worker processes, one per core by default")
+    parser.add_argument('--batch-delay', type=float, default=0.002, help="seconds concurrent solves are gathered for")
+    parser.add_argument('--max-batch', type=int, default=64, help="solves sent to a worker at once")
+    args = parser.parse_args(argv)
+
+    # a terminated service frees its grids like an interrupted one
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    service = SolveService(args.workers, args.batch_delay, args.max_batch)
+    try:
+        asyncio.run(service.serve(args.host, args.port,
+                                  lambda address: print("serving on %s:%d" % address, file=sys.stderr)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,545 @@
+import math
+import time
+import heapq
+from collections import deque, namedtuple
+from grid import DOWN, RIGHT, UP, LEFT
+from stats import SearchStats
+
+INF = float("inf")
+
+SearchResult = namedtuple('SearchResult', ['path', 'visited', 'order', 'stats'])
+SearchResult.__doc__ = """
+Outcome of a headless search
+
+path is the list of ( row, col ) cells from start to goal inclusive, or None if the goal is unreachable.
+visited is the set of every cell the search discovered.
+order is the list of cells in the order they were expanded.
+stats is the SearchStats record of the run.
+"""
+
+def h(p1, p2):
+    """ heuristic function that returns absolute distance. prefers straight lines """
+    x1, y1 = p1
+    x2, y2 = p2
+    return abs(x1 - x2) + abs(y1 - y2)
+
+def euclidean_dist(p1, p2):
+    """ heuristic function that returns euclidean distance. prefers diagonals """
+    x1, y1 = p1
+    x2, y2 = p2
+    return math.sqrt((x2-x1)**2 + (y2-y1)**2)
+
+def reconstruct_path(prev_map, current):
+    """ returns the path from the start node to current by walking the prev_map backwards """
+    path = [current]
+    while current in prev_map:
+        current = prev_map[current]
+        path.append(current)
+    path.reverse()
+    return path
+
+def finish(stats, path, visited, order, pushes, pops, reopens, peak):
+    """ Adds the counters of a finished search to its stats record and builds the SearchResult """
+    stats.add_counts(len(order), pushes, pops, reopens, peak)
+    stats.record_path(path)
+    return SearchResult(path, visited, order, stats)
+
+def finish_ids(stats, cols, path, visited, order, pushes, pops, reopens, peak):
+    """ Same as finish for a search over cell indices, converting its cells back to ( row, col ) """
+    path = None if path is None else [divmod(i, cols) for i in path]
+    return finish(stats, path, {divmod(i, cols) for i in visited}, [divmod(i, cols) for i in order],
+                  pushes, pops, reopens, peak)
+
+def adjacency(stats, grid):
+    """ Gets the adjacency masks and steps of a grid, timing the first build as the 'neighbors' phase """
+    start_time = time.perf_counter()
+    index = grid.adjacency
+    stats.timed('neighbors', start_time)
+    return index.masks, index.steps
+
+def id_heuristic(heuristic, cols, goal):
+    """ Gets heuristic as a function of cell index, computing h and euclidean_dist without building tuples """
+    if hasattr(heuristic, 'to_goal'):
+        # heuristics with per goal tables, like landmarks.Landmarks, give their own function of cell index
+        return heuristic.to_goal(goal)
+    goal_row, goal_col = goal
+    if heuristic is h:
+        return lambda i: abs(i // cols - goal_row) + abs(i % cols - goal_col)
+    if heuristic is euclidean_dist:
+        return lambda i: math.sqrt((i // cols - goal_row) ** 2 + (i % cols - goal_col) ** 2)
+    return lambda i: heuristic(divmod(i, cols), goal)
+
+def depth_first(grid, start, goal, stats=None):
+    """ Runs Depth First search from start to goal without drawing """
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    masks, steps = adjacency(stats, grid)
+    start_time = time.perf_counter()
+    cols = grid.cols
+    source = start[0] * cols + start[1]
+    target = goal[0] * cols + goal[1]
+    stack = [source]
+    prev_map = {}
+    visited = {source}
+    closed = set()
+    order = []
+    peak = pushes = 1
+    pops = 0
+
+    while stack:
+        if len(stack) > peak:
+            peak = len(stack)
+        current = stack.pop()
+        pops += 1
+        if current in closed:
+            continue
+        closed.add(current)
+        order.append(current)
+        if on_expand:
+            on_expand(divmod(current, cols))
+
+        # we've reached goal state
+        if current == target:
+            reconstruct_time = stats.timed('search', start_time)
+            path = reconstruct_path(prev_map, current)
+            stats.timed('reconstruct', reconstruct_time)
+            return finish_ids(stats, cols, path, visited, order, pushes, pops, 0, peak)
+
+        for step in steps[masks[current]]:
+            neighbor = current + step
+            if neighbor not in closed:
+                prev_map[neighbor] = current
+                stack.append(neighbor)
+                visited.add(neighbor)
+                pushes += 1
+                if on_push:
+                    on_push(divmod(neighbor, cols))
+
+    stats.timed('search', start_time)
+    return finish_ids(stats, cols, None, visited, order, pushes, pops, 0, peak)
+
+def breadth_first(grid, start, goal, stats=None):
+    """ Runs Breadth first search from start to goal without drawing """
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    masks, steps = adjacency(stats, grid)
+    start_time = time.perf_counter()
+    cols = grid.cols
+    source = start[0] * cols + start[1]
+    target = goal[0] * cols + goal[1]
+    queue = deque([source])
+    prev_map = {}
+    visited = {source}
+    order = []
+    peak = 1
+
+    while queue:
+        if len(queue) > peak:
+            peak = len(queue)
+        current = queue.popleft()
+        order.append(current)
+        if on_expand:
+            on_expand(divmod(current, cols))
+
+        # we've reached goal state
+        if current == target:
+            reconstruct_time = stats.timed('search', start_time)
+            path = reconstruct_path(prev_map, current)
+            stats.timed('reconstruct', reconstruct_time)
+            return finish_ids(stats, cols, path, visited, order, len(visited), len(order), 0, peak)
+
+        for step in steps[masks[current]]:
+            neighbor = current + step
+            if neighbor not in visited:
+                prev_map[neighbor] = current
+                queue.append(neighbor)
+                visited.add(neighbor)
+                if on_push:
+                    on_push(divmod(neighbor, cols))
+
+    stats.timed('search', start_time)
+    # every discovered cell was pushed and popped exactly once
+    return finish_ids(stats, cols, None, visited, order, len(visited), len(order), 0, peak)
+
+def best_first(grid, start, goal, stats=None):
+    """ 
+    Runs Greedy best-first search from start to goal without drawing
+
+    Nearly identical to DFS except we sort the successor states by their distance to the goal.
+    """
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    masks, steps = adjacency(stats, grid)
+    start_time = time.perf_counter()
+    cols = grid.cols
+    source = start[0] * cols + start[1]
+    target = goal[0] * cols + goal[1]
+    get_heuristic = id_heuristic(euclidean_dist, cols, goal)
+    stack = [source]
+    prev_map = {}
+    visited = {source}
+    closed = set()
+    order = []
+    peak = pushes = 1
+    pops = 0
+
+    while stack:
+        if len(stack) > peak:
+            peak = len(stack)
+        current = stack.pop()
+        pops += 1
+        if current in closed:
+            continue
+        closed.add(current)
+        order.append(current)
+        if on_expand:
+            on_expand(divmod(current, cols))
+
+        # we've reached goal state
+        if current == target:
+            reconstruct_time = stats.timed('search', start_time)
+            path = reconstruct_path(prev_map, current)
+            stats.timed('reconstruct', reconstruct_time)
+            return finish_ids(stats, cols, path, visited, order, pushes, pops, 0, peak)
+
+        successors = [current + step for step in steps[masks[current]]]
+        successors.sort(reverse=True, key=get_heuristic)
+        for neighbor in successors:
+            if neighbor not in closed:
+                prev_map[neighbor] = current
+                stack.append(neighbor)
+                visited.add(neighbor)
+                pushes += 1
+                if on_push:
+                    on_push(divmod(neighbor, cols))
+
+    stats.timed('search', start_time)
+    return finish_ids(stats, cols, None, visited, order, pushes, pops, 0, peak)
+
+def a_star(grid, start, goal, stats=None, heuristic=euclidean_dist):
+    """
+    Runs A* from start to goal without drawing
+
+    Cells are integer indices into grid.cells while searching. g scores and the closed set only hold the
+    cells the search reached, and improved cells are pushed again rather than updated in the heap, the
+    stale entries being skipped when popped. Nothing is allocated per grid cell, so a query costs the
+    region it explores. heuristic is h or euclidean_dist, any function of two ( row, col ) cells, or
+    landmarks.Landmarks built for the grid.
+    Moves cost the weight of the cell moved onto, every weight is at least 1 so both stay admissible.
+    """
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    masks, steps = adjacency(stats, grid)
+    start_time = time.perf_counter()
+    cols = grid.cols
+    weights = grid.weights
+    estimate = id_heuristic(heuristic, cols, goal)
+    source = start[0] * cols + start[1]
+    target = goal[0] * cols + goal[1]
+    count = 0
+    open_set = [(estimate(source), count, source)]
+    # hashmap to keep track of the cell's previous cell
+    prev_map = {}
+    # g scores are only stored for cells the search has reached
+    g_score = {source: 0}
+    closed = set()
+    order = []
+    peak = 1
+    pops = reopens = 0
+    heappush, heappop = heapq.heappush, heapq.heappop
+
+    while open_set:
+        if len(open_set) > peak:
+            peak = len(open_set)
+        current = heappop(open_set)[2] # get the cell with the lowest f score
+        pops += 1
+        if current in closed:
+            continue
+        closed.add(current)
+        order.append(current)
+        if on_expand:
+            on_expand(divmod(current, cols))
+
+        # if we've reached the goal
+        if current == target:
+            reconstruct_time = stats.timed('search', start_time)
+            path = reconstruct_path(prev_map, current)
+            stats.timed('reconstruct', reconstruct_time)
+            return finish_ids(stats, cols, path, g_score, order, count + 1, pops, reopens, peak)
+
+        current_g_score = g_score[current]
+        for step in steps[masks[current]]:
+            neighbor = current + step
+            temp_g_score = current_g_score + (1 if weights is None else weights[neighbor])
+            if temp_g_score < g_score.get(neighbor, INF):
+                prev_map[neighbor] = current
+                g_score[neighbor] = temp_g_score
+                count += 1
+                heappush(open_set, (temp_g_score + estimate(neighbor), count, neighbor))
+                if neighbor in closed:
+                    closed.discard(neighbor)
+                    reopens += 1
+                if on_push:
+                    on_push(divmod(neighbor, cols))
+
+    stats.timed('search', start_time)
+    return finish_ids(stats, cols, None, g_score, order, count + 1, pops, reopens, peak)
+
+def dijkstra(grid, start, goal, stats=None):
+    """
+    Runs Dijkstra's algorithm from start to goal without drawing
+
+    Moves cost the weight of the cell moved onto. Same heap and lazy decrease-key as a_star, without
+    a heuristic, so cells are expanded in order of their distance from the start.
+    """
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    masks, steps = adjacency(stats, grid)
+    start_time = time.perf_counter()
+    cols = grid.cols
+    weights = grid.weights
+    source = start[0] * cols + start[1]
+    target = goal[0] * cols + goal[1]
+    count = 0
+    open_set = [(0, count, source)]
+    prev_map = {}
+    g_score = {source: 0}
+    closed = set()
+    order = []
+    peak = 1
+    pops = 0
+    heappush, heappop = heapq.heappush, heapq.heappop
+
+    while open_set:
+        if len(open_set) > peak:
+            peak = len(open_set)
+        current = heappop(open_set)[2]
+        pops += 1
+        if current in closed:
+            continue
+        closed.add(current)
+        order.append(current)
+        if on_expand:
+            on_expand(divmod(current, cols))
+
+        if current == target:
+            reconstruct_time = stats.timed('search', start_time)
+            path = reconstruct_path(prev_map, current)
+            stats.timed('reconstruct', reconstruct_time)
+            return finish_ids(stats, cols, path, g_score, order, count + 1, pops, 0, peak)
+
+        current_g_score = g_score[current]
+        for step in steps[masks[current]]:
+            neighbor = current + step
+            temp_g_score = current_g_score + (1 if weights is None else weights[neighbor])
+            if temp_g_score < g_score.get(neighbor, INF):
+                prev_map[neighbor] = current
+                g_score[neighbor] = temp_g_score
+                count += 1
+                heappush(open_set, (temp_g_score, count, neighbor))
+                if on_push:
+                    on_push(divmod(neighbor, cols))
+
+    stats.timed('search', start_time)
+    return finish_ids(stats, cols, None, g_score, order, count + 1, pops, 0, peak)
+
+def dial(grid, start, goal, stats=None):
+    """
+    Runs Dial's algorithm from start to goal without drawing
+
+    Dijkstra's algorithm with a bucket queue instead of a heap, for small integer weights. A cell at
+    distance d waits in bucket d % ( max weight + 1 ), and since every cell on the queue is within max
+    weight of the current distance the buckets never mix two distances. Pushing and popping are O(1).
+    Improved cells are pushed again and their stale entries skipped, as in a_star.
+    """
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    masks, steps = adjacency(stats, grid)
+    start_time = time.perf_counter()
+    cols = grid.cols
+    weights = grid.weights
+    source = start[0] * cols + start[1]
+    target = goal[0] * cols + goal[1]
+    size = grid.max_weight() + 1
+    buckets = [[] for i in range(size)]
+    buckets[0].append(source)
+    queued = pushes = peak = 1
+    distance = pops = 0
+    prev_map = {}
+    g_score = {source: 0}
+    closed = set()
+    order = []
+
+    while queued:
+        bucket = buckets[distance % size]
+        if not bucket:
+            distance += 1
+            continue
+        if queued > peak:
+            peak = queued
+        current = bucket.pop()
+        queued -= 1
+        pops += 1
+        if current in closed or g_score[current] != distance:
+            continue
+        closed.add(current)
+        order.append(current)
+        if on_expand:
+            on_expand(divmod(current, cols))
+
+        if current == target:
+            reconstruct_time = stats.timed('search', start_time)
+            path = reconstruct_path(prev_map, current)
+            stats.timed('reconstruct', reconstruct_time)
+            return finish_ids(stats, cols, path, g_score, order, pushes, pops, 0, peak)
+
+        for step in steps[masks[current]]:
+            neighbor = current + step
+            temp_g_score = distance + (1 if weights is None else weights[neighbor])
+            if temp_g_score < g_score.get(neighbor, INF):
+                prev_map[neighbor] = current
+                g_score[neighbor] = temp_g_score
+                buckets[temp_g_score % size].append(neighbor)
+                queued += 1
+                pushes += 1
+                if on_push:
+                    on_push(divmod(neighbor, cols))
+
+    stats.timed('search', start_time)
+    return finish_ids(stats, cols, None, g_score, order, pushes, pops, 0, peak)
+
+def jump(masks, i, bit, step, goal):
+    """
+    Scans from cell i in a straight line until it finds a jump point, the goal or a barrier
+
+    bit and step are the Adjacency direction bit and index offset of the scan. Horizontal scans stop
+    next to a forced neighbor. Vertical scans also stop on any row where a horizontal scan would find
+    a jump point, so horizontal moves never need to branch. Returns the jump point's index or None.
+    """
+    if bit & (RIGHT | LEFT):
+        sides = (UP, DOWN)
+    else:
+        sides = (LEFT, RIGHT)
+    while masks[i] & bit:
+        back = masks[i]
+        i += step
+        if i == goal:
+            return i
+        mask = masks[i]
+        # a side opens up that was closed on the cell before
+        if mask & ~back & sides[0] or mask & ~back & sides[1]:
+            return i
+        if sides[0] == LEFT and (jump(masks, i, RIGHT, 1, goal) is not None or
+                                 jump(masks, i, LEFT, -1, goal) is not None):
+            return i
+    return None
+
+def jump_directions(cols):
+    """
+    Gets the ( bit, step ) directions to scan from a jump point, keyed by the step that arrived at it
+
+    None is the start, which scans every way. Otherwise the direction we arrived from is pruned.
+    """
+    directions = {None: ((DOWN, cols), (RIGHT, 1), (UP, -cols), (LEFT, -1))}
+    for bit, step in ((RIGHT, 1), (LEFT, -1)):
+        directions[step] = ((DOWN, cols), (bit, step), (UP, -cols))
+    # vertical last, with one column a step of 1 is always a move down
+    for bit, step in ((DOWN, cols), (UP, -cols)):
+        directions[step] = ((bit, step), (RIGHT, 1), (LEFT, -1))
+    return directions
+
+def arrival(cols, parent, i):
+    """ Gets the one cell step of the straight move from jump point parent to i, None without a parent """
+    if parent is None:
+        return None
+    if parent // cols == i // cols:
+        return 1 if i > parent else -1
+    return cols if i > parent else -cols
+
+def interpolate(p1, p2):
+    """ Gets the cells on the straight line after p1 up to and including p2 """
+    dr = (p2[0] > p1[0]) - (p2[0] < p1[0])
+    dc = (p2[1] > p1[1]) - (p2[1] < p1[1])
+    return [(p1[0] + dr * i, p1[1] + dc * i) for i in range(1, h(p1, p2) + 1)]
+
+def jump_point(grid, start, goal, stats=None):
+    """
+    Runs Jump Point Search from start to goal without drawing
+
+    A* over jump points only, for uniform cost 4-connected grids. Returns the same path lengths as
+    A* while pushing far fewer cells onto the open list. visited and order hold jump points only,
+    the path is expanded back to every cell. Jumps assume every move costs the same, so on a grid
+    with terrain weights the search is handed to dijkstra instead.
+    """
+    if grid.weights is not None and grid.max_weight() > 1:
+        return dijkstra(grid, start, goal, stats)
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    masks = adjacency(stats, grid)[0]
+    start_time = time.perf_counter()
+    cols = grid.cols
+    directions = jump_directions(cols)
+    goal_row, goal_col = goal
+    count = 0
+    open_set = [(h(start, goal), count, grid.index(start))]
+    start, goal = grid.index(start), grid.index(goal)
+    prev_map = {}
+    g_score = {start: 0}
+    closed = set()
+    order = []
+    peak = 1
+    pops = reopens = 0
+
+    while open_set:
+        if len(open_set) > peak:
+            peak = len(open_set)
+        current = heapq.heappop(open_set)[2]
+        pops += 1
+        if current in closed:
+            continue
+        closed.add(current)
+        order.append(current)
+        if on_expand:
+            on_expand(divmod(current, cols))
+
+        if current == goal:
+            reconstruct_time = stats.timed('search', start_time)
+            points = [divmod(i, cols) for i in reconstruct_path(prev_map, current)]
+            path = [points[0]]
+            for p1, p2 in zip(points, points[1:]):
+                path.extend(interpolate(p1, p2))
+            stats.timed('reconstruct', reconstruct_time)
+            return finish(stats, path, {divmod(i, cols) for i in g_score}, [divmod(i, cols) for i in order],
+                          count + 1, pops, reopens, peak)
+
+        row, col = divmod(current, cols)
+        for bit, step in directions[arrival(cols, prev_map.get(current), current)]:
+            point = jump(masks, current, bit, step, goal)
+            if point is None:
+                continue
+            point_row, point_col = divmod(point, cols)
+            temp_g_score = g_score[current] + abs(point_row - row) + abs(point_col - col)
+            if temp_g_score < g_score.get(point, INF):
+                prev_map[point] = current
+                g_score[point] = temp_g_score
+                count += 1
+                heapq.heappush(open_set, (temp_g_score + abs(point_row - goal_row) + abs(point_col - goal_col),
+                                          count, point))
+                if point in closed:
+                    closed.discard(point)
+                    reopens += 1
+                if on_push:
+                    on_push((point_row, point_col))
+
+    stats.timed('search', start_time)
+    return finish_ids(stats, cols, None, g_score, order, count + 1, pops, reopens, peak)
+
+algorithms = {
+    'a_star': a_star,
+    'best_first': best_first,
+    'depth_first': depth_first,
+    'breadth_first': breadth_first,
+    'jump_point': jump_point,
+    'dijkstra': dijkstra,
+    'dial': dial,
+}
@@ -0,0 +1,73 @@
+import time
+
+class SearchStats:
+    """
+    Structured record of what one search or maze generation did
+
+    expansions, pushes and pops count open list operations, pops include stale entries that were skipped.
+    reopens counts cells pushed again after they had already been expanded.
+    peak_open is the largest size the open list reached.
+    path_length is the number of cells on the path, or None if there was none.
+    phases maps a phase name ('neighbors', 'search', 'reconstruct', ...) to the seconds spent in it.
+
+    on_expand(cell), on_push(cell) and on_path(path) are optional hooks. Algorithms read them once up front
+    and only call the ones that are set, so an unhooked run pays a single truth test per event.
+    """
+    def __init__(self, on_expand=None, on_push=None, on_path=None):
+        """ Initializes an empty record with the given hooks """
+        self.on_expand = on_expand
+        self.on_push = on_push
+        self.on_path = on_path
+        self.expansions = 0
+        self.pushes = 0
+        self.pops = 0
+        self.reopens = 0
+        self.peak_open = 0
+        self.path_length = None
+        self.phases = {}
+
+    def add_counts(self, expansions, pushes, pops, reopens, peak_open):
+        """ Adds the counters a finished run kept locally """
+        self.expansions += expansions
+        self.pushes += pushes
+        self.pops += pops
+        self.reopens += reopens
+        self.peak_open = max(self.peak_open, peak_open)
+
+    def add_phase(self, name, seconds):
+        """ Adds time to a phase """
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def timed(self, name, start_time):
+        """ Adds the time since start_time to a phase and returns the current time, for timing phases back to back """
+        now = time.perf_counter()
+        self.add_phase(name, now - start_time)
+        return now
+
+    def record_path(self, path):
+        """ Stores the path length and calls the on_path hook """
+        self.path_length = None if path is None else len(path)
+        if path is not None and self.on_path:
+            self.on_path(path)
+
+    @property
+    def seconds(self):
+        """ Gets the total time across every phase """
+        return sum(self.phases.values())
+
+    def as_dict(self):
+        """ Gets the record as plain data, without the hooks """
+        return {
+            'expansions': self.expansions,
+            'pushes': self.pushes,
+            'pops': self.pops,
+            'reopens': self.reopens,
+            'peak_open': self.peak_open,
+            'path_length': self.path_length,
+            'phases': dict(self.phases),
+        }
+
+    def __repr__(self):
+        phases = ', '.join('%s=%.6fs' % item for item in self.phases.items())
+        return ("SearchStats(expansions=%d, pushes=%d, pops=%d, reopens=%d, peak_open=%d, path_length=%s, %s)"
+                % (self.expansions, self.pushes, self.pops, self.reopens, self.peak_open, self.path_length, phases))
@@ -0,0 +1,238 @@
+import sys
+import queue
+import struct
+import threading
+from array import array
+from grid import Grid, as_grid, BARRIER_TABLE, START, GOAL, OPEN, CLOSED, PATH
+from stats import SearchStats
+import solvers
+
+# kinds of step event, stored in the low two bits of each event
+OPENED, EXPANDED, ON_PATH = 0, 1, 2
+
+# cell state painted for each kind of event
+STATES = (OPEN, CLOSED, PATH)
+
+MAGIC = b'MZTR'
+VERSION = 1
+
+# magic, version, event typecode, algorithm, rows, cols, start row, start col, goal row, goal col, event count
+HEADER = struct.Struct('<4sBc16s6IQ')
+
+class Trace:
+    """
+    Recorded run of a solver as a flat array of step events
+
+    Each event is index << 2 | kind, where index is the cell index in the grid and kind is OPENED,
+    EXPANDED or ON_PATH. events is an array('I'), or array('Q') for grids of 2 ** 30 cells or more,
+    so a step costs 4 bytes. barriers keeps the wall layout the run was recorded on, so a saved trace
+    can be replayed without the maze or the search.
+    """
+    def __init__(self, rows, cols, barriers, start, goal, algorithm, events):
+        """ Initializes a trace, see record to make one """
+        self.rows = rows
+        self.cols = cols
+        self.barriers = barriers
+        self.start = start
+        self.goal = goal
+        self.algorithm = algorithm
+        self.events = events
+        self.stats = None
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        """ Yields every step as ( kind, ( row, col ) ) """
+        cols = self.cols
+        for event in self.events:
+            yield event & 3, divmod(event >> 2, cols)
+
+    def grid(self):
+        """ Gets a new Grid with the recorded walls, start and goal """
+        grid = Grid(self.rows, self.cols, bytearray(self.barriers))
+        grid.set(self.start, START)
+        grid.set(self.goal, GOAL)
+        return grid
+
+    def apply(self, grid, begin=0, end=None):
+        """
+        Paints the events from begin up to end onto grid, leaving the start and goal cells alone
+
+        Returns the index of the next event to apply, for playing a trace back a few steps at a time.
+        """
+        cells = grid.cells
+        end = len(self.events) if end is None else min(end, len(self.events))
+        for i in range(begin, end):
+            event = self.events[i]
+            index = event >> 2
+            if cells[index] != START and cells[index] != GOAL:
+                cells[index] = STATES[event & 3]
+        return end
+
+    def save(self, path):
+        """ Writes the trace to a binary file """
+        events = self.events
+        if sys.byteorder == 'big':
+            events = array(events.typecode, events)
+            events.byteswap()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, events.typecode.encode(), self.algorithm.encode(),
+                                self.rows, self.cols, *self.start, *self.goal, len(events)))
+            f.write(self.barriers)
+            events.tofile(f)
+
+    @classmethod
+    def load(cls, path):
+        """ Reads a trace written by save. Raises ValueError if the file is not one or is cut short """
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError("%s is too short to be a trace file" % path)
+            (magic, version, typecode, algorithm, rows, cols,
+             start_row, start_col, goal_row, goal_col, count) = HEADER.unpack(header)
+            if magic != MAGIC or version != VERSION or typecode not in (b'I', b'Q'):
+                raise ValueError("%s is not a version %d trace file" % (path, VERSION))
+            barriers = f.read(rows * cols)
+            events = array(typecode.decode())
+            data = f.read(count * events.itemsize)
+        if len(barriers) < rows * cols or len(data) < count * events.itemsize:
+            raise ValueError("%s is cut short, it should hold %d steps on %dx%d cells" % (path, count, rows, cols))
+        events.frombytes(data)
+        if sys.byteorder == 'big':
+            events.byteswap()
+        if not (start_row < rows and start_col < cols and goal_row < rows and goal_col < cols) or \
+                (events and max(events) >> 2 >= rows * cols):
+            raise ValueError("%s has steps outside its %dx%d grid" % (path, rows, cols))
+        return cls(rows, cols, barriers, (start_row, start_col), (goal_row, goal_col),
+                   algorithm.rstrip(b'\0').decode(errors='replace'), events)
+
+def record(board, start, goal, algorithm='a_star', stats=None):
+    """
+    Runs one of solvers.algorithms on a grid or maze and records every step it takes into a Trace
+
+    Cells are recorded as OPENED when pushed, EXPANDED when expanded and ON_PATH once the path is found.
+    stats is an optional SearchStats for the run, its hooks are replaced by the recorder.
+    """
+    grid = as_grid(board)
+    cols = grid.cols
+    events = array('I' if len(grid) < 1 << 30 else 'Q')
+    append = events.append
+
+    def on_path(path):
+        for row, col in path:
+            append((row * cols + col) << 2 | ON_PATH)
+
+    stats = SearchStats() if stats is None else stats
+    stats.on_push = lambda pos: append((pos[0] * cols + pos[1]) << 2 | OPENED)
+    stats.on_expand = lambda pos: append((pos[0] * cols + pos[1]) << 2 | EXPANDED)
+    stats.on_path = on_path
+    solvers.algorithms[algorithm](grid, start, goal, stats)
+
+    trace = Trace(grid.rows, cols, bytes(grid.cells.translate(BARRIER_TABLE)), start, goal, algorithm, events)
+    trace.stats = stats
+    return trace
+
+class SearchStopped(Exception):
+    """ Raised inside a solver run by search_steps once its generator is closed """
+
+def search_steps(board, start, goal, algorithm='a_star', chunk=256):
+    """
+    Streams the ( kind, ( row, col ) ) steps of one search by running the solver on a thread
+
+    The solvers report steps through callbacks, so the search runs on a worker thread and hands its
+    steps over chunk at a time through a queue of a few chunks. The first steps come out while it is
+    still searching, it never gets far ahead of the consumer and memory does not grow with the search.
+    Closing the generator early stops the search the next time it hands over a chunk.
+    """
+    grid = as_grid(board)
+    search = solvers.algorithms[algorithm]
+    handoff = queue.Queue(maxsize=4)
+    stopped = threading.Event()
+    pending = []
+
+    def put(item):
+        # the consumer drains the queue once it stops, so this never blocks past the next check
+        if stopped.is_set():
+            raise SearchStopped
+        handoff.put(item)
+
+    def step(kind, pos):
+        pending.append((kind, pos))
+        if len(pending) >= chunk:
+            put(pending[:])
+            pending.clear()
+
+    def on_path(path):
+        for pos in path:
+            step(ON_PATH, pos)
+
+    def run():
+        stats = SearchStats(on_expand=lambda pos: step(EXPANDED, pos), on_push=lambda pos: step(OPENED, pos),
+                            on_path=on_path)
+        try:
+            search(grid, start, goal, stats)
+            put(pending)
+            put(None)
+        except SearchStopped:
+            pass
+        except Exception as error:
+            try:
+                put(error)
+            except SearchStopped:
+                pass
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    try:
+        while True:
+            item = handoff.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield from item
+    finally:
+        stopped.set()
+        # frees a worker blocked on a full queue, it then stops at its next put
+        while True:
+            try:
+                handoff.get_nowait()
+            except queue.Empty:
+                break
+        worker.join()
+
+def main(argv=None):
+    """ Command line entry point, see --help """
+    import argparse
+    from maze import Maze
+
+    parser = argparse.ArgumentParser(description="Records solver runs to trace files and inspects them")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record_parser = commands.add_parser('record', help="solve a generated maze and save its trace")
+    record_parser.add_argument('output')
+    record_parser.add_argument('--size', type=int, default=50)
+    record_parser.add_argument('--seed', type=int, default=0)
+    record_parser.add_argument('--algorithm', default='a_star', choices=sorted(solvers.algorithms))
+
+    info_parser = commands.add_parser('info', help="print what a trace file holds")
+    info_parser.add_argument('trace')
+
+    args = parser.parse_args(argv)
+    if args.command == 'record':
+        maze = Maze(args.size, args.size, args.seed)
+        trace = record(maze, tuple(maze.entrance), tuple(maze.exit), args.algorithm)
+        trace.save(args.output)
+        print(trace.stats)
+    else:
+        trace = Trace.load(args.trace)
+        counts = [0, 0, 0]
+        for event in trace.events:
+            counts[event & 3] += 1
+        print("%s on %dx%d from %s to %s: %d steps, %d opened, %d expanded, %d on the path" % (
+              trace.algorithm, trace.rows, trace.cols, trace.start, trace.goal, len(trace), *counts))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+from grid import Grid, BARRIER
+
+def random_grid(rng, rows, cols, density, weighted=False):
+    """ Gets a rows x cols Grid with barriers at about density of the cells and, if weighted, random terrain """
+    grid = Grid(rows, cols)
+    for i in range(len(grid.cells)):
+        if rng.random() < density:
+            grid.cells[i] = BARRIER
+        elif weighted and rng.random() < 0.4:
+            grid.set_weight(grid.position(i), rng.randint(1, 9))
+    return grid
+
+def free_cells(grid):
+    """ Gets every ( row, col ) that is not a barrier """
+    return [grid.position(i) for i in range(len(grid.cells)) if grid.cells[i] != BARRIER]
+
+def path_cost(grid, path):
+    """ Gets the cost of a path, each move costing the weight of the cell moved onto, or None without one """
+    return None if path is None else sum(grid.weight(pos) for pos in path[1:])
+
+def check_path(grid, path, start, goal):
+    """ Asserts that path walks from start to goal one free neighbor at a time """
+    assert path[0] == start and path[-1] == goal
+    for a, b in zip(path, path[1:]):
+        assert abs(a[0] - b[0]) + abs(a[1] - b[1]) == 1
+        assert not grid.is_barrier(b)
@@ -0,0 +1,34 @@
+import random
+from maze import Maze
+import solvers
+from stats import SearchStats
+from helpers import random_grid, free_cells, path_cost, check_path
+
+def test_random_grids_match_dijkstra():
+    rng = random.Random(17)
+    for trial in range(200):
+        grid = random_grid(rng, rng.randint(1, 20), rng.randint(1, 20), rng.choice((0.0, 0.2, 0.4)), trial % 2 == 1)
+        free = free_cells(grid)
+        if not free:
+            continue
+        for query in range(5):
+            start, goal = rng.choice(free), rng.choice(free)
+            expected = solvers.dijkstra(grid, start, goal).path
+            for heuristic in (solvers.h, solvers.euclidean_dist):
+                path = solvers.a_star(grid, start, goal, heuristic=heuristic).path
+                assert path_cost(grid, path) == path_cost(grid, expected)
+                if path is not None:
+                    check_path(grid, path, start, goal)
+
+def test_stats_count_the_search():
+    rng = random.Random(18)
+    grid = Maze(61, 61, 5).to_grid()
+    free = free_cells(grid)
+    for query in range(10):
+        start, goal = rng.choice(free), rng.choice(free)
+        expanded = []
+        stats = SearchStats(on_expand=expanded.append)
+        result = solvers.a_star(grid, start, goal, stats)
+        assert stats.expansions == len(expanded) == len(result.order)
+        assert stats.pops >= stats.expansions and stats.pushes >= stats.pops
+        assert stats.path_length == len(result.path) == len(solvers.breadth_first(grid, start, goal).path)
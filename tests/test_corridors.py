@@ -0,0 +1,43 @@
+import random
+from grid import BARRIER, BLANK
+from maze import Maze
+from corridors import CorridorGraph
+import solvers
+from helpers import random_grid, free_cells, path_cost, check_path
+
+def check_queries(grid, graph, rng, queries):
+    """ Asserts the graph finds paths as cheap as dijkstra between random free cells """
+    free = free_cells(grid)
+    for query in range(queries):
+        start, goal = rng.choice(free), rng.choice(free)
+        expected = solvers.dijkstra(grid, start, goal).path
+        path = graph.solve(start, goal).path
+        assert path_cost(grid, path) == path_cost(grid, expected)
+        if path is not None:
+            check_path(grid, path, start, goal)
+
+def test_random_grids_match_dijkstra():
+    rng = random.Random(11)
+    for trial in range(300):
+        grid = random_grid(rng, rng.randint(1, 16), rng.randint(1, 16), rng.choice((0.1, 0.3, 0.45)), trial % 2 == 1)
+        if free_cells(grid):
+            check_queries(grid, CorridorGraph(grid), rng, 10)
+
+def test_mazes_with_loops_match_dijkstra():
+    rng = random.Random(12)
+    for loops in (0, 20, 200):
+        grid = Maze(61, 61, loops).to_grid()
+        walls = [i for i in range(len(grid.cells)) if grid.cells[i] == BARRIER and
+                 0 < i // 61 < 60 and 0 < i % 61 < 60]
+        for i in rng.sample(walls, loops):
+            grid.set(grid.position(i), BLANK)
+        check_queries(grid, CorridorGraph(grid), rng, 20)
+
+def test_perfect_maze_needs_no_search():
+    rng = random.Random(13)
+    grid = Maze(61, 61, 1).to_grid()
+    graph = CorridorGraph(grid)
+    free = free_cells(grid)
+    for query in range(10):
+        result = graph.solve(rng.choice(free), rng.choice(free))
+        assert result.stats.expansions == 0
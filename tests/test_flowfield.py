@@ -0,0 +1,65 @@
+import random
+from grid import BARRIER, BLANK
+from maze import Maze
+from flowfield import FlowField, FlowFields
+from solvers import INF
+import solvers
+from helpers import random_grid, free_cells, path_cost, check_path
+
+def check_field(grid, field, rng, queries=10):
+    """ Asserts the field agrees with dijkstra from random cells and that its paths are that cheap """
+    free = free_cells(grid)
+    for query in range(min(queries, len(free))):
+        start = rng.choice(free)
+        expected = solvers.dijkstra(grid, start, field.goal).path
+        path = field.path(start)
+        if expected is None:
+            assert path is None and field.distance(start) == INF
+        else:
+            assert field.distance(start) == path_cost(grid, expected)
+            check_path(grid, path, start, field.goal)
+            assert path_cost(grid, path) == path_cost(grid, expected)
+
+def test_fields_match_dijkstra():
+    rng = random.Random(7)
+    for trial in range(150):
+        grid = random_grid(rng, rng.randint(1, 16), rng.randint(1, 16), rng.choice((0.1, 0.3)), trial % 2 == 1)
+        free = free_cells(grid)
+        if not free:
+            continue
+        check_field(grid, FlowField(grid, rng.choice(free)), rng)
+
+def test_sync_matches_a_fresh_field():
+    rng = random.Random(8)
+    for trial in range(60):
+        grid = random_grid(rng, rng.randint(2, 14), rng.randint(2, 14), 0.2, trial % 2 == 1)
+        free = free_cells(grid)
+        if not free:
+            continue
+        goal = rng.choice(free)
+        field = FlowField(grid, goal)
+        for edit in range(5):
+            for change in range(rng.randint(1, 4)):
+                pos = grid.position(rng.randrange(len(grid.cells)))
+                if pos == goal:
+                    continue
+                if rng.random() < 0.5:
+                    grid.set(pos, BLANK if grid.is_barrier(pos) else BARRIER)
+                else:
+                    grid.set_weight(pos, rng.randint(1, 9))
+            field.sync()
+            assert field.dist == FlowField(grid, goal).dist
+            check_field(grid, field, rng, 3)
+
+def test_cache_repairs_instead_of_rebuilding():
+    rng = random.Random(9)
+    maze = Maze(41, 41, 3)
+    grid = maze.to_grid()
+    fields = FlowFields(grid, maxsize=2)
+    goal = tuple(maze.exit)
+    field = fields.field(goal)
+    grid.set((1, 1), BARRIER if not grid.is_barrier((1, 1)) else BLANK)
+    assert fields.field(goal) is field
+    info = fields.info()
+    assert (info.hits, info.misses, info.invalidations) == (1, 1, 1)
+    check_field(grid, field, rng)
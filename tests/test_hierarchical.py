@@ -0,0 +1,48 @@
+import random
+from grid import BARRIER, BLANK
+from maze import Maze
+from hierarchical import HierarchicalGrid
+import solvers
+from helpers import random_grid, free_cells, check_path
+
+def check_queries(hpa, rng, queries=10):
+    """ Asserts HPA* finds a path exactly when breadth first search does, and never a shorter one """
+    free = free_cells(hpa.grid)
+    for query in range(queries):
+        start, goal = rng.choice(free), rng.choice(free)
+        expected = solvers.breadth_first(hpa.grid, start, goal).path
+        path = hpa.find_path(start, goal)
+        if expected is None:
+            assert path is None
+        else:
+            check_path(hpa.grid, path, start, goal)
+            assert len(path) >= len(expected)
+
+def test_random_grids_match_breadth_first():
+    rng = random.Random(14)
+    for trial in range(60):
+        grid = random_grid(rng, rng.randint(1, 40), rng.randint(1, 40), rng.choice((0.1, 0.3)))
+        if not free_cells(grid):
+            continue
+        check_queries(HierarchicalGrid(grid, rng.choice((3, 4, 8))), rng)
+
+def test_update_cells_matches_a_fresh_build():
+    rng = random.Random(15)
+    for trial in range(30):
+        grid = random_grid(rng, rng.randint(4, 40), rng.randint(4, 40), 0.25)
+        size = rng.choice((4, 8))
+        hpa = HierarchicalGrid(grid, size)
+        for edit in range(4):
+            changed = [grid.position(rng.randrange(len(grid.cells))) for change in range(rng.randint(1, 5))]
+            for pos in changed:
+                grid.set(pos, BLANK if grid.is_barrier(pos) else BARRIER)
+            hpa.update_cells(changed)
+            fresh = HierarchicalGrid(grid, size)
+            assert (hpa.borders, hpa.links, hpa.intra) == (fresh.borders, fresh.links, fresh.intra)
+            if free_cells(grid):
+                check_queries(hpa, rng, 3)
+
+def test_mazes_match_breadth_first():
+    rng = random.Random(16)
+    for seed in range(3):
+        check_queries(HierarchicalGrid(Maze(81, 81, seed), 16), rng)
@@ -0,0 +1,52 @@
+import random
+from grid import BARRIER, BLANK
+from maze import Maze
+from incremental import DStarLite
+import solvers
+from helpers import random_grid, free_cells, path_cost, check_path
+
+def check_planner(grid, planner):
+    """ Asserts the planner's path is as cheap as dijkstra's from its current start """
+    expected = solvers.dijkstra(grid, planner.start, planner.goal).path
+    path = planner.compute()
+    assert path_cost(grid, path) == path_cost(grid, expected)
+    if path is not None:
+        check_path(grid, path, planner.start, planner.goal)
+    return path
+
+def test_sync_matches_dijkstra_after_edits():
+    rng = random.Random(12)
+    for trial in range(100):
+        grid = random_grid(rng, rng.randint(2, 14), rng.randint(2, 14), 0.25, trial % 2 == 1)
+        free = free_cells(grid)
+        if len(free) < 2:
+            continue
+        start, goal = rng.sample(free, 2)
+        planner = DStarLite(grid, start, goal)
+        check_planner(grid, planner)
+        for edit in range(5):
+            for change in range(rng.randint(1, 4)):
+                pos = grid.position(rng.randrange(len(grid.cells)))
+                if pos == start or pos == goal:
+                    continue
+                if rng.random() < 0.5:
+                    grid.set(pos, BLANK if grid.is_barrier(pos) else BARRIER)
+                else:
+                    grid.set_weight(pos, rng.randint(1, 9))
+            planner.sync()
+            check_planner(grid, planner)
+
+def test_moving_start_keeps_paths_optimal():
+    rng = random.Random(13)
+    maze = Maze(41, 41, 4)
+    grid = maze.to_grid()
+    planner = DStarLite(grid, tuple(maze.entrance), tuple(maze.exit))
+    path = check_planner(grid, planner)
+    inner_walls = [pos for pos in map(grid.position, range(len(grid.cells)))
+                   if grid.is_barrier(pos) and 0 < pos[0] < 40 and 0 < pos[1] < 40]
+    for step in range(10):
+        # walk a few cells along the path, then knock a wall down
+        planner.move_start(path[min(len(path) - 1, rng.randint(1, 20))])
+        grid.set(inner_walls.pop(rng.randrange(len(inner_walls))), BLANK)
+        planner.sync()
+        path = check_planner(grid, planner)
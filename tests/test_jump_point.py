@@ -0,0 +1,45 @@
+import random
+from maze import Maze
+import solvers
+from helpers import random_grid, free_cells, path_cost, check_path
+
+def test_random_grids_match_breadth_first():
+    rng = random.Random(5)
+    for trial in range(300):
+        grid = random_grid(rng, rng.randint(1, 20), rng.randint(1, 20), rng.choice((0.0, 0.2, 0.4)))
+        free = free_cells(grid)
+        if not free:
+            continue
+        for query in range(10):
+            start, goal = rng.choice(free), rng.choice(free)
+            expected = solvers.breadth_first(grid, start, goal).path
+            path = solvers.jump_point(grid, start, goal).path
+            if expected is None:
+                assert path is None
+            else:
+                assert len(path) == len(expected)
+                check_path(grid, path, start, goal)
+
+def test_mazes_match_breadth_first():
+    rng = random.Random(6)
+    for seed in range(5):
+        grid = Maze(61, 61, seed).to_grid()
+        free = free_cells(grid)
+        for query in range(10):
+            start, goal = rng.choice(free), rng.choice(free)
+            path = solvers.jump_point(grid, start, goal).path
+            assert len(path) == len(solvers.breadth_first(grid, start, goal).path)
+            check_path(grid, path, start, goal)
+
+def test_weighted_grids_match_dijkstra():
+    rng = random.Random(7)
+    for trial in range(100):
+        grid = random_grid(rng, rng.randint(2, 15), rng.randint(2, 15), 0.2, weighted=True)
+        free = free_cells(grid)
+        if not free:
+            continue
+        start, goal = rng.choice(free), rng.choice(free)
+        path = solvers.jump_point(grid, start, goal).path
+        assert path_cost(grid, path) == path_cost(grid, solvers.dijkstra(grid, start, goal).path)
+        if path is not None:
+            check_path(grid, path, start, goal)
@@ -0,0 +1,51 @@
+import random
+import pytest
+from grid import BARRIER, BLANK
+from maze import Maze
+from flowfield import FlowField
+from landmarks import Landmarks
+from solvers import INF
+import solvers
+from helpers import random_grid, free_cells, path_cost, check_path
+
+def test_heuristic_is_admissible_and_a_star_stays_optimal():
+    rng = random.Random(10)
+    for trial in range(100):
+        grid = random_grid(rng, rng.randint(2, 16), rng.randint(2, 16), 0.3, trial % 2 == 1)
+        free = free_cells(grid)
+        if not free:
+            continue
+        landmarks = Landmarks.build(grid, rng.randint(1, 6), seed=trial)
+        for query in range(5):
+            start, goal = rng.choice(free), rng.choice(free)
+            expected = solvers.dijkstra(grid, start, goal).path
+            path = solvers.a_star(grid, start, goal, heuristic=landmarks).path
+            assert path_cost(grid, path) == path_cost(grid, expected)
+            if path is not None:
+                check_path(grid, path, start, goal)
+
+            # the bound never exceeds the true cost to the goal from any cell that reaches it
+            estimate = landmarks.to_goal(goal)
+            dist = FlowField(grid, goal).dist
+            for i in range(len(grid.cells)):
+                if dist[i] != INF:
+                    assert estimate(i) <= dist[i]
+
+def test_save_load_round_trip(tmp_path):
+    grid = Maze(41, 41, 2).to_grid()
+    grid.set_weight((1, 1), 4)
+    landmarks = Landmarks.build(grid, 4)
+    path = str(tmp_path / "maze.alt")
+    landmarks.save(path)
+    loaded = Landmarks.load(path, grid)
+    assert loaded.landmarks == landmarks.landmarks
+    assert loaded.tables == landmarks.tables
+    assert loaded.weighted
+
+def test_stale_tables_are_refused(tmp_path):
+    grid = Maze(41, 41, 2).to_grid()
+    path = str(tmp_path / "maze.alt")
+    Landmarks.build(grid, 4).save(path)
+    grid.set((1, 1), BLANK if grid.is_barrier((1, 1)) else BARRIER)
+    with pytest.raises(ValueError):
+        Landmarks.load(path, grid)
@@ -0,0 +1,53 @@
+import random
+import pytest
+from grid import BARRIER_TABLE
+from maze import Maze
+import mazefile
+import solvers
+from helpers import random_grid, free_cells, path_cost
+
+def test_round_trip_keeps_walls_weights_and_paths(tmp_path):
+    rng = random.Random(19)
+    path = str(tmp_path / "grid.maze")
+    for trial in range(60):
+        grid = random_grid(rng, rng.randint(1, 30), rng.randint(1, 30), 0.3, trial % 2 == 1)
+        free = free_cells(grid)
+        if not free:
+            continue
+        start, goal = rng.choice(free), rng.choice(free)
+        mazefile.save(path, grid, start, goal, seed=trial)
+        with mazefile.load(path) as board:
+            assert (board.entrance, board.exit, board.seed) == (start, goal, trial)
+            loaded = board.to_grid()
+            assert loaded.cells == grid.cells.translate(BARRIER_TABLE)
+            assert loaded.max_weight() == grid.max_weight()
+            assert path_cost(loaded, solvers.dijkstra(loaded, start, goal).path) == \
+                path_cost(grid, solvers.dijkstra(grid, start, goal).path)
+
+            # a window reads the same cells as the whole board
+            top, left = rng.randrange(grid.rows), rng.randrange(grid.cols)
+            rows, cols = rng.randint(1, grid.rows - top), rng.randint(1, grid.cols - left)
+            window = board.window(top, left, rows, cols)
+            for row in range(rows):
+                for col in range(cols):
+                    assert window.get((row, col)) == loaded.get((top + row, left + col))
+                    assert window.weight((row, col)) == grid.weight((top + row, left + col))
+
+def test_records_reads_mazes_back_to_back(tmp_path):
+    path = str(tmp_path / "mazes.maze")
+    mazes = [Maze(21, 31, seed) for seed in range(3)]
+    with open(path, 'wb') as f:
+        for maze in mazes:
+            f.write(mazefile.dumps(maze))
+    for maze, board in zip(mazes, mazefile.records(path)):
+        assert board.seed == maze.seed
+        assert board.to_grid().cells == maze.to_grid().cells.translate(BARRIER_TABLE)
+
+def test_short_files_are_refused(tmp_path):
+    path = str(tmp_path / "short.maze")
+    data = mazefile.dumps(Maze(21, 21, 1))
+    for size in (0, mazefile.HEADER.size - 1, mazefile.HEADER.size, len(data) - 1):
+        with open(path, 'wb') as f:
+            f.write(data[:size])
+        with pytest.raises(ValueError):
+            mazefile.load(path)
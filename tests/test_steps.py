@@ -0,0 +1,62 @@
+import random
+import itertools
+import pytest
+from grid import BARRIER_TABLE, PATH
+from maze import Maze
+from steps import Trace, record, search_steps, ON_PATH, HEADER
+import solvers
+from helpers import random_grid, free_cells, path_cost, check_path
+
+def test_traces_replay_the_search():
+    rng = random.Random(21)
+    for trial in range(60):
+        grid = random_grid(rng, rng.randint(1, 20), rng.randint(1, 20), 0.25, trial % 2 == 1)
+        free = free_cells(grid)
+        if not free:
+            continue
+        start, goal = rng.choice(free), rng.choice(free)
+        algorithm = rng.choice(sorted(solvers.algorithms))
+        trace = record(grid, start, goal, algorithm)
+        result = solvers.algorithms[algorithm](grid, start, goal)
+        path = [pos for kind, pos in trace if kind == ON_PATH] or None
+        assert path == result.path
+        if algorithm in ('a_star', 'dijkstra', 'dial'):
+            assert path_cost(grid, path) == path_cost(grid, solvers.dijkstra(grid, start, goal).path)
+        if path is not None:
+            check_path(grid, path, start, goal)
+
+            # replaying paints the path over the walls it was recorded on
+            replay = trace.grid()
+            trace.apply(replay)
+            assert replay.cells.translate(BARRIER_TABLE) == grid.cells.translate(BARRIER_TABLE)
+            assert all(replay.get(pos) == PATH for pos in path[1:-1])
+
+        assert list(search_steps(grid, start, goal, algorithm, chunk=rng.randint(1, 50))) == list(trace)
+
+def test_save_load_round_trip(tmp_path):
+    maze = Maze(41, 41, 6)
+    trace = record(maze, tuple(maze.entrance), tuple(maze.exit), 'jump_point')
+    path = str(tmp_path / "run.trace")
+    trace.save(path)
+    loaded = Trace.load(path)
+    assert (loaded.rows, loaded.cols, loaded.start, loaded.goal, loaded.algorithm) == \
+        (trace.rows, trace.cols, trace.start, trace.goal, trace.algorithm)
+    assert loaded.barriers == trace.barriers and loaded.events == trace.events
+
+def test_short_or_foreign_files_are_refused(tmp_path):
+    maze = Maze(21, 21, 7)
+    path = str(tmp_path / "run.trace")
+    record(maze, tuple(maze.entrance), tuple(maze.exit)).save(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    for broken in (data[:HEADER.size - 1], data[:HEADER.size + 5], data[:-1], b'NOPE' + data[4:]):
+        with open(path, 'wb') as f:
+            f.write(broken)
+        with pytest.raises(ValueError):
+            Trace.load(path)
+
+def test_closing_the_stream_stops_the_search():
+    grid = Maze(101, 101, 8).to_grid()
+    steps = search_steps(grid, (1, 1), (99, 99), 'breadth_first', chunk=4)
+    assert len(list(itertools.islice(steps, 10))) == 10
+    steps.close()
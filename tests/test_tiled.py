@@ -0,0 +1,38 @@
+import random
+import mazefile
+import tiled
+from tiled import TiledGrid
+import solvers
+from helpers import random_grid, free_cells, check_path
+
+def test_small_tile_cache_matches_breadth_first(tmp_path):
+    rng = random.Random(20)
+    path = str(tmp_path / "grid.maze")
+    for trial in range(40):
+        grid = random_grid(rng, rng.randint(1, 40), rng.randint(1, 40), rng.choice((0.1, 0.3)))
+        free = free_cells(grid)
+        if not free:
+            continue
+        mazefile.save(path, grid)
+        # tiles of a few cells and a cache of one or two tiles page state out on almost every step
+        with TiledGrid(path, size=rng.randint(1, 6), capacity=rng.randint(1, 2)) as board:
+            for query in range(5):
+                start, goal = rng.choice(free), rng.choice(free)
+                expected = solvers.breadth_first(grid, start, goal).path
+                result = tiled.a_star(board, start, goal)
+                if expected is None:
+                    assert result.path is None
+                else:
+                    assert len(result.path) == len(expected)
+                    check_path(grid, result.path, start, goal)
+
+def test_generated_maze_is_solved_across_tiles(tmp_path):
+    path = str(tmp_path / "tiled.maze")
+    entrance, exit = tiled.generate(path, 61, 83, size=16, seed=3)
+    with mazefile.load(path) as board:
+        grid = board.to_grid()
+    with TiledGrid(path, size=16, capacity=2) as board:
+        result = tiled.a_star(board, entrance, exit)
+        assert board.info().evictions > 0
+    assert len(result.path) == len(solvers.breadth_first(grid, entrance, exit).path)
+    check_path(grid, result.path, entrance, exit)
@@ -0,0 +1,363 @@
+import sys
+import time
+import heapq
+import random
+import tempfile
+from collections import OrderedDict
+from grid import BLANK, BARRIER
+from maze import Maze
+from cache import CacheInfo
+from stats import SearchStats
+from solvers import SearchResult
+import mazefile
+
+def boundaries(length, size):
+    """ Splits range( length ) into pieces of size or size - 1, returning their starts followed by length """
+    count = max(1, -(-length // size))
+    return [round(i * length / count) for i in range(count + 1)]
+
+def open_door(candidates, fallback, rng):
+    """
+    Opens one door between two tiles
+
+    Doors are tuples of ( bytearray, index ) cells to carve. candidates go through both border walls
+    between two passages, fallback ones have a passage on one side only and also carve the cell on the
+    other side, which keeps the maze connected but may add a loop. They are only used without candidates.
+    """
+    doors = candidates or fallback
+    if not doors:
+        raise RuntimeError("no passage next to a tile border, use larger tiles")
+    for cells, i in rng.choice(doors):
+        cells[i] = BLANK
+
+def generate(path, rows, cols, size=256, seed=None, log=None):
+    """
+    Generates a rows x cols maze tile by tile straight into a maze file, see mazefile
+
+    Every tile is a Maze of about size x size cells generated from its own seed, so its walls surround
+    it. Each tile but the first then opens one door to its left or upper neighbor, picked at random,
+    which makes the tiles a spanning tree and the whole maze a single connected tree of passages.
+    Only two bands of tiles are in memory at once, the one being generated and the one above it
+    whose bottom row it opens doors into, so memory is about 2 * size * cols bytes whatever rows is.
+    Returns ( entrance, exit ).
+    """
+    base = random.randrange(2 ** 63) if seed is None else seed
+    row_starts, col_starts = boundaries(rows, size), boundaries(cols, size)
+    if min(b - a for a, b in zip(row_starts, row_starts[1:])) < 5 or min(b - a for a, b in zip(col_starts, col_starts[1:])) < 5:
+        raise ValueError("tiles must be at least 5 cells a side")
+    entrance = exit = None
+
+    with open(path, 'wb') as f:
+        # the header is rewritten once the entrance and exit are known
+        f.write(bytes(mazefile.HEADER.size))
+        above = above_height = None
+        for b, (r0, r1) in enumerate(zip(row_starts, row_starts[1:])):
+            height = r1 - r0
+            band = bytearray(height * cols)
+            for t, (c0, c1) in enumerate(zip(col_starts, col_starts[1:])):
+                width = c1 - c0
+                tile = Maze(height, width, "%d:%d:%d" % (base, b, t)).cells
+                # close the entrance and exit every Maze opens in its border
+                tile[:width] = bytes([BARRIER]) * width
+                tile[-width:] = bytes([BARRIER]) * width
+                for i in range(height):
+                    band[i * cols + c0:i * cols + c1] = tile[i * width:(i + 1) * width]
+
+                rng = random.Random("%d:%d:%d:door" % (base, b, t))
+                if b == 0 and t == 0:
+                    continue
+                if b == 0 or (t > 0 and rng.random() < 0.5):
+                    # door to the left tile through rows 1 to height - 2
+                    candidates, fallback = [], []
+                    for i in range(1, height - 1):
+                        left, right = i * cols + c0 - 1, i * cols + c0
+                        door = ((band, left), (band, right))
+                        if band[left - 1] == BLANK and band[right + 1] == BLANK:
+                            candidates.append(door)
+                        elif band[left - 1] == BLANK:
+                            fallback.append(door + ((band, right + 1),))
+                        elif band[right + 1] == BLANK:
+                            fallback.append(door + ((band, left - 1),))
+                    open_door(candidates, fallback, rng)
+                else:
+                    # door to the tile above through columns c0 + 1 to c1 - 2
+                    candidates, fallback = [], []
+                    last = (above_height - 1) * cols
+                    for j in range(c0 + 1, c1 - 1):
+                        door = ((above, last + j), (band, j))
+                        if above[last - cols + j] == BLANK and band[cols + j] == BLANK:
+                            candidates.append(door)
+                        elif above[last - cols + j] == BLANK:
+                            fallback.append(door + ((band, cols + j),))
+                        elif band[cols + j] == BLANK:
+                            fallback.append(door + ((above, last - cols + j),))
+                    open_door(candidates, fallback, rng)
+
+            if b == 0:
+                j = band.find(BLANK, cols, 2 * cols)
+                band[j - cols] = BLANK
+                entrance = (0, j - cols)
+            if above is not None:
+                f.write(mazefile.pack_band(above, cols))
+            above, above_height = band, height
+            if log:
+                print("generated rows %d to %d of %d" % (r0, r1, rows), file=log)
+
+        j = above.rfind(BLANK, (above_height - 2) * cols, (above_height - 1) * cols)
+        above[j + cols] = BLANK
+        exit = (rows - 1, j - (above_height - 2) * cols)
+        f.write(mazefile.pack_band(above, cols))
+
+        f.seek(0)
+        f.write(mazefile.header(rows, cols, entrance, exit, base))
+    return entrance, exit
+
+# the ( row, col ) step of each parent direction stored in the search state of a_star
+STEPS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+# state nibble bit of a closed cell, below it the parent direction
+CLOSED = 8
+
+class TiledGrid:
+    """
+    Read only grid backed by a maze file, paged in size x size tiles kept in an LRU cache
+
+    Only capacity tiles are unpacked at a time, with tiles loaded as the frontier reaches them and the
+    least recently used ones dropped. Each tile keeps a border of one cell from its neighbors, so the
+    neighbors of a cell are read without loading another tile. During a_star every tile also carries
+    the search state of its cells, which is written to a temporary file when the tile is dropped and
+    read back when it is loaded again. board is a path or an open MazeFile. Use as a context manager,
+    or call close.
+    """
+    def __init__(self, board, size=256, capacity=64):
+        """ Opens the board. No tile is loaded until a cell in it is read """
+        self.board = mazefile.load(board) if isinstance(board, str) else board
+        self.rows = self.board.rows
+        self.cols = self.board.cols
+        self.size = size
+        self.capacity = capacity
+        self.tile_cols = -(-self.cols // size)
+        # bytes of search state of a tile, a nibble per cell of the tile and its border
+        self.slot = ((size + 2) ** 2 + 1) // 2
+        # ( tile row, tile col ) -> [ cells, stride, state ]
+        self.tiles = OrderedDict()
+        # the last tile read, already the most recently used one
+        self.last_key = self.last_entry = None
+        # temporary file of the search state of dropped tiles, only open during a search
+        self.spill = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """ Drops every tile and closes the board """
+        self.end_search()
+        self.tiles.clear()
+        self.last_key = self.last_entry = None
+        self.board.close()
+
+    def begin_search(self):
+        """ Gives every tile an empty search state, paged with it until end_search """
+        self.end_search()
+        self.spill = tempfile.TemporaryFile()
+        for entry in self.tiles.values():
+            entry[2] = bytearray(self.slot)
+
+    def end_search(self):
+        """ Drops the search state of every tile """
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+        for entry in self.tiles.values():
+            entry[2] = None
+
+    def tile(self, key):
+        """
+        Gets the [ cells, stride, state ] entry of tile ( tile row, tile col ), loading it on a miss
+
+        cells holds the tile and its border in rows of stride bytes, with barriers past the edges of the
+        grid. state is a bytearray with a nibble per cell of cells during a search and None otherwise.
+        """
+        if key == self.last_key:
+            self.hits += 1
+            return self.last_entry
+        self.last_key = key
+        entry = self.last_entry = self.tiles.get(key)
+        if entry is not None:
+            self.tiles.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+
+        size = self.size
+        top, left = key[0] * size, key[1] * size
+        height, width = min(size, self.rows - top), min(size, self.cols - left)
+        stride = width + 2
+        # the window clipped to the grid, and where it lands in the bordered tile
+        r0, r1 = max(top - 1, 0), min(top + height + 1, self.rows)
+        c0, c1 = max(left - 1, 0), min(left + width + 1, self.cols)
+        window = self.board.window(r0, c0, r1 - r0, c1 - c0).cells
+        cells = bytearray([BARRIER]) * ((height + 2) * stride)
+        span = c1 - c0
+        for i in range(r1 - r0):
+            start = (r0 - top + 1 + i) * stride + c0 - left + 1
+            cells[start:start + span] = window[i * span:(i + 1) * span]
+
+        state = None
+        if self.spill is not None:
+            self.spill.seek((key[0] * self.tile_cols + key[1]) * self.slot)
+            state = bytearray(self.spill.read(self.slot))
+            # tiles never dropped during this search read short or as zeros
+            state.extend(bytes(self.slot - len(state)))
+        entry = self.last_entry = self.tiles[key] = [cells, stride, state]
+        if len(self.tiles) > self.capacity:
+            old_key, old_entry = self.tiles.popitem(last=False)
+            if old_entry[2] is not None:
+                self.spill.seek((old_key[0] * self.tile_cols + old_key[1]) * self.slot)
+                self.spill.write(old_entry[2])
+            self.evictions += 1
+        return entry
+
+    def locate(self, pos):
+        """ Gets the entry of the tile holding ( row, col ) and the index of the cell in it """
+        row, col = pos
+        tile_row, r = divmod(row, self.size)
+        tile_col, c = divmod(col, self.size)
+        entry = self.tile((tile_row, tile_col))
+        return entry, (r + 1) * entry[1] + c + 1
+
+    def is_barrier(self, pos):
+        """ Checks if the cell at ( row, col ) is a barrier """
+        entry, i = self.locate(pos)
+        return entry[0][i] == BARRIER
+
+    def neighbors(self, pos):
+        """ Gets all adjacent cells that are not barriers, in the order down, right, up, left like Grid.neighbors """
+        (cells, stride, state), i = self.locate(pos)
+        row, col = pos
+        result = []
+        for dr, dc in STEPS:
+            if cells[i + dr * stride + dc] != BARRIER:
+                result.append((row + dr, col + dc))
+        return result
+
+    def info(self):
+        """ Gets the tile cache hit, miss and eviction counts """
+        return CacheInfo(self.hits, self.misses, 0, self.evictions, self.capacity, len(self.tiles))
+
+def a_star(tiled, start, goal, stats=None):
+    """
+    Runs A* with the Manhattan heuristic on a TiledGrid, paging tiles in as the search reaches them
+
+    The heuristic is consistent and every move costs 1, so the first time a cell is popped its cost
+    is final and the cost of an open list entry is its f score minus its heuristic. Cells therefore
+    keep no g score, only a closed bit and the direction they were reached from, a nibble each in the
+    search state of their tile, which is paged out with it. Memory is the tile cache, the open list
+    and the path. Returns a SearchResult without visited and order, which would grow with the search.
+    """
+    stats = SearchStats() if stats is None else stats
+    on_expand, on_push = stats.on_expand, stats.on_push
+    start_time = time.perf_counter()
+    goal = tuple(goal)
+    goal_row, goal_col = goal
+    size, tile_cols = tiled.size, tiled.tile_cols
+    count = 0
+    # entries are ( f score, tile number, count, row, col, parent direction ). Ties on f are broken by
+    # tile, so a plateau is expanded one tile at a time instead of hopping between tiles every pop
+    open_set = [(abs(start[0] - goal_row) + abs(start[1] - goal_col), 0, count, start[0], start[1], 0)]
+    peak = 1
+    pops = 0
+    expansions = 0
+    path = None
+
+    tiled.begin_search()
+    try:
+        while open_set:
+            if len(open_set) > peak:
+                peak = len(open_set)
+            f_score, _, _, row, col, direction = heapq.heappop(open_set)
+            pops += 1
+            tile_row, r = divmod(row, size)
+            tile_col, c = divmod(col, size)
+            cells, stride, state = tiled.tile((tile_row, tile_col))
+            i = (r + 1) * stride + c + 1
+            shift = (i & 1) << 2
+            if state[i >> 1] >> shift & CLOSED:
+                continue
+            state[i >> 1] |= (CLOSED | direction) << shift
+            expansions += 1
+            if on_expand:
+                on_expand((row, col))
+
+            if row == goal_row and col == goal_col:
+                reconstruct_time = stats.timed('search', start_time)
+                path = [goal]
+                pos = goal
+                while pos != tuple(start):
+                    entry, i = tiled.locate(pos)
+                    dr, dc = STEPS[entry[2][i >> 1] >> ((i & 1) << 2) & 3]
+                    pos = (pos[0] - dr, pos[1] - dc)
+                    path.append(pos)
+                path.reverse()
+                stats.timed('reconstruct', reconstruct_time)
+                break
+
+            g_score = f_score - abs(row - goal_row) - abs(col - goal_col) + 1
+            for direction, (dr, dc) in enumerate(STEPS):
+                j = i + dr * stride + dc
+                # cells of the border belong to another tile, their closed bit is checked once popped
+                if cells[j] == BARRIER or state[j >> 1] >> ((j & 1) << 2) & CLOSED:
+                    continue
+                count += 1
+                heapq.heappush(open_set, (g_score + abs(row + dr - goal_row) + abs(col + dc - goal_col),
+                                          (row + dr) // size * tile_cols + (col + dc) // size, count,
+                                          row + dr, col + dc, direction))
+                if on_push:
+                    on_push((row + dr, col + dc))
+        else:
+            stats.timed('search', start_time)
+    finally:
+        tiled.end_search()
+
+    stats.add_counts(expansions, count + 1, pops, 0, peak)
+    stats.record_path(path)
+    return SearchResult(path, None, None, stats)
+
+def main(argv=None):
+    """ Command line entry point, see --help """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generates and solves tiled mazes too big to keep in memory")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate_parser = commands.add_parser('generate', help="generate a tiled maze into a maze file")
+    generate_parser.add_argument('output')
+    generate_parser.add_argument('--rows', type=int, default=10000)
+    generate_parser.add_argument('--cols', type=int, default=10000)
+    generate_parser.add_argument('--size', type=int, default=256, help="generated tile size")
+    generate_parser.add_argument('--seed', type=int)
+
+    solve_parser = commands.add_parser('solve', help="solve a maze file from its entrance to its exit")
+    solve_parser.add_argument('maze')
+    solve_parser.add_argument('--size', type=int, default=256, help="cached tile size")
+    solve_parser.add_argument('--tiles', type=int, default=64, help="tiles kept in memory")
+
+    args = parser.parse_args(argv)
+    if args.command == 'generate':
+        entrance, exit = generate(args.output, args.rows, args.cols, args.size, args.seed, sys.stderr)
+        print("entrance %s, exit %s" % (entrance, exit))
+    else:
+        with TiledGrid(args.maze, args.size, args.tiles) as tiled:
+            result = a_star(tiled, tiled.board.entrance, tiled.board.exit)
+            print(result.stats)
+            print(tiled.info())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import numpy as np
+from grid import BARRIER
+
+UNREACHED = -1
+
+ONE = np.uint64(1)
+HIGH = np.uint64(63)
+
+def free_mask(grid):
+    """ Gets a ( rows, cols ) boolean array that is True for every cell that is not a barrier """
+    cells = np.frombuffer(grid.cells, dtype=np.uint8).reshape(grid.rows, grid.cols)
+    return cells != BARRIER
+
+def pack_rows(mask):
+    """
+    Packs a boolean ( rows, cols ) array into ( rows, words ) uint64 words
+
+    Bit b of word w in a row holds column w * 64 + b. Padding bits past the last column are 0.
+    """
+    rows, cols = mask.shape
+    packed = np.packbits(mask, axis=1, bitorder='little')
+    words = -(-cols // 64)
+    padded = np.zeros((rows, words * 8), dtype=np.uint8)
+    padded[:, :packed.shape[1]] = packed
+    return padded.view('<u8')
+
+def distance_field(grid, source, goal=None):
+    """
+    Computes the breadth first distance from source to every reachable cell
+
+    Rows are bit-packed into uint64 words and the frontier is grown one layer at a time with
+    word-wide shifts masked by the free cells that were not reached yet, so each step handles 64
+    cells per operation. Only the bounding box around the current frontier is touched, and only
+    the words that actually hold new cells are unpacked to record distances. If goal is given the
+    expansion stops as soon as the goal is reached.
+
+    Returns an int32 array of distances with UNREACHED for cells that were never reached.
+    """
+    free = free_mask(grid)
+    rows, cols = free.shape
+    dist = np.full((rows, cols), UNREACHED, dtype=np.int32)
+    if not free[source]:
+        return dist
+
+    unreached = pack_rows(free)
+    frontier = np.zeros_like(unreached)
+    words = unreached.shape[1]
+
+    row, col = source
+    dist[row, col] = 0
+    frontier[row, col // 64] = ONE << np.uint64(col % 64)
+    unreached[row, col // 64] ^= frontier[row, col // 64]
+
+    # bounding box of the frontier in rows and words
+    r0, r1 = row, row + 1
+    w0, w1 = col // 64, col // 64 + 1
+    d = 0
+    while goal is None or dist[goal] == UNREACHED:
+        d += 1
+
+        # grow the window by one row and one word on every side, clipped to the grid
+        r0, r1 = max(r0 - 1, 0), min(r1 + 1, rows)
+        w0, w1 = max(w0 - 1, 0), min(w1 + 1, words)
+        layer = frontier[r0:r1, w0:w1]
+        grown = layer << ONE
+        grown |= layer >> ONE
+        # carry the bits that cross a word boundary
+        grown[:, 1:] |= layer[:, :-1] >> HIGH
+        grown[:, :-1] |= layer[:, 1:] << HIGH
+        grown[1:, :] |= layer[:-1, :]
+        grown[:-1, :] |= layer[1:, :]
+        grown &= unreached[r0:r1, w0:w1]
+
+        hits = np.flatnonzero(grown)
+        if len(hits) == 0:
+            break
+
+        # unpack only the words holding new cells and record their distance
+        found = grown.ravel()[hits].astype('<u8').view(np.uint8).reshape(-1, 8)
+        word, bit = np.nonzero(np.unpackbits(found, axis=1, bitorder='little'))
+        hit_rows = hits[word] // (w1 - w0) + r0
+        hit_cols = (hits[word] % (w1 - w0) + w0) * 64 + bit
+        dist[hit_rows, hit_cols] = d
+
+        # grown is a subset of unreached, so xor clears exactly the new layer
+        unreached[r0:r1, w0:w1] ^= grown
+        frontier[r0:r1, w0:w1] = grown
+
+        # shrink the window to the bounding box of the new frontier
+        r0, r1 = hit_rows.min(), hit_rows.max() + 1
+        w0, w1 = hit_cols.min() // 64, hit_cols.max() // 64 + 1
+
+    return dist
+
+def path_from_field(dist, goal):
+    """
+    Walks the distance gradient from goal back to the source of the field
+
+    Returns the path from the source to goal inclusive, or None if goal was not reached.
+    """
+    rows, cols = dist.shape
+    row, col = goal
+    d = int(dist[row, col])
+    if d == UNREACHED:
+        return None
+
+    path = [(row, col)]
+    while d > 0:
+        d -= 1
+        # same neighbor order as Grid.neighbors: down, right, up, left
+        if row < rows - 1 and dist[row + 1, col] == d:
+            row += 1
+        elif col < cols - 1 and dist[row, col + 1] == d:
+            col += 1
+        elif row > 0 and dist[row - 1, col] == d:
+            row -= 1
+        else:
+            col -= 1
+        path.append((row, col))
+    path.reverse()
+    return path
+
+def shortest_path(grid, start, goal):
+    """ Gets a shortest path from start to goal, or None if there is none """
+    return path_from_field(distance_field(grid, start, goal), goal)